@@ -0,0 +1,354 @@
+"""
+Admission control in front of the inference path.
+
+Work that needs the model takes a ticket from an AdmissionController
+before it runs: one per interactive request (/analyze, /analyze-text,
+similarity queries) and one per batch chunk for bulk work (/batch-analyze,
+streams, jobs), so a large batch gives way to interactive calls between
+chunks instead of holding the model for its whole run. At most `slots`
+tickets run at once.
+
+Waiting tickets are served by weighted fair queuing (start-time fair
+queuing): every (lane, client) flow has a virtual finish time that each
+ticket advances by cost / weight, where cost is the number of entries and
+weight is the lane's weight times the client's. The ticket with the
+earliest finish time runs next, so the interactive lane gets most of the
+capacity while it has work, and a client flooding a lane mostly delays
+its own later tickets.
+
+Work is refused up front instead of queueing past its lane's latency
+budget. AdmissionRejected carries the HTTP status and a Retry-After hint:
+429 when the client already has `max_queued_per_client` tickets waiting,
+503 when the estimated wait behind the queue exceeds the budget (the
+estimate uses a moving average of seconds per unit of cost). A ticket
+that waits anyway and isn't started within its budget is refused with a
+503 too.
+
+TokenBucket paces the model calls themselves, for upstream quotas.
+
+The client a ticket belongs to is read from a context variable that the
+servers set per request (client_scope / set_client), like deadlines.py.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import deadlines
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+_client = ContextVar('admission_client', default='anonymous')
+
+# Weight of the moving average of seconds per unit of cost
+SERVICE_TIME_ALPHA = 0.2
+
+# Forget the virtual finish time of idle flows once this many are tracked
+MAX_FLOWS = 4096
+
+
+class AdmissionRejected(Exception):
+    """Work refused by admission control; status is 429 or 503"""
+
+    def __init__(self, status, retry_after, message):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RateLimited(Exception):
+    """A model call would have to wait longer than allowed for a token"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Model call rate limit reached, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def current_client():
+    return _client.get()
+
+
+def set_client(client):
+    """Attribute work in the current context to client; returns a token for reset_client"""
+    return _client.set(client)
+
+
+def reset_client(token):
+    _client.reset(token)
+
+
+@contextmanager
+def client_scope(client):
+    token = _client.set(client)
+    try:
+        yield
+    finally:
+        _client.reset(token)
+
+
+class Lane:
+    def __init__(self, weight, budget):
+        self.weight = weight
+        self.budget = budget
+
+
+class Ticket:
+    __slots__ = ('lane', 'client', 'cost', 'start', 'finish', 'arrived', 'started', 'granted', 'cancelled', 'wake')
+
+    def __init__(self, lane, client, cost, wake):
+        self.lane = lane
+        self.client = client
+        self.cost = cost
+        self.start = 0.0
+        self.finish = 0.0
+        self.arrived = time.monotonic()
+        self.started = None
+        self.granted = False
+        self.cancelled = False
+        self.wake = wake
+
+    @property
+    def waited(self):
+        return self.started - self.arrived
+
+
+class AdmissionController:
+    """Weighted fair queuing of inference work over a fixed number of slots
+
+    lanes maps a lane name to (weight, latency budget in seconds).
+    client_weights maps client ids to weights (default 1).
+    """
+
+    def __init__(self, slots, lanes, max_queued_per_client=64, client_weights=None):
+        self.slots = slots
+        self.lanes = {name: Lane(weight, budget) for name, (weight, budget) in lanes.items()}
+        self.max_queued_per_client = max_queued_per_client
+        self.client_weights = dict(client_weights or {})
+        self._lock = threading.Lock()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._flows = {}
+        self._virtual_time = 0.0
+        self._running = 0
+        self._queued = {name: 0 for name in self.lanes}
+        self._queued_by_client = {}
+        self._seconds_per_cost = None
+        self._stats = {
+            name: {"admitted": 0, "rejected_429": 0, "rejected_503": 0, "timed_out": 0} for name in self.lanes
+        }
+
+    def acquire(self, lane, client=None, cost=1):
+        """Wait for a slot; returns the ticket to release() when the work is done
+
+        Raises AdmissionRejected instead of waiting past the lane's budget
+        (or the request deadline, whichever is sooner). ticket.waited is the
+        time spent queued.
+        """
+        event = threading.Event()
+        ticket = self._arrive(lane, client, cost, event.set)
+        if not ticket.granted:
+            event.wait(self._timeout(ticket))
+            self._settle(ticket)
+        ticket.started = time.monotonic()
+        return ticket
+
+    async def acquire_async(self, lane, client=None, cost=1):
+        """acquire() for asyncio callers; waits without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        ticket = self._arrive(lane, client, cost, wake)
+        if not ticket.granted:
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), self._timeout(ticket))
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                if not self._cancel(ticket):
+                    self.release(ticket)
+                raise
+            self._settle(ticket)
+        ticket.started = time.monotonic()
+        return ticket
+
+    def release(self, ticket):
+        """Free the ticket's slot for the next waiting one"""
+        self._release(ticket, time.monotonic() - ticket.started if ticket.started else 0.0)
+
+    @contextmanager
+    def admit(self, lane, client=None, cost=1):
+        """Hold a slot for the block; yields the seconds spent waiting for it"""
+        ticket = self.acquire(lane, client, cost)
+        try:
+            yield ticket.waited
+        finally:
+            self.release(ticket)
+
+    def _timeout(self, ticket):
+        timeout = self.lanes[ticket.lane].budget
+        left = deadlines.remaining()
+        return timeout if left is None else max(0.0, min(timeout, left))
+
+    def _arrive(self, lane, client, cost, wake):
+        """Queue a ticket, granting it at once when a slot is free; raises AdmissionRejected"""
+        client = current_client() if client is None else client
+        ticket = Ticket(lane, client, cost, wake)
+        with self._lock:
+            stats = self._stats[lane]
+            if self._running < self.slots and not any(self._queued.values()):
+                self._running += 1
+                ticket.granted = True
+                stats["admitted"] += 1
+                return ticket
+
+            queued = self._queued_by_client.get(client, 0)
+            if queued >= self.max_queued_per_client:
+                stats["rejected_429"] += 1
+                raise AdmissionRejected(
+                    429, self._estimate(self._client_cost(client)),
+                    f"Too many requests queued for this client ({queued})"
+                )
+
+            weight = self.lanes[lane].weight * self.client_weights.get(client, 1)
+            ticket.start = max(self._virtual_time, self._flows.get((lane, client), 0.0))
+            ticket.finish = ticket.start + cost / weight
+            ahead = sum(t.cost for _, _, t in self._heap if not t.cancelled and t.finish <= ticket.finish)
+            wait = self._estimate(ahead + cost)
+            budget = self.lanes[lane].budget
+            if wait > budget:
+                stats["rejected_503"] += 1
+                raise AdmissionRejected(
+                    503, wait - budget, f"Server busy: about {wait:.1f}s of {lane} work queued ahead"
+                )
+
+            self._flows[(lane, client)] = ticket.finish
+            heapq.heappush(self._heap, (ticket.finish, next(self._sequence), ticket))
+            self._queued[lane] += 1
+            self._queued_by_client[client] = queued + 1
+        return ticket
+
+    def _settle(self, ticket):
+        """After a wait: proceed if the ticket was granted, else give up and raise"""
+        if not self._cancel(ticket):
+            return
+        with self._lock:
+            self._stats[ticket.lane]["timed_out"] += 1
+            retry_after = self._estimate(ticket.cost)
+        raise AdmissionRejected(
+            503, retry_after, f"Server busy: no inference slot within {time.monotonic() - ticket.arrived:.1f}s"
+        )
+
+    def _cancel(self, ticket):
+        """Withdraw a waiting ticket; returns False if it was granted first"""
+        with self._lock:
+            if ticket.granted:
+                return False
+            ticket.cancelled = True
+            self._dequeued(ticket)
+            return True
+
+    def _dequeued(self, ticket):
+        self._queued[ticket.lane] -= 1
+        left = self._queued_by_client[ticket.client] - 1
+        if left:
+            self._queued_by_client[ticket.client] = left
+        else:
+            del self._queued_by_client[ticket.client]
+
+    def _release(self, ticket, seconds):
+        with self._lock:
+            self._running -= 1
+            if seconds > 0:
+                sample = seconds / ticket.cost
+                self._seconds_per_cost = sample if self._seconds_per_cost is None else (
+                    self._seconds_per_cost + SERVICE_TIME_ALPHA * (sample - self._seconds_per_cost)
+                )
+            woken = self._dispatch()
+        for waiting in woken:
+            waiting.wake()
+
+    def _dispatch(self):
+        """Grant free slots to the earliest-finishing waiting tickets; call with the lock held"""
+        woken = []
+        while self._running < self.slots and self._heap:
+            _, _, waiting = heapq.heappop(self._heap)
+            if waiting.cancelled:
+                continue
+            self._virtual_time = max(self._virtual_time, waiting.start)
+            self._dequeued(waiting)
+            self._running += 1
+            waiting.granted = True
+            self._stats[waiting.lane]["admitted"] += 1
+            woken.append(waiting)
+        if len(self._flows) > MAX_FLOWS:
+            self._flows = {flow: finish for flow, finish in self._flows.items() if finish > self._virtual_time}
+        return woken
+
+    def _client_cost(self, client):
+        return sum(t.cost for _, _, t in self._heap if not t.cancelled and t.client == client)
+
+    def _estimate(self, cost):
+        """Seconds for the slots to get through `cost` units of work"""
+        if self._seconds_per_cost is None:
+            return 0.0
+        return cost * self._seconds_per_cost / self.slots
+
+    def stats(self):
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "running": self._running,
+                "queued": dict(self._queued),
+                "clients_queued": len(self._queued_by_client),
+                "seconds_per_cost": round(self._seconds_per_cost, 6) if self._seconds_per_cost is not None else None,
+                "lanes": {name: dict(stats) for name, stats in self._stats.items()}
+            }
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._stats = {"taken": 0, "delayed": 0, "limited": 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait=None):
+        """Take a token; returns how long to wait before using it
+
+        Raises RateLimited, without taking one, when that wait would exceed
+        max_wait. Tokens go negative while callers wait for them, which
+        queues reservations in order.
+        """
+        with self._lock:
+            self._refill()
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                self._stats["limited"] += 1
+                raise RateLimited(wait)
+            self._tokens -= 1
+            self._stats["taken"] += 1
+            if wait > 0:
+                self._stats["delayed"] += 1
+            return wait
+
+    def stats(self):
+        with self._lock:
+            self._refill()
+            return {"rate": self.rate, "burst": self.burst, "tokens": round(self._tokens, 2), **self._stats}
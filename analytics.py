@@ -0,0 +1,322 @@
+"""
+Per-user mood analytics store.
+
+Every analyzed entry that carries a user_id is stored in a local SQLite
+file with its full score vector. In the same transaction, the user's
+daily and weekly buckets (entry count, summed scores, primary emotion
+counts) and an exponential moving average of their scores are updated.
+An entry analyzed again under the same (user_id, entry_id) (a retry, a
+re-run job chunk) replaces its earlier row: its old scores are taken out of the buckets and the new ones put in,
+and the moving average, which can't be unwound, is left alone. Trend
+queries only read buckets, so they cost O(buckets) however long a user's
+history is.
+
+Writes go through a background thread that commits whatever has queued up
+in one transaction, so request threads (and the ASGI event loop) never wait
+on SQLite. A trend query may therefore lag the latest entry by a few ms.
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ('day', 'week')
+BUCKET_DAYS = {'day': 1, 'week': 7}
+
+
+def bucket_start(timestamp, granularity):
+    """First day of the bucket holding timestamp, as an ISO date"""
+    day = timestamp.date()
+    if granularity == 'week':
+        day -= timedelta(days=day.weekday())
+    return day.isoformat()
+
+
+class MoodStore:
+    """Entry log plus incrementally maintained per-user aggregates"""
+
+    def __init__(self, path, layout, ewma_alpha=0.2, max_write_batch=512):
+        self.path = path
+        self.layout = layout
+        self.labels = layout.labels
+        self.ewma_alpha = ewma_alpha
+        self.max_write_batch = max_write_batch
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"recorded": 0, "write_batches": 0, "write_failures": 0}
+        self._queue = queue.Queue()
+        self._closed = False
+
+        conn = self._connect()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "  id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, ts TEXT NOT NULL,"
+            "  primary_emotion TEXT NOT NULL, scores BLOB NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS entries_user_ts ON entries (user_id, ts);"
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "  user_id TEXT NOT NULL, granularity TEXT NOT NULL, start TEXT NOT NULL,"
+            "  entries INTEGER NOT NULL, score_sums BLOB NOT NULL, primary_counts BLOB NOT NULL,"
+            "  PRIMARY KEY (user_id, granularity, start)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS users ("
+            "  user_id TEXT PRIMARY KEY, entries INTEGER NOT NULL,"
+            "  first_ts TEXT NOT NULL, last_ts TEXT NOT NULL, ewma BLOB NOT NULL);"
+        )
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(entries)")]
+        if 'entry_key' not in columns:
+            # Files from before entries were deduplicated; their old rows keep a NULL key
+            conn.execute("ALTER TABLE entries ADD COLUMN entry_key TEXT")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS entries_user_key ON entries (user_id, entry_key)")
+
+        self._writer = threading.Thread(target=self._write_loop, name="mood-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, rows):
+        """Queue (user_id, timestamp, scores, primary_index, entry_id) rows for writing
+
+        scores is the entry's score vector in label order. A row whose
+        entry_id was recorded before replaces that entry; a row without one
+        is always a new entry.
+        """
+        if self._closed:
+            raise RuntimeError("MoodStore is closed")
+        for row in rows:
+            self._queue.put(row)
+
+    def _write_loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            stopping = False
+            while len(batch) < self.max_write_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._write(batch)
+                with self._lock:
+                    self._stats["recorded"] += len(batch)
+                    self._stats["write_batches"] += 1
+            except Exception as e:
+                # Anything escaping would end the writer and leave flush() waiting forever
+                logger.warning(f"Mood store write of {len(batch)} entries failed: {str(e)}")
+                with self._lock:
+                    self._stats["write_failures"] += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stopping:
+                break
+        self._queue.task_done()
+
+    def _write(self, rows):
+        conn = self._connect()
+        width = len(self.labels)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Fold the batch into per-bucket and per-user deltas before touching the aggregates
+            buckets = {}
+            users = {}
+
+            def add(user_id, timestamp, scores, primary, sign):
+                for granularity in GRANULARITIES:
+                    key = (user_id, granularity, bucket_start(timestamp, granularity))
+                    bucket = buckets.setdefault(key, [0, np.zeros(width), np.zeros(width, dtype=np.int64)])
+                    bucket[0] += sign
+                    bucket[1] += sign * scores
+                    bucket[2][primary] += sign
+
+            for user_id, timestamp, scores, primary, entry_id in sorted(rows, key=lambda r: (r[0], r[1])):
+                scores = np.asarray(scores, dtype=np.float64)
+                ts = timestamp.isoformat()
+                # Without an entry_id nothing says two rows are the same entry, so it is always new
+                entry_key = None if entry_id is None else f"id:{entry_id}"
+                blob = scores.astype(np.float32).tobytes()
+                previous = None if entry_key is None else conn.execute(
+                    "SELECT id, ts, primary_emotion, scores FROM entries WHERE user_id = ? AND entry_key = ?",
+                    (user_id, entry_key)
+                ).fetchone()
+                if previous is None:
+                    conn.execute(
+                        "INSERT INTO entries (user_id, ts, primary_emotion, scores, entry_key) VALUES (?, ?, ?, ?, ?)",
+                        (user_id, ts, self.labels[primary], blob, entry_key)
+                    )
+                else:
+                    # Analyzed again: swap the old row's contribution for the new one
+                    add(user_id, datetime.fromisoformat(previous[1]),
+                        np.frombuffer(previous[3], dtype=np.float32).astype(np.float64),
+                        self.labels.index(previous[2]), -1)
+                    conn.execute(
+                        "UPDATE entries SET ts = ?, primary_emotion = ?, scores = ? WHERE id = ?",
+                        (ts, self.labels[primary], blob, previous[0])
+                    )
+                add(user_id, timestamp, scores, primary, 1)
+                users.setdefault(user_id, []).append((ts, scores, previous is None))
+
+            for (user_id, granularity, start), (count, sums, primaries) in buckets.items():
+                row = conn.execute(
+                    "SELECT entries, score_sums, primary_counts FROM buckets "
+                    "WHERE user_id = ? AND granularity = ? AND start = ?",
+                    (user_id, granularity, start)
+                ).fetchone()
+                if row is not None:
+                    count += row[0]
+                    sums = sums + np.frombuffer(row[1], dtype=np.float64)
+                    primaries = primaries + np.frombuffer(row[2], dtype=np.int64)
+                if count <= 0:
+                    # Its only entries moved to another bucket
+                    conn.execute(
+                        "DELETE FROM buckets WHERE user_id = ? AND granularity = ? AND start = ?",
+                        (user_id, granularity, start)
+                    )
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets "
+                    "(user_id, granularity, start, entries, score_sums, primary_counts) VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, granularity, start, count, sums.tobytes(), primaries.tobytes())
+                )
+
+            for user_id, entries in users.items():
+                # Replaced entries are already counted and already in the moving average
+                entries = [(ts, scores) for ts, scores, new in entries if new]
+                if not entries:
+                    continue
+                row = conn.execute(
+                    "SELECT entries, first_ts, last_ts, ewma FROM users WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                if row is None:
+                    count, first_ts, last_ts, ewma = 0, entries[0][0], None, None
+                else:
+                    count, first_ts, last_ts = row[0], row[1], row[2]
+                    ewma = np.frombuffer(row[3], dtype=np.float64)
+                for ts, scores in entries:
+                    count += 1
+                    first_ts = min(first_ts, ts)
+                    # Backfilled entries count in their buckets but don't move the moving average
+                    if last_ts is None or ts >= last_ts:
+                        ewma = scores if ewma is None else ewma + self.ewma_alpha * (scores - ewma)
+                        last_ts = ts
+                conn.execute(
+                    "INSERT OR REPLACE INTO users (user_id, entries, first_ts, last_ts, ewma) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, count, first_ts, last_ts, ewma.tobytes())
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def flush(self):
+        """Wait until every queued entry has been written"""
+        self._queue.join()
+
+    def trends(self, user_id, granularity='day', limit=30, window=7, top_k=5):
+        """Latest `limit` buckets for a user with rolling averages over `window` days or weeks
+
+        The rolling window is calendar time ending at each bucket, so days or
+        weeks without entries count towards it. Returns None when the user
+        has no recorded entries.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity '{granularity}', expected one of {', '.join(GRANULARITIES)}")
+        conn = self._connect()
+        user = conn.execute(
+            "SELECT entries, first_ts, last_ts, ewma FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if user is None:
+            return None
+
+        rows = conn.execute(
+            "SELECT start, entries, score_sums, primary_counts FROM buckets "
+            "WHERE user_id = ? AND granularity = ? ORDER BY start DESC LIMIT ?",
+            (user_id, granularity, limit)
+        ).fetchall()[::-1]
+        # Plus the older buckets that fall in the oldest returned bucket's window
+        step = BUCKET_DAYS[granularity]
+        lower = (date.fromisoformat(rows[0][0]) - timedelta(days=step * (window - 1))).isoformat()
+        earlier = conn.execute(
+            "SELECT start, entries, score_sums, primary_counts FROM buckets "
+            "WHERE user_id = ? AND granularity = ? AND start >= ? AND start < ? ORDER BY start",
+            (user_id, granularity, lower, rows[0][0])
+        ).fetchall()
+        rows = earlier + rows
+
+        counts = np.array([row[1] for row in rows], dtype=np.float64)
+        sums = np.array([np.frombuffer(row[2], dtype=np.float64) for row in rows]).reshape(len(rows), -1)
+        primaries = np.array([np.frombuffer(row[3], dtype=np.int64) for row in rows]).reshape(len(rows), -1)
+
+        # Entry-weighted rolling mean via running sums
+        sum_totals = np.cumsum(np.vstack([np.zeros((1, sums.shape[1])), sums]), axis=0)
+        count_totals = np.concatenate([[0.0], np.cumsum(counts)])
+        days = np.array([date.fromisoformat(row[0]).toordinal() for row in rows])
+        ends = np.arange(1, len(rows) + 1)
+        starts = np.searchsorted(days, days - step * window, side='right')
+        rolling = (sum_totals[ends] - sum_totals[starts]) / (count_totals[ends] - count_totals[starts])[:, None]
+        averages = sums / counts[:, None]
+
+        keep = slice(len(earlier), len(rows))
+        average_summaries = self.layout.summarize(averages[keep].astype(np.float32), top_k=top_k, threshold=0.0)
+        rolling_summaries = self.layout.summarize(rolling[keep].astype(np.float32), top_k=top_k, threshold=0.0)
+
+        buckets = []
+        for row, bucket_primaries, average, rolling_average in zip(
+                rows[keep], primaries[keep], average_summaries, rolling_summaries):
+            buckets.append({
+                "start": row[0],
+                "entries": row[1],
+                "dominant_emotion": self.labels[int(np.argmax(bucket_primaries))],
+                "primary_counts": {
+                    self.labels[i]: int(bucket_primaries[i]) for i in np.flatnonzero(bucket_primaries)
+                },
+                "average": average["top_emotions"],
+                "rolling_average": rolling_average["top_emotions"]
+            })
+
+        ewma = np.frombuffer(user[3], dtype=np.float64).astype(np.float32)[None, :]
+        recent = self.layout.summarize(ewma, top_k=top_k, threshold=0.0)[0]
+        return {
+            "user_id": user_id,
+            "granularity": granularity,
+            "window": window,
+            "entries": user[0],
+            "first_entry": user[1],
+            "last_entry": user[2],
+            "recent_mood": recent["top_emotions"],
+            "buckets": buckets
+        }
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["path"] = self.path
+        return stats
+
+    def close(self):
+        """Write everything queued and stop the writer"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
@@ -1,172 +1,1571 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
 from datetime import datetime
+from admission import BULK, INTERACTIVE, AdmissionController, AdmissionRejected, RateLimited, TokenBucket
+from analytics import GRANULARITIES, MoodStore
+from backends import create_backend, is_backend_failure
+from cache import ResultCache, SQLiteCacheStore, cache_key
+from batching import MicroBatcher
+from chunking import AGGREGATIONS, aggregate_scores, chunk_text
+from circuit import CircuitBreaker, CircuitOpenError
+from deadlines import DeadlineExceeded, deadline_scope
+from jobs import JobQueue, new_job_id
+from lexicon import LexiconClassifier, load_table
+from metrics import CONTENT_TYPE, REGISTRY, SIZE_BUCKETS, Counter, Gauge, Histogram, render_gauges
+from scoring import EMOTION_LABELS, EMOTION_SUMMARIES, ScoreLayout
+from serialization import ResultView, dumps, encode, parse_view_options
+from similarity import SPACES, SimilarityStore
+from singleflight import LeaderAbandoned, SingleFlight
+from tagging import TagExtractor, load_idf
+from warmup import SAMPLE_TEXTS, Warmup, pick_texts
+import admission
+import atexit
+import contextvars
+import deadlines
+import json
 import logging
+import numpy as np
 import os
+import threading
+import time
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for Node.js backend
+# Routes live on a blueprint; create_app() builds the Flask app around it
+api = Blueprint('api', __name__)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Hugging Face Inference API Configuration
-HF_API_URL = "https://api-inference.huggingface.co/models/SamLowe/roberta-base-go_emotions"
+HF_API_URL = os.environ.get(
+    'HF_API_URL',
+    "https://api-inference.huggingface.co/models/SamLowe/roberta-base-go_emotions"
+)
 HF_API_TOKEN = os.environ.get('HUGGINGFACE_TOKEN', '')
+HF_TIMEOUT = float(os.environ.get('HF_TIMEOUT', 30))
+HF_POOL_SIZE = int(os.environ.get('HF_POOL_SIZE', 10))
+HF_MAX_RETRIES = int(os.environ.get('HF_MAX_RETRIES', 3))
+HF_BACKOFF_BASE = float(os.environ.get('HF_BACKOFF_BASE', 0.5))
+HF_BACKOFF_MAX = float(os.environ.get('HF_BACKOFF_MAX', 8))
+
+# Inference backend: "remote" (HF Inference API) or "local" (in-process CPU model)
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'remote')
+LOCAL_MODEL_PATH = os.environ.get('LOCAL_MODEL_PATH', 'SamLowe/roberta-base-go_emotions')
+LOCAL_MODEL_RUNTIME = os.environ.get('LOCAL_MODEL_RUNTIME', 'torch')
+LOCAL_MODEL_THREADS = int(os.environ.get('LOCAL_MODEL_THREADS', 0)) or None
+# "int8" runs the local model with dynamically quantized weights (see benchmarks.quantization)
+LOCAL_MODEL_QUANTIZE = os.environ.get('LOCAL_MODEL_QUANTIZE', '') or None
+
+# Result cache: CACHE_SIZE=0 disables it, CACHE_DB_PATH enables the shared SQLite layer
+CACHE_SIZE = int(os.environ.get('CACHE_SIZE', 2048))
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 3600))
+CACHE_DB_PATH = os.environ.get('CACHE_DB_PATH', '')
+
+# Dynamic micro-batching of concurrent single-text requests; a window of 0 disables it
+MICRO_BATCH_WINDOW_MS = float(os.environ.get('MICRO_BATCH_WINDOW_MS', 0))
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 32))
+
+# Single-flight: identical texts already being inferred wait for that call instead of
+# starting their own. With SINGLE_FLIGHT_LOCK_PATH (and CACHE_DB_PATH to share the
+# result) workers on the same host coordinate too.
+SINGLE_FLIGHT = os.environ.get('SINGLE_FLIGHT', '1') != '0'
+SINGLE_FLIGHT_LOCK_PATH = os.environ.get('SINGLE_FLIGHT_LOCK_PATH', '')
+
+# Number of entries sent to the model in one list-valued request by /batch-analyze
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 16))
+MAX_BATCH_SIZE = 64
+
+# Long entries are split on sentence boundaries into chunks that fit the model's
+# 512-token window; chunk scores are combined with CHUNK_AGGREGATION (mean or max)
+CHUNK_MAX_CHARS = int(os.environ.get('CHUNK_MAX_CHARS', 1500))
+CHUNK_MAX_CHUNKS = int(os.environ.get('CHUNK_MAX_CHUNKS', 32))
+CHUNK_AGGREGATION = os.environ.get('CHUNK_AGGREGATION', 'mean')
+
+# Optional corpus IDF table (see tagging.py) so content tags favour distinctive words
+TAG_IDF_PATH = os.environ.get('TAG_IDF_PATH', '')
+
+# Lexicon for the fast analysis mode and the degraded fallback (see lexicon.py);
+# without one the built-in seed table is used
+LEXICON_PATH = os.environ.get('LEXICON_PATH', '')
+
+# Per-request `mode`: "model" runs the transformer, "fast" the lexicon classifier
+ANALYSIS_MODES = ('model', 'fast')
+
+# Per-user mood analytics: entries carrying a user_id are recorded here when set
+MOOD_DB_PATH = os.environ.get('MOOD_DB_PATH', '')
+MOOD_EWMA_ALPHA = float(os.environ.get('MOOD_EWMA_ALPHA', 0.2))
+MOOD_TRENDS_MAX_BUCKETS = int(os.environ.get('MOOD_TRENDS_MAX_BUCKETS', 365))
+
+# "Entries that felt like this one": score vectors of entries carrying a user_id are
+# indexed in this directory when set, plus pooled text embeddings with
+# SIMILARITY_EMBEDDINGS=1 (local torch backend only). Searches over at least
+# SIMILARITY_ANN_MIN_ROWS rows use an approximate inverted-file index (see similarity.py)
+SIMILARITY_INDEX_PATH = os.environ.get('SIMILARITY_INDEX_PATH', '')
+SIMILARITY_EMBEDDINGS = os.environ.get('SIMILARITY_EMBEDDINGS') == '1'
+SIMILARITY_ANN_MIN_ROWS = int(os.environ.get('SIMILARITY_ANN_MIN_ROWS', 100000))
+SIMILARITY_ANN_PROBES = int(os.environ.get('SIMILARITY_ANN_PROBES', 16))
+SIMILARITY_MAX_K = int(os.environ.get('SIMILARITY_MAX_K', 100))
+
+# Background batch jobs (POST /jobs) are queued in this SQLite file when set and
+# processed JOB_CHUNK_SIZE entries at a time by JOB_WORKERS threads per process.
+# Leases are renewed while a chunk runs; a job whose process stops renewing its lease for
+# JOB_LEASE_SECONDS is resumed elsewhere.
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', '')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_CHUNK_SIZE = int(os.environ.get('JOB_CHUNK_SIZE', 64))
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 180))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOB_RETENTION_DAYS = float(os.environ.get('JOB_RETENTION_DAYS', 7))
+JOB_MAX_ENTRIES = int(os.environ.get('JOB_MAX_ENTRIES', 100000))
+JOB_RESULTS_MAX_PAGE = int(os.environ.get('JOB_RESULTS_MAX_PAGE', 1000))
+
+# Circuit breaker around the inference backend (see circuit.py); CIRCUIT_BREAKER=0 disables it
+CIRCUIT_BREAKER = os.environ.get('CIRCUIT_BREAKER', '1') != '0'
+CIRCUIT_WINDOW = int(os.environ.get('CIRCUIT_WINDOW', 20))
+CIRCUIT_MIN_CALLS = int(os.environ.get('CIRCUIT_MIN_CALLS', 10))
+CIRCUIT_FAILURE_RATE = float(os.environ.get('CIRCUIT_FAILURE_RATE', 0.5))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.environ.get('CIRCUIT_SLOW_CALL_SECONDS', 10))
+CIRCUIT_SLOW_CALL_RATE = float(os.environ.get('CIRCUIT_SLOW_CALL_RATE', 0.8))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get('CIRCUIT_OPEN_SECONDS', 30))
+
+# While the circuit is open, entries get cached or lexicon scores flagged "degraded"
+# instead of an error; DEGRADED_FALLBACK=0 fails fast with 503 + Retry-After
+DEGRADED_FALLBACK = os.environ.get('DEGRADED_FALLBACK', '1') != '0'
+
+# Time budget per request in seconds (0 for none); clients may ask for less with `deadline_ms`.
+# Each streamed chunk gets its own budget.
+REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE', 60))
+
+# NDJSON streaming: chunks scored concurrently per stream, and the longest accepted line
+STREAM_MAX_IN_FLIGHT = int(os.environ.get('STREAM_MAX_IN_FLIGHT', 4))
+STREAM_MAX_LINE_BYTES = int(os.environ.get('STREAM_MAX_LINE_BYTES', 1024 * 1024))
+
+# Analysis responses at least this large are gzipped for clients that accept it (-1 disables).
+# Level 1 compresses a 1k-entry batch about 3x faster than level 5 for ~10% more bytes
+RESPONSE_GZIP_MIN_BYTES = int(os.environ.get('RESPONSE_GZIP_MIN_BYTES', 1024))
+RESPONSE_GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', 1))
+
+# Admission control (see admission.py), off unless ADMISSION_SLOTS > 0: inference work runs
+# in at most ADMISSION_SLOTS slots per process, shared by weighted fair queuing between an
+# interactive lane (/analyze, /analyze-text, similarity) and a bulk lane (batches, streams, jobs).
+# Work whose estimated queue wait exceeds its lane's budget (seconds) is refused with 503
+# + Retry-After, and a client with ADMISSION_MAX_QUEUED_PER_CLIENT waiting gets 429.
+ADMISSION_SLOTS = int(os.environ.get('ADMISSION_SLOTS', 0))
+ADMISSION_INTERACTIVE_WEIGHT = float(os.environ.get('ADMISSION_INTERACTIVE_WEIGHT', 8))
+ADMISSION_BULK_WEIGHT = float(os.environ.get('ADMISSION_BULK_WEIGHT', 1))
+ADMISSION_INTERACTIVE_BUDGET = float(os.environ.get('ADMISSION_INTERACTIVE_BUDGET', 2))
+ADMISSION_BULK_BUDGET = float(os.environ.get('ADMISSION_BULK_BUDGET', 30))
+ADMISSION_MAX_QUEUED_PER_CLIENT = int(os.environ.get('ADMISSION_MAX_QUEUED_PER_CLIENT', 64))
+# Clients are told apart by this header (e.g. X-API-Key behind a gateway), else by address
+ADMISSION_CLIENT_HEADER = os.environ.get('ADMISSION_CLIENT_HEADER', 'X-Client-Id')
+# Per-client fair-share weights, "client=weight,client=weight" (default 1)
+ADMISSION_CLIENT_WEIGHTS = os.environ.get('ADMISSION_CLIENT_WEIGHTS', '')
+
+# Token bucket on backend calls, per process: MODEL_CALL_RATE calls/second (0 for no limit)
+# with bursts of MODEL_CALL_BURST. A call waits up to MODEL_CALL_MAX_WAIT seconds for a
+# token, then fails with 503 + Retry-After.
+MODEL_CALL_RATE = float(os.environ.get('MODEL_CALL_RATE', 0))
+MODEL_CALL_BURST = int(os.environ.get('MODEL_CALL_BURST', 10))
+MODEL_CALL_MAX_WAIT = float(os.environ.get('MODEL_CALL_MAX_WAIT', 5))
+
+# Startup warmup (see warmup.py): each process sends WARMUP_TEXTS of warmup.SAMPLE_TEXTS
+# to the backend, WARMUP_CONCURRENCY at a time, and /ready answers 503 until that has
+# worked. WARMUP=0 skips it and reports ready at once.
+WARMUP = os.environ.get('WARMUP', '1') != '0'
+WARMUP_TEXTS = int(os.environ.get('WARMUP_TEXTS', 8))
+WARMUP_CONCURRENCY = int(os.environ.get('WARMUP_CONCURRENCY', 4))
+WARMUP_RETRY_SECONDS = float(os.environ.get('WARMUP_RETRY_SECONDS', 5))
+# Ping the backend after this many seconds without a model call so the hosted model
+# isn't unloaded in quiet periods (0 disables; off by default for local backends)
+KEEP_WARM_SECONDS = float(os.environ.get('KEEP_WARM_SECONDS', 300 if INFERENCE_BACKEND == 'remote' else 0))
+
+# Scores are post-processed as (N, 28) float32 matrices in EMOTION_LABELS order
+score_layout = ScoreLayout(EMOTION_LABELS, EMOTION_SUMMARIES)
+
+# Loaded once at startup and shared by every request
+inference_backend = create_backend(
+    INFERENCE_BACKEND,
+    api_url=HF_API_URL,
+    api_token=HF_API_TOKEN,
+    model_path=LOCAL_MODEL_PATH,
+    runtime=LOCAL_MODEL_RUNTIME,
+    num_threads=LOCAL_MODEL_THREADS,
+    quantize=LOCAL_MODEL_QUANTIZE,
+    timeout=HF_TIMEOUT,
+    pool_size=HF_POOL_SIZE,
+    max_retries=HF_MAX_RETRIES,
+    backoff_base=HF_BACKOFF_BASE,
+    backoff_max=HF_BACKOFF_MAX
+)
+
+tag_extractor = TagExtractor()
+if TAG_IDF_PATH:
+    idf_documents, idf_table = load_idf(TAG_IDF_PATH)
+    tag_extractor = TagExtractor(idf_table, idf_documents)
+    logger.info(f"Loaded tag IDF for {len(idf_table)} words from {TAG_IDF_PATH}")
+
+# Started per process by start_background_threads()
+mood_store = None
+similarity_store = None
+
+circuit_breaker = None
+if CIRCUIT_BREAKER:
+    circuit_breaker = CircuitBreaker(
+        window=CIRCUIT_WINDOW,
+        min_calls=CIRCUIT_MIN_CALLS,
+        failure_rate=CIRCUIT_FAILURE_RATE,
+        slow_call_seconds=CIRCUIT_SLOW_CALL_SECONDS,
+        slow_call_rate=CIRCUIT_SLOW_CALL_RATE,
+        open_seconds=CIRCUIT_OPEN_SECONDS
+    )
+
+
+def parse_client_weights(value):
+    """{client: weight} from a "client=weight,client=weight" string"""
+    weights = {}
+    for item in value.split(','):
+        if item.strip():
+            client, _, weight = item.rpartition('=')
+            weights[client.strip()] = float(weight)
+    return weights
+
+
+admission_controller = None
+if ADMISSION_SLOTS > 0:
+    admission_controller = AdmissionController(
+        ADMISSION_SLOTS,
+        {
+            INTERACTIVE: (ADMISSION_INTERACTIVE_WEIGHT, ADMISSION_INTERACTIVE_BUDGET),
+            BULK: (ADMISSION_BULK_WEIGHT, ADMISSION_BULK_BUDGET)
+        },
+        max_queued_per_client=ADMISSION_MAX_QUEUED_PER_CLIENT,
+        client_weights=parse_client_weights(ADMISSION_CLIENT_WEIGHTS)
+    )
+
+model_rate_limiter = None
+if MODEL_CALL_RATE > 0:
+    model_rate_limiter = TokenBucket(MODEL_CALL_RATE, MODEL_CALL_BURST)
+
+# Scores "fast" mode requests, and texts with no cached result while the circuit is open
+lexicon_classifier = LexiconClassifier(EMOTION_LABELS)
+if LEXICON_PATH:
+    lexicon_documents, lexicon_table = load_table(LEXICON_PATH, EMOTION_LABELS)
+    lexicon_classifier = LexiconClassifier(EMOTION_LABELS, lexicon_table, source=LEXICON_PATH)
+    logger.info(f"Loaded lexicon of {len(lexicon_table)} words distilled from {lexicon_documents} entries")
+
+result_cache = None
+if CACHE_SIZE > 0:
+    result_cache = ResultCache(
+        EMOTION_LABELS,
+        max_size=CACHE_SIZE,
+        ttl=CACHE_TTL,
+        shared_store=SQLiteCacheStore(CACHE_DB_PATH, CACHE_TTL, CACHE_SIZE * 8) if CACHE_DB_PATH else None
+    )
+
+
+# Inference counters, exposed on /health so we can confirm one model call per entry
+_stats_lock = threading.Lock()
+INFERENCE_STATS = {
+    "model_calls": 0,
+    "entries_analyzed": 0
+}
+
+
+def record_model_call(count=1):
+    with _stats_lock:
+        INFERENCE_STATS["model_calls"] += count
+
+
+def record_entries_analyzed(count=1):
+    with _stats_lock:
+        INFERENCE_STATS["entries_analyzed"] += count
+
+
+def get_inference_stats():
+    with _stats_lock:
+        return dict(INFERENCE_STATS)
+
+
+# Prometheus metrics served on /metrics. Series used on every request are
+# created once here so the hot path only does a perf_counter() and an observe().
+REQUEST_SECONDS = Histogram(
+    "eunoia_request_duration_seconds", "HTTP request latency", ("endpoint", "method", "status")
+)
+REQUESTS_IN_FLIGHT = Gauge("eunoia_requests_in_flight", "HTTP requests being handled", ("endpoint",))
+STAGE_SECONDS = Histogram("eunoia_stage_duration_seconds", "Time spent in each analysis stage", ("stage",))
+STAGE_PARSE = STAGE_SECONDS.labels("parse")
+STAGE_INFERENCE = STAGE_SECONDS.labels("inference")
+STAGE_LEXICON = STAGE_SECONDS.labels("lexicon")
+STAGE_AGGREGATE = STAGE_SECONDS.labels("aggregate")
+STAGE_POSTPROCESS = STAGE_SECONDS.labels("postprocess")
+STAGE_TAGGING = STAGE_SECONDS.labels("tagging")
+STAGE_SERIALIZE = STAGE_SECONDS.labels("serialize")
+UPSTREAM_SECONDS = Histogram(
+    "eunoia_inference_call_duration_seconds", "call_huggingface_api latency, retries included", ("backend",)
+)
+UPSTREAM_BATCH_SIZE = Histogram(
+    "eunoia_inference_batch_size", "Texts sent per inference call", ("backend",), buckets=SIZE_BUCKETS
+)
+UPSTREAM_ERRORS = Counter("eunoia_inference_errors_total", "Inference calls that raised", ("backend",))
+DEGRADED_RESULTS = Counter("eunoia_degraded_texts_total", "Texts scored from cache or lexicon while the circuit was open")
+ADMISSION_WAIT_SECONDS = Histogram(
+    "eunoia_admission_wait_seconds", "Time inference work queued for an admission slot", ("lane",)
+)
+ADMISSION_REJECTED = Counter(
+    "eunoia_admission_rejected_total", "Inference work refused by admission control", ("lane", "status")
+)
+MODEL_RATE_WAIT_SECONDS = Histogram("eunoia_model_rate_wait_seconds", "Time backend calls waited for a rate limit token")
+MODEL_RATE_LIMITED = Counter("eunoia_model_rate_limited_total", "Backend calls refused by the rate limit")
+
+upstream_seconds = UPSTREAM_SECONDS.labels(inference_backend.name)
+upstream_batch_size = UPSTREAM_BATCH_SIZE.labels(inference_backend.name)
+upstream_errors = UPSTREAM_ERRORS.labels(inference_backend.name)
 
-EMOTION_LABELS = [
-    'admiration', 'amusement', 'anger', 'annoyance', 'approval', 
-    'caring', 'confusion', 'curiosity', 'desire', 'disappointment', 
-    'disapproval', 'disgust', 'embarrassment', 'excitement', 'fear', 
-    'gratitude', 'grief', 'joy', 'love', 'nervousness', 
-    'optimism', 'pride', 'realization', 'relief', 'remorse', 
-    'sadness', 'surprise', 'neutral'
-]
 
 def call_huggingface_api(text):
-    """Call Hugging Face Inference API for emotion detection"""
-    headers = {}
-    if HF_API_TOKEN:
-        headers["Authorization"] = f"Bearer {HF_API_TOKEN}"
-    
+    """Run emotion detection on the configured inference backend
+
+    `text` may be a single string or a list of strings; the result holds one
+    [{label, score}] list per input, in the same order.
+    """
+    before_inference_call()
+    time.sleep(reserve_model_call())
+    started = time.perf_counter()
+    error = None
     try:
-        response = requests.post(
-            HF_API_URL,
-            headers=headers,
-            json={"inputs": text, "options": {"wait_for_model": True}},
-            timeout=30
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error calling Hugging Face API: {str(e)}")
+        return inference_backend.predict(text)
+    except Exception as e:
+        error = e
         raise
+    finally:
+        after_inference_call(text, time.perf_counter() - started, error)
+
+
+def before_inference_call():
+    """Raise CircuitOpenError instead of calling a backend the breaker has cut off"""
+    if circuit_breaker is not None:
+        circuit_breaker.before_call()
 
 
-def analyze_text(text, top_k=5, threshold=0.3):
-    """Analyze text and return emotion scores"""
-    # Call Hugging Face API
-    api_result = call_huggingface_api(text)
+def reserve_model_call():
+    """Seconds to wait for the model call rate limit, after before_inference_call()
+
+    Raises RateLimited (releasing the breaker's call) when the wait would
+    exceed MODEL_CALL_MAX_WAIT or the request's deadline.
+    """
+    if model_rate_limiter is None:
+        return 0.0
+    left = deadlines.remaining()
+    try:
+        wait = model_rate_limiter.reserve(MODEL_CALL_MAX_WAIT if left is None else min(MODEL_CALL_MAX_WAIT, left))
+    except RateLimited:
+        MODEL_RATE_LIMITED.inc()
+        if circuit_breaker is not None:
+            circuit_breaker.release()
+        raise
+    MODEL_RATE_WAIT_SECONDS.observe(wait)
+    return wait
+
+
+@contextmanager
+def admitted(lane, cost=1):
+    """Hold an admission slot for inference work in the current client's name
+
+    Raises AdmissionRejected when admission control turns the work away.
+    """
+    if admission_controller is None:
+        yield
+        return
+    try:
+        ticket = admission_controller.acquire(lane, cost=cost)
+    except AdmissionRejected as e:
+        ADMISSION_REJECTED.labels(lane, str(e.status)).inc()
+        raise
+    ADMISSION_WAIT_SECONDS.labels(lane).observe(ticket.waited)
+    try:
+        yield
+    finally:
+        admission_controller.release(ticket)
+
+
+def after_inference_call(inputs, seconds, error=None):
+    """Record a finished backend call in the metrics and the circuit breaker"""
+    global last_inference_at
+    last_inference_at = time.monotonic()
+    upstream_seconds.observe(seconds)
+    upstream_batch_size.observe(len(inputs) if isinstance(inputs, list) else 1)
+    if error is not None:
+        upstream_errors.inc()
+    if circuit_breaker is None:
+        return
+    if isinstance(error, DeadlineExceeded):
+        # Cut short by the caller's budget; says nothing about the backend
+        circuit_breaker.release()
+    else:
+        # A 4xx (bad input) is an answer from a healthy backend
+        circuit_breaker.record(seconds, error is not None and is_backend_failure(error))
+
+
+def fallback_scores(texts):
+    """Cached scores where available, lexicon scores otherwise"""
+    results, _, missing = lookup_cached_scores(texts)
+    if missing:
+        for i, scores in zip(missing, lexicon_classifier.predict([texts[i] for i in missing])):
+            results[i] = scores
+        DEGRADED_RESULTS.inc(len(missing))
+    return results
+
+
+def degraded_scores(texts, error):
+    """fallback_scores() for texts the open circuit kept from the model, or re-raise"""
+    if not DEGRADED_FALLBACK:
+        raise error
+    logger.warning(f"Inference circuit open, serving {len(texts)} text(s) in degraded mode")
+    return fallback_scores(texts)
+
+
+def get_emotion_scores(text):
+    """Run the model once and return its raw [{label, score}] list"""
+    key = None
+    if result_cache is not None or single_flight is not None:
+        key = cache_key(text, inference_backend.model_id)
+    if result_cache is not None:
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached
     
-    # API returns list of lists, take first result
-    if isinstance(api_result, list) and len(api_result) > 0:
-        scores_list = api_result[0]
+    if single_flight is not None:
+        # Concurrent callers with the same text share one model call
+        return single_flight.do(key, lambda: infer_text(text, key), recheck=lambda: recheck_cache(key))
+    return infer_text(text, key)
+
+
+def infer_text(text, key=None):
+    """Model scores for one text, cached under key"""
+    if micro_batcher is not None:
+        # Coalesced with other concurrent requests into one model call
+        scores = deadlines.wait(micro_batcher.submit(text))
     else:
-        scores_list = api_result
+        api_result = call_huggingface_api(text)
+        record_model_call()
+        
+        # API returns list of lists, take first result
+        if isinstance(api_result, list) and len(api_result) > 0:
+            scores = api_result[0]
+        else:
+            scores = api_result
     
-    # Convert to our format
-    emotion_scores = []
-    for item in scores_list:
-        emotion_scores.append({
-            "emotion": item["label"],
-            "score": item["score"]
-        })
+    if key is not None and result_cache is not None:
+        result_cache.put(key, scores)
+    return scores
+
+
+def recheck_cache(key):
+    """Result another worker may have stored while we waited on its in-flight call"""
+    return result_cache.get(key) if result_cache is not None else None
+
+
+def infer_batch(texts):
+    """One list-valued model call for many texts, used by the micro-batcher"""
+    api_result = call_huggingface_api(texts)
+    record_model_call()
+    return api_result
+
+
+single_flight = None
+if SINGLE_FLIGHT:
+    if SINGLE_FLIGHT_LOCK_PATH and not CACHE_DB_PATH:
+        logger.warning("SINGLE_FLIGHT_LOCK_PATH has no effect across workers without CACHE_DB_PATH")
+    single_flight = SingleFlight(lock_path=SINGLE_FLIGHT_LOCK_PATH or None)
+
+micro_batcher = None
+job_queue = None
+warmup = None
+# Process that last ran start_background_threads(); a forked child has none running
+threads_started_pid = None
+threads_lock = threading.Lock()
+# When the backend was last called, for keep-warm pings
+last_inference_at = time.monotonic()
+
+
+def start_background_threads():
+    """Start this process's backend warmup, micro-batcher, mood store and similarity
+    index writers and job workers, if configured
+
+    Called by the server entry points, not at import: `python application.py`,
+    gunicorn.conf.py's post_fork (threads don't survive fork(), so each worker
+    starts its own; see after_fork) and async_application.py's lifespan. Any
+    other server (`flask run`, gunicorn without gunicorn.conf.py) gets them on
+    its first request; see start_threads_on_first_request.
+    Scripts that only import this module get no threads and no warmup calls.
+    """
+    global micro_batcher, mood_store, similarity_store, job_queue, warmup, threads_started_pid
+    with threads_lock:
+        threads_started_pid = os.getpid()
+        if WARMUP and warmup is None:
+            warmup = create_warmup().start()
+        if MICRO_BATCH_WINDOW_MS > 0 and micro_batcher is None:
+            micro_batcher = MicroBatcher(
+                infer_batch,
+                window=MICRO_BATCH_WINDOW_MS / 1000.0,
+                max_batch_size=MICRO_BATCH_MAX_SIZE
+            )
+        if MOOD_DB_PATH and mood_store is None:
+            mood_store = MoodStore(MOOD_DB_PATH, score_layout, ewma_alpha=MOOD_EWMA_ALPHA)
+        if SIMILARITY_INDEX_PATH and similarity_store is None:
+            similarity_store = create_similarity_store()
+        if JOB_DB_PATH and job_queue is None:
+            job_queue = JobQueue(
+                JOB_DB_PATH,
+                run_job_chunk,
+                workers=JOB_WORKERS,
+                chunk_size=JOB_CHUNK_SIZE,
+                lease_seconds=JOB_LEASE_SECONDS,
+                max_attempts=JOB_MAX_ATTEMPTS,
+                retention_seconds=JOB_RETENTION_DAYS * 86400
+            )
+            job_queue.start()
+
+
+def create_warmup():
+    """Warmup over a spread of the sample texts, filling the result cache"""
+    return Warmup(
+        call_huggingface_api,
+        pick_texts(SAMPLE_TEXTS, max(1, WARMUP_TEXTS)),
+        concurrency=WARMUP_CONCURRENCY,
+        retry_seconds=WARMUP_RETRY_SECONDS,
+        keep_warm_seconds=KEEP_WARM_SECONDS,
+        idle_seconds=lambda: time.monotonic() - last_inference_at,
+        on_scores=cache_warmup_scores
+    )
+
+
+def cache_warmup_scores(texts, api_result):
+    if result_cache is None:
+        return
+    for text, scores in zip(texts, api_result):
+        result_cache.put(cache_key(text, inference_backend.model_id), scores)
+
+
+def create_similarity_store():
+    embed = None
+    if SIMILARITY_EMBEDDINGS:
+        if INFERENCE_BACKEND != 'local' or LOCAL_MODEL_RUNTIME != 'torch':
+            raise ValueError("SIMILARITY_EMBEDDINGS needs INFERENCE_BACKEND=local with LOCAL_MODEL_RUNTIME=torch")
+        embed = inference_backend.embed
+    return SimilarityStore(
+        SIMILARITY_INDEX_PATH,
+        EMOTION_LABELS,
+        embed=embed,
+        embedding_dim=getattr(inference_backend, 'embedding_dim', None),
+        embedding_source=getattr(inference_backend, 'model_id', None),
+        ann_min_rows=SIMILARITY_ANN_MIN_ROWS,
+        ann_probes=SIMILARITY_ANN_PROBES
+    )
+
+
+def stop_background_threads():
+    """Finish the job chunks in progress, flush queued micro-batch texts,
+    mood entries and similarity index rows, then stop the threads
+
+    Safe to call more than once; start_background_threads() starts fresh ones.
+    """
+    global micro_batcher, mood_store, similarity_store, job_queue, warmup
+    if warmup is not None:
+        warmup.close()
+        warmup = None
+    if job_queue is not None:
+        # Job chunks use the micro-batcher and both stores, so they stop first
+        job_queue.close()
+        job_queue = None
+    if micro_batcher is not None:
+        micro_batcher.close()
+        micro_batcher = None
+    if mood_store is not None:
+        mood_store.close()
+        mood_store = None
+    if similarity_store is not None:
+        similarity_store.close()
+        similarity_store = None
+
+
+def after_fork():
+    """Per-worker setup in a server that forked from a preloaded master
+
+    The model, tokenizer, caches and tag tables stay shared copy-on-write;
+    connections and threads inherited from the master are replaced.
+    """
+    inference_backend.after_fork()
+    if result_cache is not None and result_cache.shared_store is not None:
+        result_cache.shared_store.after_fork()
+    start_background_threads()
+
+
+def get_emotion_scores_batch(texts):
+    """Run the model once over a list of texts and return one score list per text
+
+    Cached texts are answered without inference; only the misses are sent.
+    Texts repeated in the batch, or already in flight for another request,
+    are not sent again.
+    """
+    results, keys, missing = lookup_cached_scores(texts)
+    if single_flight is None:
+        infer_missing(texts, results, keys, missing)
+        return results
     
-    # Sort by score
-    emotion_scores = sorted(emotion_scores, key=lambda x: x['score'], reverse=True)
+    leading = {}
+    waiting = []
+    for i in missing:
+        if keys[i] in leading:
+            single_flight.stats.add("collapsed")
+            waiting.append((i, None))
+            continue
+        future, leader = single_flight.join(keys[i])
+        if leader:
+            leading[keys[i]] = i
+        else:
+            waiting.append((i, future))
     
-    # Filter by threshold and limit
-    filtered_emotions = [e for e in emotion_scores if e['score'] >= threshold][:top_k]
+    try:
+        infer_missing(texts, results, keys, list(leading.values()))
+    except Exception as e:
+        for key, i in leading.items():
+            single_flight.finish(key, results[i], error=None if results[i] is not None else e)
+        raise
+    for key, i in leading.items():
+        single_flight.finish(key, results[i])
     
-    return {
-        "primary_emotion": emotion_scores[0]['emotion'],
-        "top_emotions": filtered_emotions,
-        "all_scores": emotion_scores
-    }
+    for i, future in waiting:
+        if future is None:
+            results[i] = results[leading[keys[i]]]
+            continue
+        try:
+            results[i] = deadlines.wait(future)
+        except LeaderAbandoned:
+            # The other request gave up on its own deadline or admission; infer it here
+            results[i] = get_emotion_scores(texts[i])
+    return results
 
 
-def generate_tags(text, max_tags=5):
-    emotion_result = analyze_text(text, top_k=3)
-    emotion_tags = [e['emotion'] for e in emotion_result['top_emotions']]
-    
-    # Extract content tags
-    words = text.lower().split()
-    stopwords = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 
-                'of', 'with', 'by', 'from', 'as', 'is', 'was', 'were', 'been', 'be',
-                'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
-                'should', 'may', 'might', 'i', 'you', 'he', 'she', 'it', 'we', 'they'}
+def infer_missing(texts, results, keys, missing):
+    """Fill the missing slots with model output, in calls of at most MAX_BATCH_SIZE texts"""
+    # Very long inputs (many chunked entries) are split to keep request sizes sane
+    for start in range(0, len(missing), MAX_BATCH_SIZE):
+        part = missing[start:start + MAX_BATCH_SIZE]
+        api_result = call_huggingface_api([texts[i] for i in part])
+        record_model_call()
+        merge_batch_scores(results, keys, part, api_result)
+
+
+def lookup_cached_scores(texts):
+    """Split texts into cache hits and misses
+
+    Returns (results, keys, missing): results holds cached score lists (None
+    for misses), keys the cache keys (None when neither the cache nor
+    single-flight needs them), missing the indexes still to infer.
+    """
+    results = [None] * len(texts)
+    keys = [None] * len(texts)
+    missing = []
+    with_keys = result_cache is not None or single_flight is not None
+    for i, text in enumerate(texts):
+        if with_keys:
+            keys[i] = cache_key(text, inference_backend.model_id)
+        if result_cache is not None:
+            results[i] = result_cache.get(keys[i])
+        if results[i] is None:
+            missing.append(i)
+    return results, keys, missing
+
+
+def merge_batch_scores(results, keys, missing, api_result):
+    """Place batch inference output into the missing slots and cache it"""
+    if not isinstance(api_result, list) or len(api_result) != len(missing):
+        raise ValueError(
+            f"Expected {len(missing)} results from batch inference, got "
+            f"{len(api_result) if isinstance(api_result, list) else type(api_result).__name__}"
+        )
     
-    word_freq = {}
-    for word in words:
-        word = ''.join(c for c in word if c.isalnum())
-        if len(word) > 3 and word not in stopwords:
-            word_freq[word] = word_freq.get(word, 0) + 1
+    for i, scores in zip(missing, api_result):
+        results[i] = scores
+        if keys[i] is not None and result_cache is not None:
+            result_cache.put(keys[i], scores)
+    return results
+
+
+# analyze_text's default: every field, with the labeled all_scores breakdown
+FULL_TEXT_VIEW = ResultView(score_format='labeled')
+
+
+def analyze_text(text, top_k=5, threshold=0.3, scores=None, mode='model', view=None):
+    """Analyze text and return emotion scores
+
+    view (a ResultView) picks the fields and the score format.
+    """
+    if mode == 'fast':
+        matrix = lexicon_matrix([text])
+    else:
+        if scores is None:
+            with admitted(INTERACTIVE):
+                scores = get_emotion_scores(text)
+        matrix = score_layout.to_matrix([scores])
+    view = view or FULL_TEXT_VIEW
+    result = score_layout.summarize(matrix, top_k=top_k, threshold=threshold)[0]
+    view.add_scores([result], matrix, score_layout)
+    result["mode"] = mode
+    return view.select(result)
+
+
+def lexicon_matrix(texts):
+    """Lexicon classifier scores for texts, timed as the lexicon stage"""
+    started = time.perf_counter()
+    matrix = lexicon_classifier.matrix(texts)
+    STAGE_LEXICON.observe(time.perf_counter() - started)
+    return matrix
+
+
+def generate_tags(text, max_tags=5, emotion_result=None, content_tags=None):
+    # Reuse the caller's analysis when available so the model only runs once
+    if emotion_result is None:
+        emotion_result = analyze_text(text, top_k=3)
+    emotion_tags = [e['emotion'] for e in emotion_result['top_emotions'][:3]]
     
-    content_tags = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:3]
-    content_tags = [tag[0] for tag in content_tags]
+    # Batch callers extract content tags for all their entries up front
+    if content_tags is None:
+        content_tags = tag_extractor.extract(text, k=3)
     
     all_tags = emotion_tags + content_tags
     return all_tags[:max_tags]
 
 
-def analyze_journal_entry(title, content):
+def analyze_journal_entry(title, content, aggregation=None, include_chunks=False, owner=None, mode='model',
+                          view=None):
     full_text = f"{title}. {content}"
-    emotion_analysis = analyze_text(full_text)
-    tags = generate_tags(full_text)
-    
-    result = {
-        "timestamp": datetime.now().isoformat(),
-        "title": title,
-        "primary_emotion": emotion_analysis['primary_emotion'],
-        "emotion_confidence": emotion_analysis['top_emotions'][0]['score'],
-        "detected_emotions": emotion_analysis['top_emotions'],
-        "tags": tags,
-        "emotional_state_summary": get_emotional_summary(emotion_analysis['primary_emotion'])
+    if mode == 'fast':
+        return analyze_entries_fast([(title, full_text)], view)[0]
+    
+    # Single model call per entry; summary, top-k and tags all share these scores
+    degraded = None
+    with admitted(INTERACTIVE):
+        started = time.perf_counter()
+        try:
+            texts, text_scores = get_entry_text_scores(full_text)
+        except CircuitOpenError as e:
+            texts, text_scores = degraded_entry_scores(full_text, e)
+            degraded = [True]
+        STAGE_INFERENCE.observe(time.perf_counter() - started)
+    matrix, chunks = combine_entry_scores(texts, text_scores, [(0, len(texts))], aggregation)
+    return build_entry_results(
+        [(title, full_text)], matrix, chunks if include_chunks else None, [owner], degraded, view=view
+    )[0]
+
+
+def split_entry_text(full_text):
+    """Sentence-boundary chunks of an entry, capped at CHUNK_MAX_CHUNKS"""
+    chunks = chunk_text(full_text, max_chars=CHUNK_MAX_CHARS)
+    if len(chunks) > CHUNK_MAX_CHUNKS:
+        logger.warning(f"Entry split into {len(chunks)} chunks, analyzing the first {CHUNK_MAX_CHUNKS}")
+        chunks = chunks[:CHUNK_MAX_CHUNKS]
+    return chunks
+
+
+def get_entry_text_scores(full_text):
+    """Model inputs and raw scores for one entry
+
+    Long entries are chunked and scored in one batched call; short ones go
+    through get_emotion_scores (and the micro-batcher, when enabled).
+    """
+    texts = split_entry_text(full_text)
+    if len(texts) == 1:
+        return texts, [get_emotion_scores(full_text)]
+    return texts, get_emotion_scores_batch(texts)
+
+
+def analyze_entries_fast(entries, view=None):
+    """Results for (title, full_text) pairs from the lexicon classifier
+
+    Entries are scored whole (no chunking) and are not recorded in the mood
+    store; nothing is sent to the model.
+    """
+    matrix = lexicon_matrix([full_text for _, full_text in entries])
+    return build_entry_results(entries, matrix, mode='fast', view=view)
+
+
+def degraded_entry_scores(full_text, error):
+    """get_entry_text_scores() from fallback scores while the circuit is open"""
+    texts = split_entry_text(full_text)
+    return texts, degraded_scores([full_text] if len(texts) == 1 else texts, error)
+
+
+def plan_entry_chunks(full_texts):
+    """Flatten many entries into one list of model inputs
+
+    Returns (texts, spans) where spans[i] = (start, count) locates entry i's chunks.
+    """
+    texts = []
+    spans = []
+    for full_text in full_texts:
+        chunks = split_entry_text(full_text)
+        spans.append((len(texts), len(chunks)))
+        texts.extend(chunks)
+    return texts, spans
+
+
+def combine_entry_scores(texts, text_scores, spans, aggregation=None):
+    """Regroup flattened chunk scores per entry
+
+    Returns (matrix, chunks): one score row per span, and per span either
+    None or (chunk_texts, chunk_matrix) for entries that were chunked.
+    """
+    started = time.perf_counter()
+    aggregation = aggregation or CHUNK_AGGREGATION
+    text_matrix = score_layout.to_matrix(text_scores)
+    if len(spans) == len(texts):
+        # Nothing was chunked, rows are already one per entry
+        STAGE_AGGREGATE.observe(time.perf_counter() - started)
+        return text_matrix, [None] * len(spans)
+    
+    matrix = np.empty((len(spans), len(EMOTION_LABELS)), dtype=np.float32)
+    chunks = []
+    for row, (start, count) in enumerate(spans):
+        chunk_matrix = text_matrix[start:start + count]
+        if count == 1:
+            matrix[row] = chunk_matrix[0]
+            chunks.append(None)
+            continue
+        chunk_texts = texts[start:start + count]
+        matrix[row] = aggregate_scores(chunk_matrix, [len(t) for t in chunk_texts], aggregation)
+        chunks.append((chunk_texts, chunk_matrix))
+    STAGE_AGGREGATE.observe(time.perf_counter() - started)
+    return matrix, chunks
+
+
+def describe_chunks(chunk_texts, chunk_matrix):
+    """Per-chunk breakdown so clients can show emotion shifts within an entry"""
+    return [
+        {
+            "index": i,
+            "chars": len(text),
+            "primary_emotion": analysis['primary_emotion'],
+            "top_emotions": analysis['top_emotions']
+        }
+        for i, (text, analysis) in enumerate(zip(chunk_texts, score_layout.summarize(chunk_matrix, top_k=3)))
+    ]
+
+
+def build_entry_results(entries, matrix, chunks=None, owners=None, degraded=None, mode='model', view=None):
+    """Result dicts for (title, full_text) pairs and their (N, 28) score matrix
+
+    Primary emotion, top emotions and summaries are computed for the whole
+    batch at once. chunks, when given, holds None or (chunk_texts,
+    chunk_matrix) per entry and adds a per-chunk breakdown. owners holds
+    None or (user_id, timestamp) per entry for the mood analytics store.
+    degraded flags entries scored in degraded mode; they are marked in the
+    result, reported with mode 'degraded' and kept out of the mood store.
+    mode is reported on every other result.
+    view (a ResultView) trims the results and adds the full score breakdown;
+    tags are not extracted when it leaves them out.
+    """
+    started = time.perf_counter()
+    if degraded is not None and owners is not None:
+        owners = [None if flag else owner for owner, flag in zip(owners, degraded)]
+    analysis = score_layout.analyze(matrix)
+    if owners is not None:
+        record_moods(owners, matrix, analysis['primary'])
+        record_similarity(owners, entries, matrix, analysis['primary'])
+    primary_emotions = score_layout.primary_emotions(analysis)
+    top_emotions = score_layout.top_emotions(analysis)
+    summaries = score_layout.summaries_for(analysis)
+    confidences = analysis['confidence'].tolist()
+    with_tags = view is None or view.wants('tags')
+    tagging_started = time.perf_counter()
+    if with_tags:
+        content_tags = tag_extractor.extract_batch([full_text for _, full_text in entries], k=3)
+    tagging_seconds = time.perf_counter() - tagging_started
+    STAGE_TAGGING.observe(tagging_seconds)
+    timestamp = datetime.now().isoformat()
+    
+    results = []
+    for row, (title, full_text) in enumerate(entries):
+        emotion_analysis = {"primary_emotion": primary_emotions[row], "top_emotions": top_emotions[row]}
+        result = {
+            "timestamp": timestamp,
+            "title": title,
+            "primary_emotion": primary_emotions[row],
+            "emotion_confidence": confidences[row],
+            "detected_emotions": top_emotions[row],
+            "tags": generate_tags(
+                full_text, emotion_result=emotion_analysis, content_tags=content_tags[row]
+            ) if with_tags else None,
+            "emotional_state_summary": summaries[row],
+            "mode": mode
+        }
+        if chunks is not None and chunks[row] is not None:
+            result["chunks"] = describe_chunks(*chunks[row])
+        if degraded is not None and degraded[row]:
+            result["degraded"] = True
+            result["mode"] = 'degraded'
+        results.append(result)
+    if view is not None:
+        view.add_scores(results, matrix, score_layout)
+        results = [view.select(result) for result in results]
+    
+    record_entries_analyzed(len(results))
+    STAGE_POSTPROCESS.observe(time.perf_counter() - started - tagging_seconds)
+    return results
+
+
+def record_moods(owners, matrix, primary):
+    """Queue score rows of entries that belong to a user in the mood store"""
+    if mood_store is None:
+        return
+    rows = [
+        (owner[0], owner[1], matrix[row], int(primary[row]), owner[2])
+        for row, owner in enumerate(owners) if owner is not None
+    ]
+    if rows:
+        mood_store.record(rows)
+
+
+def record_similarity(owners, entries, matrix, primary):
+    """Queue entries that belong to a user for the similarity index"""
+    if similarity_store is None:
+        return
+    rows = [
+        (owner[0], owner[1], owner[2], entries[row][0], entries[row][1], matrix[row], int(primary[row]))
+        for row, owner in enumerate(owners) if owner is not None
+    ]
+    if rows:
+        similarity_store.record(rows)
+
+
+def parse_entry_owner(data, default_user=None):
+    """(user_id, timestamp, entry_id) of an entry for mood analytics and similarity search, or None
+
+    Returns None when both stores are disabled or the entry has no user;
+    raises ValueError for a malformed user_id, timestamp or entry_id.
+    Timestamps keep their wall-clock time so entries are bucketed by the
+    writer's local day. entry_id is optional; an entry analyzed again under
+    the same id replaces the earlier one in similarity results.
+    """
+    if mood_store is None and similarity_store is None:
+        return None
+    user_id = data.get('user_id', default_user)
+    if user_id is None or user_id == '':
+        return None
+    if isinstance(user_id, bool) or not isinstance(user_id, (str, int)):
+        raise ValueError("'user_id' must be a string")
+    
+    entry_id = data.get('entry_id')
+    if entry_id is not None:
+        if isinstance(entry_id, bool) or not isinstance(entry_id, (str, int)):
+            raise ValueError("'entry_id' must be a string")
+        entry_id = str(entry_id)
+    
+    timestamp = data.get('timestamp')
+    if timestamp is None:
+        return str(user_id), datetime.now(), entry_id
+    try:
+        if not isinstance(timestamp, str):
+            raise ValueError
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError("'timestamp' must be an ISO 8601 date-time")
+    return str(user_id), parsed.replace(tzinfo=None), entry_id
+
+
+def analyze_journal_entries(entries, batch_size=None, aggregation=None, include_chunks=False, default_user=None,
+                            mode='model', strict=False, fields=None, score_format=None):
+    """Analyze many entries with one model call per micro-batch
+
+    Returns (results, errors). Each result and error carries the `index` of
+    the entry it belongs to, so callers can map them back in order. A
+    failure only affects its own entry (or its own chunk for model errors).
+    With strict, model errors are raised instead (see analyze_chunk).
+    AdmissionRejected is raised if admission control turns away the first
+    chunk; later chunks it turns away become errors.
+    fields and score_format shape each result (see serialization.ResultView).
+    """
+    pending, errors = prepare_batch_entries(entries, default_user)
+    view = ResultView(fields, score_format)
+    results = []
+    
+    for number, chunk in enumerate(chunk_entries(pending, batch_size)):
+        try:
+            chunk_results, chunk_errors = analyze_chunk(chunk, aggregation, include_chunks, mode, strict, view)
+        except AdmissionRejected as e:
+            if strict or number == 0:
+                raise
+            chunk_results, chunk_errors = [], rejected_chunk_errors(chunk, e)
+        results.extend(chunk_results)
+        errors.extend(chunk_errors)
+    
+    results.sort(key=lambda r: r["index"])
+    errors.sort(key=lambda e: e["index"])
+    return results, errors
+
+
+def validate_entry(entry, default_user=None):
+    """Return (title, full_text, owner) for a batch entry, or raise ValueError"""
+    if not isinstance(entry, dict):
+        raise ValueError("Entry must be an object")
+    title = entry.get('title', 'Untitled')
+    content = entry.get('content', '')
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError("Content cannot be empty")
+    return title, f"{title}. {content}", parse_entry_owner(entry, default_user)
+
+
+def prepare_batch_entries(entries, default_user=None):
+    """Validate batch entries up front so bad ones never reach the model
+
+    Returns (pending, errors) where pending is a list of (index, title, full_text, owner).
+    """
+    pending = []
+    errors = []
+    for index, entry in enumerate(entries):
+        try:
+            title, full_text, owner = validate_entry(entry, default_user)
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        pending.append((index, title, full_text, owner))
+    return pending, errors
+
+
+def batch_size_limit(batch_size=None):
+    return max(1, min(batch_size or BATCH_SIZE, MAX_BATCH_SIZE))
+
+
+def chunk_entries(pending, batch_size=None):
+    batch_size = batch_size_limit(batch_size)
+    return [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+
+
+def analyze_chunk(chunk, aggregation=None, include_chunks=False, mode='model', strict=False, view=None):
+    """Score one chunk of (index, title, full_text, owner) with a single model call
+
+    Long entries contribute several inputs to that call. Returns (results,
+    errors); a model failure becomes an error for every entry in the chunk,
+    unless the circuit is open and the chunk can be scored in degraded mode.
+    strict raises model failures, open circuit included, for the caller to
+    retry. AdmissionRejected is always raised. In "fast" mode the chunk is
+    scored by the lexicon classifier instead.
+    """
+    if mode == 'fast':
+        results = analyze_entries_fast([(title, full_text) for _, title, full_text, _ in chunk], view)
+        for (index, _, _, _), result in zip(chunk, results):
+            result["index"] = index
+        return results, []
+    texts, spans = plan_entry_chunks([text for _, _, text, _ in chunk])
+    try:
+        with deadline_scope(REQUEST_DEADLINE):
+            # The slot is held for the model call only, not the post-processing
+            with admitted(BULK, len(texts)):
+                started = time.perf_counter()
+                degraded = None
+                try:
+                    text_scores = get_emotion_scores_batch(texts)
+                except CircuitOpenError as e:
+                    if strict:
+                        raise
+                    text_scores = degraded_scores(texts, e)
+                    degraded = [True] * len(chunk)
+                STAGE_INFERENCE.observe(time.perf_counter() - started)
+            results = build_chunk_results(
+                chunk, texts, text_scores, spans, aggregation, include_chunks, degraded, view
+            )
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        if strict:
+            raise
+        logger.error(f"Error analyzing batch chunk at entry {chunk[0][0]}: {str(e)}")
+        return [], [{"index": index, "error": str(e)} for index, _, _, _ in chunk]
+    return results, []
+
+
+def rejected_chunk_errors(chunk, error):
+    """Per-entry errors for a chunk that admission control turned away"""
+    return [{"index": index, "error": str(error), "retry_after": round(error.retry_after, 1)}
+            for index, _, _, _ in chunk]
+
+
+def run_job_chunk(entries, options):
+    """Analyze one chunk of a queued job (see jobs.py) in the bulk lane of the client that queued it
+
+    Model failures and admission rejections are raised so the job queue
+    retries the chunk later rather than storing errors or degraded results
+    for a transient outage.
+    """
+    options = dict(options)
+    with admission.client_scope(options.pop('client', None) or 'jobs'):
+        return analyze_journal_entries(entries, strict=True, **options)
+
+
+def build_chunk_results(chunk, texts, text_scores, spans, aggregation=None, include_chunks=False, degraded=None,
+                        view=None):
+    """Indexed entry results for a scored chunk, post-processed as one matrix"""
+    matrix, chunks = combine_entry_scores(texts, text_scores, spans, aggregation)
+    results = build_entry_results(
+        [(title, full_text) for _, title, full_text, _ in chunk],
+        matrix,
+        chunks if include_chunks else None,
+        [owner for _, _, _, owner in chunk],
+        degraded,
+        view=view
+    )
+    for (index, _, _, _), result in zip(chunk, results):
+        result["index"] = index
+    return results
+
+
+def stamp_job_entries(entries, job_id):
+    """Entries of a job, each given an entry_id and a timestamp where it has none
+
+    A job chunk can run more than once (its lease ran out, or it failed and
+    was retried). With an entry_id unique to the job and position
+    ("<job_id>:<index>"), the mood store and the similarity index replace
+    the rows of the earlier run instead of adding to them, and the fixed
+    submission time keeps a redone entry in the same bucket.
+    """
+    submitted = datetime.now().isoformat()
+    stamped = []
+    for index, entry in enumerate(entries):
+        if isinstance(entry, dict):
+            entry = dict(entry)
+            if entry.get('entry_id') is None:
+                entry['entry_id'] = f"{job_id}:{index}"
+            if entry.get('timestamp') is None:
+                entry['timestamp'] = submitted
+        stamped.append(entry)
+    return stamped
+
+
+def queue_job(entries, options):
+    """Store a job of entries stamped by stamp_job_entries; returns the job description"""
+    job_id = new_job_id()
+    return job_queue.submit(stamp_job_entries(entries, job_id), options, job_id=job_id)
+
+
+def parse_batch_request(data):
+    """(entries, options) from a /batch-analyze or /jobs body, or raise ValueError
+
+    options are the analyze_journal_entries keyword arguments.
+    """
+    if not data or 'entries' not in data:
+        raise ValueError("Missing 'entries' field")
+    entries = data.get('entries', [])
+    if not isinstance(entries, list):
+        raise ValueError("'entries' must be an array")
+    batch_size = data.get('batch_size')
+    if batch_size is not None and (not isinstance(batch_size, int) or batch_size < 1):
+        raise ValueError("'batch_size' must be a positive integer")
+    aggregation, include_chunks = parse_analysis_options(data)
+    fields, score_format = parse_view_options(data)
+    return entries, {
+        "batch_size": batch_size,
+        "aggregation": aggregation,
+        "include_chunks": include_chunks,
+        "default_user": data.get('user_id'),
+        "mode": parse_mode(data),
+        "fields": fields,
+        "score_format": score_format
     }
+
+
+def parse_mode(data):
+    """`mode` from a request body or query string, or raise ValueError"""
+    mode = data.get('mode', 'model')
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"'mode' must be one of: {', '.join(ANALYSIS_MODES)}")
+    return mode
+
+
+def parse_deadline(data):
+    """Seconds this request may take: `deadline_ms` from the body, capped at REQUEST_DEADLINE
+
+    Raises ValueError for a malformed value.
+    """
+    deadline_ms = data.get('deadline_ms')
+    if deadline_ms is None:
+        return REQUEST_DEADLINE
+    if isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float)) or deadline_ms <= 0:
+        raise ValueError("'deadline_ms' must be a positive number")
+    seconds = deadline_ms / 1000
+    return min(seconds, REQUEST_DEADLINE) if REQUEST_DEADLINE else seconds
+
+
+def inference_error_response(error):
+    """(payload, status, headers) for an error that outlived the degraded fallback,
+    or for work turned away by admission control or the model call rate limit; else None"""
+    if isinstance(error, (CircuitOpenError, AdmissionRejected, RateLimited)):
+        retry_after = max(1, int(error.retry_after + 0.999))
+        status = error.status if isinstance(error, AdmissionRejected) else 503
+        return {"success": False, "error": str(error)}, status, {"Retry-After": str(retry_after)}
+    if isinstance(error, DeadlineExceeded):
+        return {"success": False, "error": str(error)}, 504, {}
+    return None
+
+
+def exception_response(error):
+    """429/503/504 for overload, an open circuit or a missed deadline (see
+    inference_error_response), 500 for anything else"""
+    inference_error = inference_error_response(error)
+    if inference_error is None:
+        return jsonify({
+            "success": False,
+            "error": str(error)
+        }), 500
+    payload, status, headers = inference_error
+    return jsonify(payload), status, headers
+
+
+def analyze_text_scores(text, mode='model', view=None):
+    """(analyze_text result, degraded) for one text, falling back while the circuit is open"""
+    try:
+        return analyze_text(text, mode=mode, view=view), False
+    except CircuitOpenError as e:
+        return analyze_text(text, scores=degraded_scores([text], e)[0], mode='degraded', view=view), True
+
+
+def parse_analysis_options(data):
+    """Read the optional chunk aggregation settings from a request body
+
+    Returns (aggregation, include_chunks) or raises ValueError.
+    """
+    aggregation = data.get('aggregation')
+    if aggregation is not None and aggregation not in AGGREGATIONS:
+        raise ValueError(f"'aggregation' must be one of: {', '.join(AGGREGATIONS)}")
+    return aggregation, bool(data.get('include_chunks', False))
+
+
+def parse_stream_line(index, line, default_user=None):
+    """Parse one NDJSON entry line into (index, title, full_text, owner), or raise ValueError"""
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        raise ValueError("Invalid JSON")
+    title, full_text, owner = validate_entry(entry, default_user)
+    return index, title, full_text, owner
+
+
+def iter_stream_lines(stream, max_line_bytes=None):
+    """Yield lines from a binary stream without ever holding more than one line
+
+    Lines longer than max_line_bytes are replaced by None (and skipped).
+    """
+    max_line_bytes = max_line_bytes or STREAM_MAX_LINE_BYTES
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        if len(line) > max_line_bytes and not line.endswith(b'\n'):
+            # Drain the rest of the oversized line
+            while True:
+                rest = stream.readline(max_line_bytes)
+                if not rest or rest.endswith(b'\n'):
+                    break
+            yield None
+            continue
+        yield line
+
+
+def analyze_entry_stream(lines, batch_size=None, max_in_flight=None, default_user=None, mode='model', view=None):
+    """Analyze an iterable of NDJSON entry lines, yielding per-entry results as chunks finish
+
+    At most `max_in_flight` chunks are being scored at once and no new input
+    is read while that window is full, so memory stays bounded however long
+    the stream is and a slow consumer throttles reading. Yields result dicts
+    (with `index`), {index, error} dicts, and a final {done, count, errors}.
+    """
+    batch_size = batch_size_limit(batch_size)
+    max_in_flight = max(1, max_in_flight or STREAM_MAX_IN_FLIGHT)
+    succeeded = 0
+    failed = 0
+    
+    def score(chunk):
+        try:
+            return analyze_chunk(chunk, mode=mode, view=view)
+        except AdmissionRejected as e:
+            return [], rejected_chunk_errors(chunk, e)
+    
+    def drain(done):
+        nonlocal succeeded, failed
+        for future in done:
+            chunk_results, chunk_errors = future.result()
+            succeeded += len(chunk_results)
+            failed += len(chunk_errors)
+            yield from chunk_results
+            yield from chunk_errors
     
-    return result
+    executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="stream")
+    in_flight = set()
+    chunk = []
+    index = 0
+    try:
+        for line in lines:
+            if line is not None and not line.strip():
+                continue
+            try:
+                if line is None:
+                    raise ValueError("Line too long")
+                chunk.append(parse_stream_line(index, line, default_user))
+            except ValueError as e:
+                failed += 1
+                yield {"index": index, "error": str(e)}
+            index += 1
+            
+            if len(chunk) >= batch_size:
+                in_flight.add(executor.submit(contextvars.copy_context().run, score, chunk))
+                chunk = []
+            
+            # Hand back whatever has finished; block only when the window is full
+            done = {future for future in in_flight if future.done()}
+            if len(in_flight) >= max_in_flight and not done:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            in_flight -= done
+            yield from drain(done)
+        
+        if chunk:
+            in_flight.add(executor.submit(contextvars.copy_context().run, score, chunk))
+        for future in as_completed(in_flight):
+            yield from drain([future])
+        in_flight.clear()
+        
+        yield {"done": True, "count": succeeded, "errors": failed}
+    finally:
+        # Client went away mid-stream: don't start queued chunks
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def get_emotional_summary(primary_emotion):
-    emotion_mapping = {
-        'joy': 'Happy and positive',
-        'sadness': 'Feeling down',
-        'anger': 'Frustrated or angry',
-        'fear': 'Anxious or worried',
-        'excitement': 'Excited and energized',
-        'love': 'Loving and warm',
-        'gratitude': 'Grateful and appreciative',
-        'nervousness': 'Nervous and uneasy',
-        'optimism': 'Hopeful and optimistic',
-        'disappointment': 'Disappointed',
-        'confusion': 'Confused or uncertain',
-        'caring': 'Caring and compassionate',
-        'neutral': 'Calm and neutral',
-        'grief': 'Experiencing deep loss and sorrow',
-        'admiration': 'Experiencing admiration',
-        'amusement': 'Experiencing amusement',
-        'annoyance': 'Feeling irritated',
-        'approval': 'Feeling supportive',
-        'desire': 'Feeling longing or desire',
-        'disapproval': 'Feeling critical',
-        'disgust': 'Feeling disgusted',
-        'embarrassment': 'Feeling embarrassed',
-        'pride': 'Feeling proud',
-        'realization': 'Having a realization',
-        'relief': 'Feeling relieved',
-        'remorse': 'Feeling regretful',
-        'surprise': 'Experiencing surprise'
-    }
-    return emotion_mapping.get(primary_emotion, f"Experiencing {primary_emotion}")
+    return EMOTION_SUMMARIES.get(primary_emotion, f"Experiencing {primary_emotion}")
+
+def read_json_body():
+    """request.get_json(), timed as the parse stage"""
+    started = time.perf_counter()
+    data = request.get_json()
+    STAGE_PARSE.observe(time.perf_counter() - started)
+    return data
+
+
+def payload_response(payload):
+    """payload as JSON (or MessagePack), gzipped when large and accepted, timed as the serialize stage"""
+    started = time.perf_counter()
+    body, headers = encode(
+        payload,
+        request.headers.get('Accept', ''),
+        request.headers.get('Accept-Encoding', ''),
+        RESPONSE_GZIP_MIN_BYTES,
+        RESPONSE_GZIP_LEVEL
+    )
+    response = Response(body, headers=headers)
+    STAGE_SERIALIZE.observe(time.perf_counter() - started)
+    return response
+
+
+@api.before_app_request
+def start_request_metrics():
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    g.metrics_started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.labels(g.metrics_endpoint).inc()
+
+
+@api.before_app_request
+def start_threads_on_first_request():
+    """Start the background threads in a server that didn't call start_background_threads()"""
+    if threads_started_pid != os.getpid():
+        start_background_threads()
+
+
+@api.before_app_request
+def identify_client():
+    """Attribute this request's inference work to its client for fair queuing"""
+    admission.set_client(request.headers.get(ADMISSION_CLIENT_HEADER) or request.remote_addr or 'anonymous')
+
+
+@api.after_app_request
+def finish_request_metrics(response):
+    endpoint = g.get('metrics_endpoint')
+    if endpoint is None:
+        return response
+    started = g.metrics_started
+    method = request.method
+    
+    def finish():
+        REQUESTS_IN_FLIGHT.labels(endpoint).dec()
+        REQUEST_SECONDS.labels(endpoint, method, str(response.status_code)).observe(time.perf_counter() - started)
+    
+    if response.is_streamed:
+        # The body is still being generated; stop the clock once it has been sent
+        response.call_on_close(finish)
+    else:
+        finish()
+    return response
+
 
 #Routes
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({
+    return jsonify(get_health_status()), 200
+
+
+def get_health_status():
+    return {
         "status": "healthy",
         "service": "Eunoia ML Analysis Service (HF API)",
         "model": "SamLowe/roberta-base-go_emotions",
-        "method": "Hugging Face Inference API",
+        "method": "Hugging Face Inference API" if INFERENCE_BACKEND == 'remote' else "Local CPU model",
+        "backend": inference_backend.describe(),
+        "inference": get_inference_stats(),
+        "cache": result_cache.stats() if result_cache is not None else None,
+        "micro_batching": micro_batcher.describe() if micro_batcher is not None else None,
+        "single_flight": single_flight.describe() if single_flight is not None else None,
+        "mood_store": mood_store.stats() if mood_store is not None else None,
+        "similarity": similarity_store.stats() if similarity_store is not None else None,
+        "circuit_breaker": circuit_breaker.describe() if circuit_breaker is not None else None,
+        "admission": admission_controller.stats() if admission_controller is not None else None,
+        "model_rate_limit": model_rate_limiter.stats() if model_rate_limiter is not None else None,
+        "lexicon": lexicon_classifier.describe(),
+        "jobs": job_queue.stats() if job_queue is not None else None,
+        "warmup": warmup.stats() if warmup is not None else None,
         "timestamp": datetime.now().isoformat()
-    }), 200
+    }
 
 
-@app.route('/analyze', methods=['POST'])
+@api.route('/ready', methods=['GET'])
+def readiness_check():
+    """200 once this process has warmed the inference backend, 503 + Retry-After until then"""
+    status, code, headers = get_readiness()
+    return jsonify(status), code, headers
+
+
+def get_readiness():
+    """(payload, status, headers) for /ready"""
+    if warmup is None or warmup.ready:
+        return {"success": True, "ready": True, "warmup": warmup.stats() if warmup is not None else None}, 200, {}
+    return {
+        "success": False,
+        "ready": False,
+        "error": "Warming up the inference backend",
+        "warmup": warmup.stats()
+    }, 503, {"Retry-After": str(max(1, int(WARMUP_RETRY_SECONDS)))}
+
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(get_health_status()), content_type=CONTENT_TYPE)
+
+
+def render_metrics(status):
+    """Prometheus text for the request/stage histograms plus the component
+    counters reported on /health (cache, batching, single-flight, upstream)"""
+    lines = REGISTRY.render()
+    inference = status["inference"]
+    lines += render_gauges("eunoia_model_calls_total", "Inference backend calls", inference["model_calls"], "counter")
+    lines += render_gauges("eunoia_entries_analyzed_total", "Journal entries analyzed",
+                           inference["entries_analyzed"], "counter")
+    
+    client = status["backend"].get("client")
+    if client is not None:
+        lines += render_gauges("eunoia_upstream_requests_total", "HTTP requests to the inference API, retries included",
+                               client["requests"], "counter")
+        lines += render_gauges("eunoia_upstream_retries_total", "Retried inference API requests",
+                               client["retries"], "counter")
+        lines += render_gauges("eunoia_upstream_responses_total",
+                               "Inference API responses by status code (error: no response)",
+                               client["status_codes"], "counter", labelname="code")
+    
+    cache = status["cache"]
+    if cache is not None:
+        lines += render_gauges("eunoia_cache_lookups_total", "Result cache lookups", {
+            "hit": cache["hits"], "shared_hit": cache["shared_hits"], "miss": cache["misses"]
+        }, "counter", labelname="result")
+        lines += render_gauges("eunoia_cache_hit_ratio", "Result cache hit rate since start", cache["hit_rate"])
+        lines += render_gauges("eunoia_cache_entries", "Entries in the in-process result cache", cache["size"])
+        lines += render_gauges("eunoia_cache_evictions_total", "Result cache evictions", cache["evictions"], "counter")
+    
+    batching = status["micro_batching"]
+    if batching is not None:
+        lines += render_gauges("eunoia_micro_batch_queue_depth", "Texts waiting for a micro-batch",
+                               batching["queue_depth"])
+        lines += render_gauges("eunoia_micro_batches_total", "Micro-batches sent", batching["batches"], "counter")
+        lines += render_gauges("eunoia_micro_batch_items_total", "Texts sent in micro-batches",
+                               batching["items"], "counter")
+    
+    flights = status["single_flight"]
+    if flights is not None:
+        lines += render_gauges("eunoia_single_flight_in_flight", "Distinct texts being inferred", flights["in_flight"])
+        lines += render_gauges("eunoia_single_flight_calls_total", "Single-flight calls by outcome", {
+            "leader": flights["leaders"],
+            "collapsed": flights["collapsed"],
+            "cross_process_collapsed": flights["cross_process_collapsed"]
+        }, "counter", labelname="outcome")
+    
+    moods = status["mood_store"]
+    if moods is not None:
+        lines += render_gauges("eunoia_mood_store_queue_depth", "Mood entries waiting to be written",
+                               moods["queue_depth"])
+        lines += render_gauges("eunoia_mood_store_recorded_total", "Mood entries written", moods["recorded"], "counter")
+        lines += render_gauges("eunoia_mood_store_write_failures_total", "Mood entries lost to write errors",
+                               moods["write_failures"], "counter")
+    
+    similarity = status["similarity"]
+    if similarity is not None:
+        lines += render_gauges("eunoia_similarity_queue_depth", "Entries waiting to be indexed for similarity search",
+                               similarity["queue_depth"])
+        lines += render_gauges("eunoia_similarity_rows", "Rows in the similarity index", {
+            space: index["rows"] for space, index in similarity["indexes"].items()
+        }, labelname="space")
+        lines += render_gauges("eunoia_similarity_write_failures_total", "Entries lost to similarity index write errors",
+                               similarity["write_failures"], "counter")
+    
+    jobs = status["jobs"]
+    if jobs is not None:
+        lines += render_gauges("eunoia_jobs", "Batch jobs by status", jobs["jobs"], labelname="status")
+        lines += render_gauges("eunoia_job_entries_processed_total", "Job entries analyzed by this process",
+                               jobs["entries"], "counter")
+        lines += render_gauges("eunoia_job_chunk_failures_total", "Job chunks that failed and were rescheduled",
+                               jobs["chunk_failures"], "counter")
+    
+    breaker = status["circuit_breaker"]
+    if breaker is not None:
+        lines += render_gauges("eunoia_circuit_breaker_state", "Inference circuit breaker state (1 for the current one)", {
+            state: int(breaker["state"] == state) for state in ("closed", "open", "half_open")
+        }, labelname="state")
+        lines += render_gauges("eunoia_circuit_breaker_opened_total", "Times the inference circuit opened",
+                               breaker["opened"], "counter")
+        lines += render_gauges("eunoia_circuit_breaker_rejected_total", "Inference calls rejected by the open circuit",
+                               breaker["rejected"], "counter")
+    
+    warm = status["warmup"]
+    lines += render_gauges("eunoia_ready", "1 once the inference backend has been warmed (see /ready)",
+                           int(warm is None or warm["ready"]))
+    if warm is not None:
+        if warm["phases_ms"] is not None:
+            lines += render_gauges("eunoia_warmup_phase_seconds", "Duration of each startup warmup phase", {
+                phase: ms / 1000 for phase, ms in warm["phases_ms"].items()
+            }, labelname="phase")
+        lines += render_gauges("eunoia_keep_warm_pings_total", "Keep-warm pings sent to the backend", {
+            "ok": warm["pings"], "error": warm["ping_failures"]
+        }, "counter", labelname="result")
+    
+    admission_status = status["admission"]
+    if admission_status is not None:
+        lines += render_gauges("eunoia_admission_queued", "Inference work waiting for an admission slot",
+                               admission_status["queued"], labelname="lane")
+        lines += render_gauges("eunoia_admission_running", "Admission slots in use", admission_status["running"])
+        lines += render_gauges("eunoia_admission_slots", "Admission slots", admission_status["slots"])
+    return "\n".join(lines) + "\n"
+
+
+@api.route('/analyze', methods=['POST'])
 def analyze_journal():
     try:
-        data = request.get_json()
+        data = read_json_body()
         
         if not data or 'content' not in data:
             return jsonify({
@@ -183,72 +1582,359 @@ def analyze_journal():
                 "error": "Content cannot be empty"
             }), 400
         
+        try:
+            aggregation, include_chunks = parse_analysis_options(data)
+            owner = parse_entry_owner(data)
+            deadline = parse_deadline(data)
+            mode = parse_mode(data)
+            view = ResultView(*parse_view_options(data))
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
         logger.info(f"Analyzing journal entry: {title[:50]}...")
         
         # Analyze the entry
-        result = analyze_journal_entry(title, content)
+        with deadline_scope(deadline):
+            result = analyze_journal_entry(title, content, aggregation, include_chunks, owner, mode, view)
         
-        logger.info(f"Analysis complete. Primary emotion: {result['primary_emotion']}")
+        logger.info(f"Analysis complete. Primary emotion: {result.get('primary_emotion')}")
         
-        return jsonify({
+        return payload_response({
             "success": True,
             "data": result
         }), 200
         
     except Exception as e:
         logger.error(f"Error analyzing journal: {str(e)}")
+        return exception_response(e)
+
+
+@api.route('/batch-analyze', methods=['POST'])
+def batch_analyze():
+    try:
+        data = read_json_body()
+        
+        try:
+            entries, options = parse_batch_request(data)
+            deadline = parse_deadline(data)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        # Chunks past the deadline come back as per-entry errors
+        with deadline_scope(deadline):
+            results, errors = analyze_journal_entries(entries, **options)
+        
+        return payload_response({
+            "success": True,
+            "data": results,
+            "count": len(results),
+            "errors": errors
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error in batch analysis: {str(e)}")
+        return exception_response(e)
+
+
+@api.route('/batch-analyze/stream', methods=['POST'])
+def batch_analyze_stream():
+    """Newline-delimited JSON in ({title, content} per line), NDJSON results out"""
+    batch_size = request.args.get('batch_size', type=int)
+    if batch_size is not None and batch_size < 1:
+        return jsonify({
+            "success": False,
+            "error": "'batch_size' must be a positive integer"
+        }), 400
+    default_user = request.args.get('user_id')
+    try:
+        mode = parse_mode(request.args)
+        view = ResultView(*parse_view_options(request.args))
+    except ValueError as e:
         return jsonify({
             "success": False,
             "error": str(e)
-        }), 500
+        }), 400
+    
+    stream = request.stream
+    
+    def generate():
+        lines = iter_stream_lines(stream)
+        for item in analyze_entry_stream(lines, batch_size=batch_size, default_user=default_user, mode=mode,
+                                         view=view):
+            yield dumps(item) + b"\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 
-@app.route('/batch-analyze', methods=['POST'])
-def batch_analyze():
+@api.route('/users/<user_id>/trends', methods=['GET'])
+def user_trends(user_id):
+    """Daily or weekly mood trends for a user, read from the precomputed buckets"""
+    if mood_store is None:
+        return jsonify({
+            "success": False,
+            "error": "Mood analytics is disabled (set MOOD_DB_PATH)"
+        }), 503
+    
+    try:
+        granularity, buckets, window = parse_trend_options(request.args)
+        trends = mood_store.trends(user_id, granularity, limit=buckets, window=window)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    
+    if trends is None:
+        return jsonify({
+            "success": False,
+            "error": "No entries recorded for this user"
+        }), 404
+    
+    return jsonify({
+        "success": True,
+        "data": trends
+    }), 200
+
+
+@api.route('/users/<user_id>/similar', methods=['POST'])
+def similar_entries(user_id):
+    """A user's indexed entries closest to one of their entries, or to a new text"""
+    if similarity_store is None:
+        return jsonify({
+            "success": False,
+            "error": "Similarity search is disabled (set SIMILARITY_INDEX_PATH)"
+        }), 503
+    
     try:
-        data = request.get_json()
+        data = read_json_body()
         
-        if not data or 'entries' not in data:
+        try:
+            space, k, approximate, entry_id, full_text = parse_similarity_request(data)
+            deadline = parse_deadline(data)
+        except ValueError as e:
             return jsonify({
                 "success": False,
-                "error": "Missing 'entries' field"
+                "error": str(e)
             }), 400
         
-        entries = data.get('entries', [])
+        query = None
+        if entry_id is None:
+            with deadline_scope(deadline):
+                query = similarity_query(space, full_text)
+        found = similarity_store.search(user_id, space, query, entry_id, k, approximate)
+        
+        if found is None:
+            return jsonify({
+                "success": False,
+                "error": "Entry not found"
+            }), 404
+        
+        return payload_response({
+            "success": True,
+            "data": {"user_id": user_id, "space": space, **found}
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error in similarity search: {str(e)}")
+        return exception_response(e)
+
+
+@api.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a /batch-analyze request body as a background job; poll the returned id"""
+    if job_queue is None:
+        return jsonify({
+            "success": False,
+            "error": "Job queue is disabled (set JOB_DB_PATH)"
+        }), 503
+    
+    try:
+        data = read_json_body()
         
-        if not isinstance(entries, list):
+        try:
+            entries, options = parse_batch_request(data)
+            if len(entries) > JOB_MAX_ENTRIES:
+                raise ValueError(f"A job can hold at most {JOB_MAX_ENTRIES} entries")
+        except ValueError as e:
             return jsonify({
                 "success": False,
-                "error": "'entries' must be an array"
+                "error": str(e)
             }), 400
         
-        results = []
-        for entry in entries:
-            title = entry.get('title', 'Untitled')
-            content = entry.get('content', '')
-            
-            if content.strip():
-                result = analyze_journal_entry(title, content)
-                results.append(result)
+        # Its chunks are queued for admission in the submitting client's name
+        job = queue_job(entries, dict(options, client=admission.current_client()))
+        logger.info(f"Queued job {job['id']} with {job['total']} entries")
         
         return jsonify({
             "success": True,
-            "data": results,
-            "count": len(results)
-        }), 200
+            "data": job
+        }), 202, {"Location": f"/jobs/{job['id']}"}
         
     except Exception as e:
-        logger.error(f"Error in batch analysis: {str(e)}")
+        logger.error(f"Error queueing job: {str(e)}")
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
 
-@app.route('/analyze-text', methods=['POST'])
+@api.route('/jobs/<job_id>', methods=['GET', 'DELETE'])
+def job_status(job_id):
+    """Progress of a job, or DELETE to cancel it and drop its results"""
+    if job_queue is None:
+        return jsonify({
+            "success": False,
+            "error": "Job queue is disabled (set JOB_DB_PATH)"
+        }), 503
+    
+    if request.method == 'DELETE':
+        found = job_queue.delete(job_id)
+        job = None
+    else:
+        job = job_queue.get(job_id)
+        found = job is not None
+    
+    if not found:
+        return jsonify({
+            "success": False,
+            "error": "Job not found"
+        }), 404
+    
+    return jsonify({
+        "success": True,
+        "data": job
+    }), 200
+
+
+@api.route('/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """A page of a job's per-entry results and errors, by entry index"""
+    if job_queue is None:
+        return jsonify({
+            "success": False,
+            "error": "Job queue is disabled (set JOB_DB_PATH)"
+        }), 503
+    
+    try:
+        offset, limit = parse_page_options(request.args)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Job not found"
+        }), 404
+    
+    results, errors = job_queue.results(job_id, offset, limit)
+    return payload_response(job_results_page(job, results, errors, offset, limit)), 200
+
+
+def parse_page_options(args):
+    """(offset, limit) from job result query parameters, or raise ValueError"""
+    try:
+        offset = int(args.get('offset', 0))
+        limit = int(args.get('limit', 100))
+    except ValueError:
+        raise ValueError("'offset' and 'limit' must be integers")
+    if offset < 0:
+        raise ValueError("'offset' must not be negative")
+    if not 1 <= limit <= JOB_RESULTS_MAX_PAGE:
+        raise ValueError(f"'limit' must be between 1 and {JOB_RESULTS_MAX_PAGE}")
+    return offset, limit
+
+
+def job_results_page(job, results, errors, offset, limit):
+    """Response body for a results page; next_offset is None on the last page"""
+    end = offset + limit
+    return {
+        "success": True,
+        "job": job,
+        "data": results,
+        "errors": errors,
+        "offset": offset,
+        "next_offset": end if end < job["total"] else None
+    }
+
+
+def parse_trend_options(args):
+    """(granularity, buckets, window) from trend query parameters, or raise ValueError"""
+    granularity = args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"'granularity' must be one of: {', '.join(GRANULARITIES)}")
+    try:
+        buckets = int(args.get('buckets', 30))
+        window = int(args.get('window', 7))
+    except ValueError:
+        raise ValueError("'buckets' and 'window' must be integers")
+    if not 1 <= buckets <= MOOD_TRENDS_MAX_BUCKETS:
+        raise ValueError(f"'buckets' must be between 1 and {MOOD_TRENDS_MAX_BUCKETS}")
+    if not 1 <= window <= MOOD_TRENDS_MAX_BUCKETS:
+        raise ValueError(f"'window' must be between 1 and {MOOD_TRENDS_MAX_BUCKETS}")
+    return granularity, buckets, window
+
+
+def parse_similarity_request(data):
+    """(space, k, approximate, entry_id, full_text) from a /similar body, or raise ValueError
+
+    The query is either a stored entry (entry_id) or a new text (content,
+    with an optional title); full_text is None for the former.
+    """
+    if not data:
+        raise ValueError("Send 'entry_id' or 'content'")
+    space = data.get('space', 'scores')
+    if space not in SPACES:
+        raise ValueError(f"'space' must be one of: {', '.join(SPACES)}")
+    if space not in similarity_store.indexes:
+        raise ValueError("Embedding search is disabled (set SIMILARITY_EMBEDDINGS=1)")
+    k = data.get('k', 10)
+    if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= SIMILARITY_MAX_K:
+        raise ValueError(f"'k' must be an integer between 1 and {SIMILARITY_MAX_K}")
+    approximate = data.get('approximate')
+    if approximate is not None and not isinstance(approximate, bool):
+        raise ValueError("'approximate' must be a boolean")
+    
+    entry_id = data.get('entry_id')
+    if entry_id is not None:
+        if isinstance(entry_id, bool) or not isinstance(entry_id, (str, int)):
+            raise ValueError("'entry_id' must be a string")
+        return space, k, approximate, str(entry_id), None
+    content = data.get('content')
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError("Send 'entry_id' or a non-empty 'content'")
+    return space, k, approximate, None, f"{data.get('title', 'Untitled Entry')}. {content}"
+
+
+def similarity_query(space, full_text, texts=None, text_scores=None):
+    """Query vector for a text: its embedding, or its entry-level model scores
+
+    texts and text_scores are get_entry_text_scores() output, for callers
+    that already have them.
+    """
+    if space == 'embedding':
+        with admitted(INTERACTIVE):
+            return similarity_store.embed([full_text])[0]
+    if texts is None:
+        with admitted(INTERACTIVE):
+            texts, text_scores = get_entry_text_scores(full_text)
+    matrix, _ = combine_entry_scores(texts, text_scores, [(0, len(texts))])
+    return matrix[0]
+
+
+@api.route('/analyze-text', methods=['POST'])
 def analyze_text_endpoint():
     try:
-        data = request.get_json()
+        data = read_json_body()
         
         if not data or 'text' not in data:
             return jsonify({
@@ -264,22 +1950,32 @@ def analyze_text_endpoint():
                 "error": "Text cannot be empty"
             }), 400
         
-        result = analyze_text(text)
+        try:
+            deadline = parse_deadline(data)
+            mode = parse_mode(data)
+            view = ResultView(*parse_view_options(data, 'labeled'))
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        with deadline_scope(deadline):
+            result, degraded = analyze_text_scores(text, mode, view)
+        if degraded:
+            result["degraded"] = True
         
-        return jsonify({
+        return payload_response({
             "success": True,
             "data": result
         }), 200
         
     except Exception as e:
         logger.error(f"Error analyzing text: {str(e)}")
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
+        return exception_response(e)
 
 
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({
         "success": False,
@@ -287,7 +1983,7 @@ def not_found(error):
     }), 404
 
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     return jsonify({
         "success": False,
@@ -295,9 +1991,28 @@ def internal_error(error):
     }), 500
 
 
+def create_app():
+    """Application factory, e.g. `gunicorn 'application:create_app()'`
+
+    Models, connection pools and caches are module state built once at
+    import, so every app created here shares them.
+    """
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for Node.js backend
+    app.register_blueprint(api)
+    return app
+
+
+# Queued work is flushed on a clean exit (gunicorn also calls this from worker_exit)
+atexit.register(stop_background_threads)
+
+app = create_app()
+
+
 if __name__ == '__main__':
     import os
     port = int(os.environ.get('PORT', 5001))
     logger.info(f"Starting Eunoia ML Service on port {port}")
+    start_background_threads()
     # logger.info("Using Hugging Face Inference API (no local model)")
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,867 @@
+"""
+Async (ASGI) variant of the Eunoia ML service.
+
+Serves the same routes with the same JSON contract as application.py, but
+inference calls don't block a worker: the remote backend goes through a
+pooled aiohttp client, a semaphore caps concurrent upstream calls, and
+/batch-analyze fans its micro-batches out concurrently. Post-processing,
+caching and counters are shared with application.py.
+
+Run with:
+    uvicorn async_application:app --host 0.0.0.0 --port 5001
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.requests import ClientDisconnect
+from starlette.routing import Match
+
+import admission
+import application as core
+import deadlines
+from admission import BULK, INTERACTIVE, AdmissionRejected
+from backends import AsyncInferenceClient
+from batching import AsyncMicroBatcher
+from circuit import CircuitOpenError
+from deadlines import deadline_scope
+from metrics import CONTENT_TYPE
+from serialization import ResultView, dumps, encode, parse_view_options
+from singleflight import AsyncSingleFlight, LeaderAbandoned
+
+logger = logging.getLogger(__name__)
+
+# Max upstream inference calls in flight per process
+INFERENCE_CONCURRENCY = int(os.environ.get('INFERENCE_CONCURRENCY', 32))
+
+async_client = None
+inference_semaphore = None
+micro_batcher = None
+pool_warmup = None
+single_flight = AsyncSingleFlight() if core.SINGLE_FLIGHT else None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global async_client, inference_semaphore, micro_batcher, pool_warmup
+    inference_semaphore = asyncio.Semaphore(INFERENCE_CONCURRENCY)
+    # Warmup, mood store, similarity index and job worker threads shared with application.py
+    core.start_background_threads()
+    if core.INFERENCE_BACKEND == 'remote':
+        async_client = AsyncInferenceClient(
+            core.HF_API_URL,
+            api_token=core.HF_API_TOKEN,
+            timeout=core.HF_TIMEOUT,
+            pool_size=max(core.HF_POOL_SIZE, INFERENCE_CONCURRENCY),
+            max_retries=core.HF_MAX_RETRIES,
+            backoff_base=core.HF_BACKOFF_BASE,
+            backoff_max=core.HF_BACKOFF_MAX
+        )
+        if core.warmup is not None:
+            pool_warmup = asyncio.ensure_future(warm_connection_pool())
+    if core.MICRO_BATCH_WINDOW_MS > 0:
+        micro_batcher = AsyncMicroBatcher(
+            infer_batch,
+            window=core.MICRO_BATCH_WINDOW_MS / 1000.0,
+            max_batch_size=core.MICRO_BATCH_MAX_SIZE
+        )
+    try:
+        yield
+    finally:
+        if pool_warmup is not None:
+            pool_warmup.cancel()
+            pool_warmup = None
+        if micro_batcher is not None:
+            await micro_batcher.close()
+            micro_batcher = None
+        if async_client is not None:
+            await async_client.close()
+            async_client = None
+        await asyncio.to_thread(core.stop_background_threads)
+
+
+app = FastAPI(title="Eunoia ML Service", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+async def warm_connection_pool():
+    """Open WARMUP_CONCURRENCY pooled aiohttp connections once application.py's
+    warmup (which uses the sync client) has the upstream model loaded"""
+    while not core.warmup.ready:
+        await asyncio.sleep(0.1)
+    texts = core.warmup.texts
+    try:
+        await asyncio.gather(*(call_model([texts[i % len(texts)]]) for i in range(core.WARMUP_CONCURRENCY)))
+    except Exception as e:
+        # Connections are opened on demand instead; not worth holding readiness for
+        logger.warning(f"Opening upstream connections failed: {str(e)}")
+
+
+async def call_model(inputs):
+    """Async counterpart of call_huggingface_api"""
+    async with inference_semaphore:
+        if async_client is None:
+            # Local backends are CPU bound; keep them off the event loop
+            return await asyncio.to_thread(core.call_huggingface_api, inputs)
+        core.before_inference_call()
+        await asyncio.sleep(core.reserve_model_call())
+        started = time.perf_counter()
+        error = None
+        try:
+            return await async_client.post({"inputs": inputs, "options": {"wait_for_model": True}})
+        except Exception as e:
+            error = e
+            logger.error(f"Error calling Hugging Face API: {str(e)}")
+            raise
+        finally:
+            core.after_inference_call(inputs, time.perf_counter() - started, error)
+
+
+@asynccontextmanager
+async def admitted(lane, cost=1):
+    """Async counterpart of application.admitted; queues without blocking the event loop"""
+    controller = core.admission_controller
+    if controller is None:
+        yield
+        return
+    try:
+        ticket = await controller.acquire_async(lane, cost=cost)
+    except AdmissionRejected as e:
+        core.ADMISSION_REJECTED.labels(lane, str(e.status)).inc()
+        raise
+    core.ADMISSION_WAIT_SECONDS.labels(lane).observe(ticket.waited)
+    try:
+        yield
+    finally:
+        controller.release(ticket)
+
+
+async def run_cache(func, *args):
+    """Run a result-cache helper, off the event loop when it reads or writes the shared SQLite store"""
+    if core.result_cache is not None and core.result_cache.shared_store is not None:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+async def get_emotion_scores(text):
+    results, keys, missing = await run_cache(core.lookup_cached_scores, [text])
+    if not missing:
+        return results[0]
+
+    if single_flight is not None:
+        # Concurrent callers with the same text share one model call
+        return await single_flight.do(keys[0], lambda: infer_text(text, keys[0]))
+    return await infer_text(text, keys[0])
+
+
+async def infer_text(text, key=None):
+    """Async counterpart of application.infer_text"""
+    if micro_batcher is not None:
+        # Coalesced with other concurrent requests into one model call
+        scores = await deadlines.wait_async(asyncio.shield(micro_batcher(text)))
+    else:
+        api_result = await call_model(text)
+        core.record_model_call()
+
+        # API returns list of lists, take first result
+        if isinstance(api_result, list) and len(api_result) > 0:
+            scores = api_result[0]
+        else:
+            scores = api_result
+    return (await run_cache(core.merge_batch_scores, [None], [key], [0], [scores]))[0]
+
+
+async def infer_batch(texts):
+    """One list-valued model call for many texts, used by the micro-batcher"""
+    api_result = await call_model(texts)
+    core.record_model_call()
+    return api_result
+
+
+async def get_emotion_scores_batch(texts):
+    """Async counterpart of application.get_emotion_scores_batch"""
+    results, keys, missing = await run_cache(core.lookup_cached_scores, texts)
+    if single_flight is None:
+        await infer_missing(texts, results, keys, missing)
+        return results
+
+    leading = {}
+    waiting = []
+    for i in missing:
+        if keys[i] in leading:
+            single_flight.stats.add("collapsed")
+            waiting.append((i, None))
+            continue
+        future, leader = single_flight.join(keys[i])
+        if leader:
+            leading[keys[i]] = i
+        else:
+            waiting.append((i, future))
+
+    try:
+        await infer_missing(texts, results, keys, list(leading.values()))
+    except BaseException as e:
+        # A cancelled leader hands its texts over like one that ran out of time
+        error = e if isinstance(e, Exception) else LeaderAbandoned()
+        for key, i in leading.items():
+            single_flight.finish(key, results[i], error=None if results[i] is not None else error)
+        raise
+    for key, i in leading.items():
+        single_flight.finish(key, results[i])
+
+    for i, future in waiting:
+        if future is None:
+            results[i] = results[leading[keys[i]]]
+            continue
+        try:
+            results[i] = await deadlines.wait_async(asyncio.shield(future))
+        except LeaderAbandoned:
+            # The other request gave up on its own deadline or admission; infer it here
+            results[i] = await get_emotion_scores(texts[i])
+    return results
+
+
+async def infer_missing(texts, results, keys, missing):
+    """Async counterpart of application.infer_missing, with the parts sent concurrently"""
+    parts = [missing[start:start + core.MAX_BATCH_SIZE] for start in range(0, len(missing), core.MAX_BATCH_SIZE)]
+    api_results = await asyncio.gather(*(call_model([texts[i] for i in part]) for part in parts))
+    for part, api_result in zip(parts, api_results):
+        core.record_model_call()
+        await run_cache(core.merge_batch_scores, results, keys, part, api_result)
+
+
+async def get_entry_text_scores(full_text):
+    """Async counterpart of application.get_entry_text_scores"""
+    texts = core.split_entry_text(full_text)
+    if len(texts) == 1:
+        return texts, [await get_emotion_scores(full_text)]
+    return texts, await get_emotion_scores_batch(texts)
+
+
+async def analyze_journal_entry(title, content, aggregation=None, include_chunks=False, owner=None, mode='model',
+                                view=None):
+    full_text = f"{title}. {content}"
+    if mode == 'fast':
+        return core.analyze_entries_fast([(title, full_text)], view)[0]
+    degraded = None
+    async with admitted(INTERACTIVE):
+        started = time.perf_counter()
+        try:
+            texts, text_scores = await get_entry_text_scores(full_text)
+        except CircuitOpenError as e:
+            texts, text_scores = core.degraded_entry_scores(full_text, e)
+            degraded = [True]
+        core.STAGE_INFERENCE.observe(time.perf_counter() - started)
+    matrix, chunks = core.combine_entry_scores(texts, text_scores, [(0, len(texts))], aggregation)
+    return core.build_entry_results(
+        [(title, full_text)], matrix, chunks if include_chunks else None, [owner], degraded, view=view
+    )[0]
+
+
+async def analyze_journal_entries(entries, batch_size=None, aggregation=None, include_chunks=False,
+                                  default_user=None, mode='model', fields=None, score_format=None):
+    """Like application.analyze_journal_entries, with chunks inferred concurrently
+
+    As there, AdmissionRejected is raised if admission control turns away
+    the first chunk; later chunks it turns away become errors.
+    """
+    pending, errors = core.prepare_batch_entries(entries, default_user)
+    view = ResultView(fields, score_format)
+    chunks = core.chunk_entries(pending, batch_size)
+    outcomes = []
+    if chunks:
+        # The rest only start once the first chunk holds its slot, so a rejected
+        # batch is refused before any of its work is done
+        first_admitted = asyncio.Event()
+        first = asyncio.ensure_future(
+            analyze_chunk(chunks[0], aggregation, include_chunks, mode, view, first_admitted)
+        )
+        waiter = asyncio.ensure_future(first_admitted.wait())
+        try:
+            await asyncio.wait([first, waiter], return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            first.cancel()
+            raise
+        finally:
+            waiter.cancel()
+        if first.done():
+            first.result()
+        outcomes = await asyncio.gather(
+            first,
+            *(analyze_chunk(chunk, aggregation, include_chunks, mode, view) for chunk in chunks[1:]),
+            return_exceptions=True
+        )
+
+    results = []
+    for chunk, outcome in zip(chunks, outcomes):
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, AdmissionRejected):
+                raise outcome
+            outcome = [], core.rejected_chunk_errors(chunk, outcome)
+        chunk_results, chunk_errors = outcome
+        results.extend(chunk_results)
+        errors.extend(chunk_errors)
+
+    results.sort(key=lambda r: r["index"])
+    errors.sort(key=lambda e: e["index"])
+    return results, errors
+
+
+async def analyze_chunk(chunk, aggregation=None, include_chunks=False, mode='model', view=None, on_admitted=None):
+    """Async counterpart of application.analyze_chunk
+
+    on_admitted, an asyncio.Event, is set once the chunk holds its admission slot.
+    """
+    if mode == 'fast':
+        # Microseconds of CPU per entry; not worth a thread hop
+        return core.analyze_chunk(chunk, mode=mode, view=view)
+    texts, spans = core.plan_entry_chunks([text for _, _, text, _ in chunk])
+    try:
+        with deadline_scope(core.REQUEST_DEADLINE):
+            async with admitted(BULK, len(texts)):
+                if on_admitted is not None:
+                    on_admitted.set()
+                started = time.perf_counter()
+                degraded = None
+                try:
+                    text_scores = await get_emotion_scores_batch(texts)
+                except CircuitOpenError as e:
+                    text_scores = core.degraded_scores(texts, e)
+                    degraded = [True] * len(chunk)
+                core.STAGE_INFERENCE.observe(time.perf_counter() - started)
+            results = core.build_chunk_results(
+                chunk, texts, text_scores, spans, aggregation, include_chunks, degraded, view
+            )
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        logger.error(f"Error analyzing batch chunk at entry {chunk[0][0]}: {str(e)}")
+        return [], [{"index": index, "error": str(e)} for index, _, _, _ in chunk]
+    return results, []
+
+
+async def iter_stream_lines(chunks, max_line_bytes=None):
+    """Split an async byte-chunk iterator into lines, holding at most one line
+
+    Lines longer than max_line_bytes are replaced by None (and skipped).
+    """
+    max_line_bytes = max_line_bytes or core.STREAM_MAX_LINE_BYTES
+    buffer = b''
+    oversized = False
+    async for data in chunks:
+        buffer += data
+        while True:
+            newline = buffer.find(b'\n')
+            if newline < 0:
+                break
+            line, buffer = buffer[:newline + 1], buffer[newline + 1:]
+            if oversized or len(line) > max_line_bytes:
+                oversized = False
+                yield None
+            else:
+                yield line
+        if len(buffer) > max_line_bytes:
+            buffer = b''
+            oversized = True
+    if oversized:
+        yield None
+    elif buffer:
+        yield buffer
+
+
+async def analyze_entry_stream(lines, batch_size=None, max_in_flight=None, default_user=None, mode='model',
+                               view=None):
+    """Async counterpart of application.analyze_entry_stream"""
+    batch_size = core.batch_size_limit(batch_size)
+    max_in_flight = max(1, max_in_flight or core.STREAM_MAX_IN_FLIGHT)
+    counts = {"succeeded": 0, "failed": 0}
+
+    async def score(chunk):
+        try:
+            return await analyze_chunk(chunk, mode=mode, view=view)
+        except AdmissionRejected as e:
+            return [], core.rejected_chunk_errors(chunk, e)
+
+    def drain(done):
+        items = []
+        for task in done:
+            chunk_results, chunk_errors = task.result()
+            counts["succeeded"] += len(chunk_results)
+            counts["failed"] += len(chunk_errors)
+            items.extend(chunk_results)
+            items.extend(chunk_errors)
+        return items
+
+    in_flight = set()
+    chunk = []
+    index = 0
+    try:
+        async for line in lines:
+            if line is not None and not line.strip():
+                continue
+            try:
+                if line is None:
+                    raise ValueError("Line too long")
+                chunk.append(core.parse_stream_line(index, line, default_user))
+            except ValueError as e:
+                counts["failed"] += 1
+                yield {"index": index, "error": str(e)}
+            index += 1
+
+            if len(chunk) >= batch_size:
+                in_flight.add(asyncio.ensure_future(score(chunk)))
+                chunk = []
+
+            # Hand back whatever has finished; block only when the window is full
+            done = {task for task in in_flight if task.done()}
+            if len(in_flight) >= max_in_flight and not done:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            in_flight -= done
+            for item in drain(done):
+                yield item
+
+        if chunk:
+            in_flight.add(asyncio.ensure_future(score(chunk)))
+        while in_flight:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for item in drain(done):
+                yield item
+
+        yield {"done": True, "count": counts["succeeded"], "errors": counts["failed"]}
+    finally:
+        # Client went away mid-stream: stop outstanding chunks
+        for task in in_flight:
+            task.cancel()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body generator keeps reading the request body
+
+    Starlette normally watches receive() for a disconnect while streaming,
+    which would swallow request body chunks the generator still needs; here
+    a disconnect surfaces through request.stream() instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+
+
+def error_response(message, status_code):
+    return JSONResponse({"success": False, "error": message}, status_code=status_code)
+
+
+def exception_response(error):
+    """429/503/504 as in application.exception_response, 500 for anything else"""
+    inference_error = core.inference_error_response(error)
+    if inference_error is None:
+        return error_response(str(error), 500)
+    payload, status, headers = inference_error
+    return JSONResponse(payload, status_code=status, headers=headers)
+
+
+async def read_json_body(request):
+    """request.json(), timed as the parse stage"""
+    started = time.perf_counter()
+    data = await request.json()
+    core.STAGE_PARSE.observe(time.perf_counter() - started)
+    return data
+
+
+def payload_response(request, payload):
+    """A 200 response negotiated as in application.payload_response, timed as the serialize stage"""
+    started = time.perf_counter()
+    body, headers = encode(
+        payload,
+        request.headers.get('accept', ''),
+        request.headers.get('accept-encoding', ''),
+        core.RESPONSE_GZIP_MIN_BYTES,
+        core.RESPONSE_GZIP_LEVEL
+    )
+    response = Response(body, status_code=200, headers=headers)
+    core.STAGE_SERIALIZE.observe(time.perf_counter() - started)
+    return response
+
+
+class RequestMetricsMiddleware:
+    """In-flight gauge and latency histogram per route, as in application.py
+
+    Plain ASGI rather than an http middleware so streamed responses are
+    timed until their last chunk and their request bodies are left alone.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        endpoint = route_path(scope)
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        in_flight = core.REQUESTS_IN_FLIGHT.labels(endpoint)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            core.REQUEST_SECONDS.labels(endpoint, scope["method"], str(status[0])).observe(
+                time.perf_counter() - started
+            )
+
+
+class ClientIdentityMiddleware:
+    """Attributes each request's inference work to its client for fair
+    queuing, as application.identify_client does"""
+
+    def __init__(self, app):
+        self.app = app
+        self.header = core.ADMISSION_CLIENT_HEADER.lower().encode('latin-1')
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        client = next((value.decode('latin-1') for name, value in scope["headers"] if name == self.header), None)
+        if not client and scope.get("client"):
+            client = scope["client"][0]
+        with admission.client_scope(client or 'anonymous'):
+            await self.app(scope, receive, send)
+
+
+def route_path(scope):
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+app.add_middleware(ClientIdentityMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+
+
+def get_health_status():
+    """application.get_health_status with this process's async components"""
+    status = core.get_health_status()
+    status["micro_batching"] = micro_batcher.describe() if micro_batcher is not None else None
+    status["single_flight"] = single_flight.describe() if single_flight is not None else None
+    if async_client is not None:
+        status["backend"]["client"] = async_client.stats()
+    return status
+
+
+#Routes
+@app.get('/health')
+async def health_check():
+    return JSONResponse(get_health_status(), status_code=200)
+
+
+@app.get('/ready')
+async def readiness_check():
+    """application.readiness_check, also waiting for the aiohttp pool to be opened"""
+    payload, status, headers = core.get_readiness()
+    if status == 200 and pool_warmup is not None and not pool_warmup.done():
+        payload, status = dict(payload, success=False, ready=False, error="Opening upstream connections"), 503
+        headers = {"Retry-After": "1"}
+    return JSONResponse(payload, status_code=status, headers=headers)
+
+
+@app.get('/metrics')
+async def metrics():
+    return Response(core.render_metrics(get_health_status()), media_type=CONTENT_TYPE)
+
+
+@app.post('/analyze')
+async def analyze_journal(request: Request):
+    try:
+        data = await read_json_body(request)
+
+        if not data or 'content' not in data:
+            return error_response("Missing 'content' field", 400)
+
+        title = data.get('title', 'Untitled Entry')
+        content = data.get('content', '')
+
+        if not content.strip():
+            return error_response("Content cannot be empty", 400)
+
+        try:
+            aggregation, include_chunks = core.parse_analysis_options(data)
+            owner = core.parse_entry_owner(data)
+            deadline = core.parse_deadline(data)
+            mode = core.parse_mode(data)
+            view = ResultView(*parse_view_options(data))
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        logger.info(f"Analyzing journal entry: {title[:50]}...")
+
+        with deadline_scope(deadline):
+            result = await analyze_journal_entry(title, content, aggregation, include_chunks, owner, mode, view)
+
+        logger.info(f"Analysis complete. Primary emotion: {result.get('primary_emotion')}")
+
+        return payload_response(request, {"success": True, "data": result})
+
+    except Exception as e:
+        logger.error(f"Error analyzing journal: {str(e)}")
+        return exception_response(e)
+
+
+@app.post('/batch-analyze')
+async def batch_analyze(request: Request):
+    try:
+        data = await read_json_body(request)
+
+        try:
+            entries, options = core.parse_batch_request(data)
+            deadline = core.parse_deadline(data)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        # Chunks past the deadline come back as per-entry errors
+        with deadline_scope(deadline):
+            results, errors = await analyze_journal_entries(entries, **options)
+
+        return payload_response(request, {
+            "success": True,
+            "data": results,
+            "count": len(results),
+            "errors": errors
+        })
+
+    except Exception as e:
+        logger.error(f"Error in batch analysis: {str(e)}")
+        return exception_response(e)
+
+
+@app.post('/batch-analyze/stream')
+async def batch_analyze_stream(request: Request):
+    """Newline-delimited JSON in ({title, content} per line), NDJSON results out"""
+    batch_size = request.query_params.get('batch_size')
+    if batch_size is not None:
+        try:
+            batch_size = int(batch_size)
+        except ValueError:
+            batch_size = None
+        if batch_size is not None and batch_size < 1:
+            return error_response("'batch_size' must be a positive integer", 400)
+
+    default_user = request.query_params.get('user_id')
+    try:
+        mode = core.parse_mode(request.query_params)
+        view = ResultView(*parse_view_options(request.query_params))
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    async def generate():
+        lines = iter_stream_lines(request.stream())
+        async for item in analyze_entry_stream(lines, batch_size=batch_size, default_user=default_user, mode=mode,
+                                               view=view):
+            yield dumps(item) + b"\n"
+
+    return DuplexStreamingResponse(generate(), media_type='application/x-ndjson')
+
+
+@app.get('/users/{user_id}/trends')
+async def user_trends(user_id: str, request: Request):
+    """Daily or weekly mood trends for a user, read from the precomputed buckets"""
+    if core.mood_store is None:
+        return error_response("Mood analytics is disabled (set MOOD_DB_PATH)", 503)
+
+    try:
+        granularity, buckets, window = core.parse_trend_options(request.query_params)
+        trends = await asyncio.to_thread(
+            core.mood_store.trends, user_id, granularity, limit=buckets, window=window
+        )
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    if trends is None:
+        return error_response("No entries recorded for this user", 404)
+
+    return JSONResponse({"success": True, "data": trends}, status_code=200)
+
+
+@app.post('/users/{user_id}/similar')
+async def similar_entries(user_id: str, request: Request):
+    """A user's indexed entries closest to one of their entries, or to a new text"""
+    if core.similarity_store is None:
+        return error_response("Similarity search is disabled (set SIMILARITY_INDEX_PATH)", 503)
+
+    try:
+        data = await read_json_body(request)
+
+        try:
+            space, k, approximate, entry_id, full_text = core.parse_similarity_request(data)
+            deadline = core.parse_deadline(data)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        query = None
+        if entry_id is None:
+            with deadline_scope(deadline):
+                if space == 'embedding':
+                    query = await asyncio.to_thread(core.similarity_query, space, full_text)
+                else:
+                    async with admitted(INTERACTIVE):
+                        texts, text_scores = await get_entry_text_scores(full_text)
+                    query = core.similarity_query(space, full_text, texts, text_scores)
+        found = await asyncio.to_thread(core.similarity_store.search, user_id, space, query, entry_id, k, approximate)
+
+        if found is None:
+            return error_response("Entry not found", 404)
+
+        return payload_response(request, {"success": True, "data": {"user_id": user_id, "space": space, **found}})
+
+    except Exception as e:
+        logger.error(f"Error in similarity search: {str(e)}")
+        return exception_response(e)
+
+
+@app.post('/jobs')
+async def submit_job(request: Request):
+    """Queue a /batch-analyze request body as a background job; poll the returned id"""
+    if core.job_queue is None:
+        return error_response("Job queue is disabled (set JOB_DB_PATH)", 503)
+
+    try:
+        data = await read_json_body(request)
+
+        try:
+            entries, options = core.parse_batch_request(data)
+            if len(entries) > core.JOB_MAX_ENTRIES:
+                raise ValueError(f"A job can hold at most {core.JOB_MAX_ENTRIES} entries")
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        # Its chunks are queued for admission in the submitting client's name
+        job = await asyncio.to_thread(core.queue_job, entries, dict(options, client=admission.current_client()))
+        logger.info(f"Queued job {job['id']} with {job['total']} entries")
+
+        return JSONResponse({"success": True, "data": job}, status_code=202, headers={"Location": f"/jobs/{job['id']}"})
+
+    except Exception as e:
+        logger.error(f"Error queueing job: {str(e)}")
+        return error_response(str(e), 500)
+
+
+@app.get('/jobs/{job_id}')
+async def job_status(job_id: str):
+    """Progress of a job"""
+    if core.job_queue is None:
+        return error_response("Job queue is disabled (set JOB_DB_PATH)", 503)
+
+    job = await asyncio.to_thread(core.job_queue.get, job_id)
+    if job is None:
+        return error_response("Job not found", 404)
+    return JSONResponse({"success": True, "data": job}, status_code=200)
+
+
+@app.delete('/jobs/{job_id}')
+async def delete_job(job_id: str):
+    """Cancel a job and drop its results"""
+    if core.job_queue is None:
+        return error_response("Job queue is disabled (set JOB_DB_PATH)", 503)
+
+    if not await asyncio.to_thread(core.job_queue.delete, job_id):
+        return error_response("Job not found", 404)
+    return JSONResponse({"success": True, "data": None}, status_code=200)
+
+
+@app.get('/jobs/{job_id}/results')
+async def job_results(job_id: str, request: Request):
+    """A page of a job's per-entry results and errors, by entry index"""
+    if core.job_queue is None:
+        return error_response("Job queue is disabled (set JOB_DB_PATH)", 503)
+
+    try:
+        offset, limit = core.parse_page_options(request.query_params)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    job = await asyncio.to_thread(core.job_queue.get, job_id)
+    if job is None:
+        return error_response("Job not found", 404)
+
+    results, errors = await asyncio.to_thread(core.job_queue.results, job_id, offset, limit)
+    return payload_response(request, core.job_results_page(job, results, errors, offset, limit))
+
+
+@app.post('/analyze-text')
+async def analyze_text_endpoint(request: Request):
+    try:
+        data = await read_json_body(request)
+
+        if not data or 'text' not in data:
+            return error_response("Missing 'text' field", 400)
+
+        text = data.get('text', '')
+
+        if not text.strip():
+            return error_response("Text cannot be empty", 400)
+
+        try:
+            deadline = core.parse_deadline(data)
+            mode = core.parse_mode(data)
+            view = ResultView(*parse_view_options(data, 'labeled'))
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        if mode == 'fast':
+            return payload_response(request, {"success": True, "data": core.analyze_text(text, mode=mode, view=view)})
+
+        degraded = False
+        with deadline_scope(deadline):
+            try:
+                async with admitted(INTERACTIVE):
+                    scores = await get_emotion_scores(text)
+            except CircuitOpenError as e:
+                scores = core.degraded_scores([text], e)[0]
+                degraded = True
+        result = core.analyze_text(text, scores=scores, mode='degraded' if degraded else 'model', view=view)
+        if degraded:
+            result["degraded"] = True
+
+        return payload_response(request, {"success": True, "data": result})
+
+    except Exception as e:
+        logger.error(f"Error analyzing text: {str(e)}")
+        return exception_response(e)
+
+
+@app.exception_handler(StarletteHTTPException)
+async def http_error(request, exc):
+    if exc.status_code == 404:
+        return error_response("Route not found", 404)
+    return error_response(str(exc.detail), exc.status_code)
+
+
+@app.exception_handler(Exception)
+async def internal_error(request, exc):
+    return error_response("Internal server error", 500)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 5001))
+    logger.info(f"Starting Eunoia ML Service (ASGI) on port {port}")
+    uvicorn.run(app, host='0.0.0.0', port=port)
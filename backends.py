@@ -0,0 +1,451 @@
+"""
+Inference backends for the GoEmotions classifier.
+
+Every backend exposes predict(inputs) and returns the same shape as the
+Hugging Face Inference API: one [{label, score}, ...] list per input text,
+sorted by score. `inputs` may be a single string or a list of strings.
+
+- RemoteBackend: Hugging Face Inference API over HTTP (default), through a
+  pooled InferenceClient with retries (AsyncInferenceClient for asyncio)
+- LocalBackend: in-process CPU model via PyTorch or ONNX Runtime, in
+  fp32 or with dynamically quantized int8 weights
+"""
+
+import asyncio
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import deadlines
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """Retry bookkeeping shared by the sync and async inference clients
+
+    429, 502, 503 and 504 responses and connection errors are retried with
+    capped exponential backoff and full jitter; a Retry-After header (or the
+    API's `estimated_time` while a model loads) is honored up to
+    `backoff_max` seconds. Attempts and retries stop at the caller's
+    deadline (see deadlines.py).
+    """
+
+    RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+    def __init__(self, max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "failures": 0}
+        self._status_codes = {}
+
+    def _bump(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _count_status(self, status):
+        """Tally one upstream response code, or "error" when no response came back"""
+        status = str(status)
+        with self._lock:
+            self._status_codes[status] = self._status_codes.get(status, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["status_codes"] = dict(self._status_codes)
+        return stats
+
+    def retry_delay(self, attempt, status=None, headers=None, body=None):
+        """Seconds to wait before retry number `attempt` (0-based)
+
+        status/headers/body describe the failed response, if there was one;
+        body is its parsed JSON or None.
+        """
+        hinted = self._server_hint(status, headers, body)
+        if hinted is not None:
+            return min(max(hinted, 0.0), self.backoff_max)
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    @staticmethod
+    def _server_hint(status, headers, body):
+        retry_after = headers.get('Retry-After') if headers is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                try:
+                    return parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    pass
+        if status == 503 and isinstance(body, dict):
+            try:
+                return float(body.get('estimated_time'))
+            except (ValueError, TypeError):
+                pass
+        return None
+
+    def should_retry(self, attempt, status):
+        return status in self.RETRY_STATUSES and attempt < self.max_retries
+
+    @staticmethod
+    def check_retry_budget(delay):
+        """Raise DeadlineExceeded if waiting `delay` seconds would pass the deadline"""
+        left = deadlines.remaining()
+        if left is not None and left <= delay:
+            raise deadlines.DeadlineExceeded()
+
+
+def is_backend_failure(error):
+    """Whether an inference error says the backend is unhealthy: a 5xx, a timeout or a
+    connection failure. A 4xx or a bad input is the caller's problem, not the backend's.
+    """
+    status = getattr(getattr(error, 'response', None), 'status_code', None) or getattr(error, 'status', None)
+    if isinstance(status, int):
+        return status >= 500
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          asyncio.TimeoutError, ConnectionError)):
+        return True
+    # aiohttp is only imported by the ASGI app
+    aiohttp = sys.modules.get('aiohttp')
+    return aiohttp is not None and isinstance(error, aiohttp.ClientConnectionError)
+
+
+class InferenceClient(RetryPolicy):
+    """HTTP client for the Hugging Face Inference API
+
+    Owns one pooled, keep-alive requests.Session so calls reuse TCP/TLS
+    connections, and retries transient failures (see RetryPolicy).
+    """
+
+    def __init__(self, api_url, api_token='', timeout=30, pool_size=10,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        super().__init__(max_retries, backoff_base, backoff_max)
+        self.api_url = api_url
+        self.api_token = api_token
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = self._create_session()
+
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers["Connection"] = "keep-alive"
+        if self.api_token:
+            session.headers["Authorization"] = f"Bearer {self.api_token}"
+        return session
+
+    def after_fork(self):
+        """Start a fresh connection pool in a forked child
+
+        The inherited pool's sockets belong to the parent too, so they are
+        dropped rather than closed (closing would end the parent's TLS sessions).
+        """
+        self.session = self._create_session()
+
+    def post(self, payload):
+        attempt = 0
+        while True:
+            timeout = deadlines.bound(self.timeout)
+            self._bump("requests")
+            try:
+                response = self.session.post(self.api_url, json=payload, timeout=timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._count_status("error")
+                # A timeout cut short by the request deadline is the deadline's, not the upstream's
+                deadlines.check()
+                if attempt >= self.max_retries:
+                    self._bump("failures")
+                    raise
+                delay = self.retry_delay(attempt)
+                logger.warning(f"Inference request failed ({str(e)}), retrying in {delay:.2f}s")
+            else:
+                self._count_status(response.status_code)
+                if not self.should_retry(attempt, response.status_code):
+                    if response.status_code >= 400:
+                        self._bump("failures")
+                    response.raise_for_status()
+                    return response.json()
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = None
+                delay = self.retry_delay(attempt, response.status_code, response.headers, body)
+                logger.warning(f"Inference API returned {response.status_code}, retrying in {delay:.2f}s")
+
+            self.check_retry_budget(delay)
+            self._bump("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncInferenceClient(RetryPolicy):
+    """asyncio counterpart of InferenceClient built on a pooled aiohttp session
+
+    Must be created inside a running event loop.
+    """
+
+    def __init__(self, api_url, api_token='', timeout=30, pool_size=10,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        # Optional dependency, only needed by the ASGI app
+        import aiohttp
+
+        super().__init__(max_retries, backoff_base, backoff_max)
+        self._aiohttp = aiohttp
+        self.api_url = api_url
+        self.timeout = timeout
+        headers = {}
+        if api_token:
+            headers["Authorization"] = f"Bearer {api_token}"
+        self.session = aiohttp.ClientSession(
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            connector=aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=60)
+        )
+
+    async def post(self, payload):
+        attempt = 0
+        while True:
+            timeout = self._aiohttp.ClientTimeout(total=deadlines.bound(self.timeout))
+            self._bump("requests")
+            try:
+                async with self.session.post(self.api_url, json=payload, timeout=timeout) as response:
+                    self._count_status(response.status)
+                    if not self.should_retry(attempt, response.status):
+                        if response.status >= 400:
+                            self._bump("failures")
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+                    try:
+                        body = await response.json(content_type=None)
+                    except ValueError:
+                        body = None
+                    delay = self.retry_delay(attempt, response.status, response.headers, body)
+                    logger.warning(f"Inference API returned {response.status}, retrying in {delay:.2f}s")
+            except (self._aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self._count_status("error")
+                deadlines.check()
+                if attempt >= self.max_retries:
+                    self._bump("failures")
+                    raise
+                delay = self.retry_delay(attempt)
+                logger.warning(f"Inference request failed ({str(e) or type(e).__name__}), retrying in {delay:.2f}s")
+
+            self.check_retry_budget(delay)
+            self._bump("retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        await self.session.close()
+
+
+class RemoteBackend:
+    """Hugging Face Inference API"""
+
+    name = "remote"
+
+    def __init__(self, api_url, api_token='', timeout=30, pool_size=10, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0):
+        self.api_url = api_url
+        self.model_id = api_url
+        self.client = InferenceClient(
+            api_url,
+            api_token=api_token,
+            timeout=timeout,
+            pool_size=pool_size,
+            max_retries=max_retries,
+            backoff_base=backoff_base,
+            backoff_max=backoff_max
+        )
+
+    def describe(self):
+        return {"backend": self.name, "url": self.api_url, "client": self.client.stats()}
+
+    def after_fork(self):
+        self.client.after_fork()
+
+    def predict(self, inputs):
+        try:
+            return self.client.post({"inputs": inputs, "options": {"wait_for_model": True}})
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error calling Hugging Face API: {str(e)}")
+            raise
+
+
+class LocalBackend:
+    """In-process CPU classifier loaded once from a Hugging Face model directory
+
+    runtime="torch" loads the PyTorch weights; runtime="onnx" expects a
+    `model.onnx` file next to the tokenizer and config. Texts are tokenized
+    and run through the model in one padded forward pass per predict call.
+
+    quantize="int8" runs the linear layers with int8 weights, quantized
+    dynamically: torch converts them at load time, ONNX Runtime loads
+    `model.int8.onnx`, written from `model.onnx` on first use. Activations
+    stay float, so no calibration data is needed; see
+    benchmarks.quantization for how far the scores move.
+    """
+
+    name = "local"
+
+    QUANTIZE_MODES = (None, 'int8')
+
+    def __init__(self, model_path, runtime='torch', max_length=512, num_threads=None, quantize=None):
+        # Optional dependencies, only needed when the local backend is selected
+        from transformers import AutoConfig, AutoTokenizer
+
+        if quantize not in self.QUANTIZE_MODES:
+            raise ValueError(f"Unknown quantization '{quantize}', expected 'int8' or none")
+
+        self.model_path = model_path
+        self.runtime = runtime
+        self.max_length = max_length
+        self.quantize = quantize
+        # Quantized scores differ slightly, so they get their own cache keys
+        self.model_id = f"{model_path}:{runtime}:{quantize}" if quantize else f"{model_path}:{runtime}"
+
+        config = AutoConfig.from_pretrained(model_path)
+        self.labels = [config.id2label[i] for i in range(len(config.id2label))]
+        self.embedding_dim = config.hidden_size
+        self.multi_label = config.problem_type == "multi_label_classification"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+        if runtime == 'torch':
+            import torch
+            from transformers import AutoModelForSequenceClassification
+
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            self._torch = torch
+            self.model = AutoModelForSequenceClassification.from_pretrained(model_path)
+            self.model.eval()
+            if quantize == 'int8':
+                from torch.ao.quantization import quantize_dynamic
+
+                self.model = quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif runtime == 'onnx':
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            if num_threads:
+                options.intra_op_num_threads = num_threads
+            onnx_path = os.path.join(model_path, 'model.onnx')
+            if quantize == 'int8':
+                onnx_path = quantize_onnx_model(onnx_path)
+            self.session = onnxruntime.InferenceSession(
+                onnx_path,
+                sess_options=options,
+                providers=['CPUExecutionProvider']
+            )
+            self._onnx_inputs = [i.name for i in self.session.get_inputs()]
+        else:
+            raise ValueError(f"Unknown local runtime '{runtime}', expected 'torch' or 'onnx'")
+
+        precision = quantize or 'fp32'
+        logger.info(f"Loaded local {runtime} {precision} model from {model_path} ({len(self.labels)} labels)")
+
+    def describe(self):
+        return {
+            "backend": self.name,
+            "model_path": self.model_path,
+            "runtime": self.runtime,
+            "quantize": self.quantize
+        }
+
+    def after_fork(self):
+        # Weights and tokenizer are read-only and shared copy-on-write; nothing to reopen
+        pass
+
+    def _logits(self, texts):
+        if self.runtime == 'torch':
+            encoded = self.tokenizer(texts, padding=True, truncation=True,
+                                     max_length=self.max_length, return_tensors='pt')
+            with self._torch.inference_mode():
+                return self.model(**encoded).logits.float().numpy()
+
+        encoded = self.tokenizer(texts, padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors='np')
+        feed = {name: encoded[name].astype('int64') for name in self._onnx_inputs if name in encoded}
+        return self.session.run(None, feed)[0]
+
+    def predict(self, inputs):
+        import numpy as np
+
+        deadlines.check()
+
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        if not texts:
+            return []
+
+        logits = self._logits(texts).astype(np.float32)
+        if self.multi_label:
+            probs = 1.0 / (1.0 + np.exp(-logits))
+        else:
+            shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probs = shifted / shifted.sum(axis=1, keepdims=True)
+
+        results = []
+        for row in probs:
+            order = np.argsort(-row)
+            results.append([{"label": self.labels[i], "score": float(row[i])} for i in order])
+        return results
+
+    def embed(self, inputs):
+        """Mean-pooled last hidden state per text, for similarity search (torch runtime only)"""
+        if self.runtime != 'torch':
+            raise ValueError("Text embeddings need the torch runtime")
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        if not texts:
+            return []
+        encoded = self.tokenizer(texts, padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors='pt')
+        with self._torch.inference_mode():
+            hidden = self.model(**encoded, output_hidden_states=True).hidden_states[-1]
+            mask = encoded['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        return pooled.float().numpy()
+
+
+def quantize_onnx_model(onnx_path):
+    """Path of the int8 copy of an ONNX model, writing it next to the original if missing"""
+    quantized_path = f"{os.path.splitext(onnx_path)[0]}.int8.onnx"
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        # Write under a temporary name so a concurrent loader never sees a partial file
+        partial_path = f"{quantized_path}.{os.getpid()}.tmp"
+        quantize_dynamic(onnx_path, partial_path, weight_type=QuantType.QInt8)
+        os.replace(partial_path, quantized_path)
+        logger.info(f"Wrote int8 ONNX model to {quantized_path}")
+    return quantized_path
+
+
+def create_backend(name, api_url, api_token='', model_path=None, runtime='torch', num_threads=None,
+                   quantize=None, **client_options):
+    """Build the backend selected by INFERENCE_BACKEND
+
+    client_options (timeout, pool_size, max_retries, backoff_base,
+    backoff_max) are passed to the remote InferenceClient.
+    """
+    if name == 'remote':
+        return RemoteBackend(api_url, api_token, **client_options)
+    if name == 'local':
+        if not model_path:
+            raise ValueError("LOCAL_MODEL_PATH must be set for the local backend")
+        return LocalBackend(model_path, runtime=runtime, num_threads=num_threads, quantize=quantize)
+    raise ValueError(f"Unknown INFERENCE_BACKEND '{name}', expected 'remote' or 'local'")
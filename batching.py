@@ -0,0 +1,229 @@
+"""
+Dynamic micro-batching for single-text inference.
+
+Concurrent requests that each need one text scored are queued; a collector
+waits up to `window` seconds after the first queued text (or until
+`max_batch_size` texts are waiting), sends them to the model as one
+list-valued call and hands each caller its own result.
+
+MicroBatcher serves the threaded Flask app, AsyncMicroBatcher the ASGI app.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class BatchStats:
+    """Queue depth, batch size histogram and added wait time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.size_histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.size_overflow = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, size, waits):
+        with self._lock:
+            self.batches += 1
+            self.items += size
+            for bucket in BATCH_SIZE_BUCKETS:
+                if size <= bucket:
+                    self.size_histogram[bucket] += 1
+                    break
+            else:
+                self.size_overflow += 1
+            self.wait_total += sum(waits)
+            self.wait_max = max(self.wait_max, max(waits))
+
+    def snapshot(self, queue_depth):
+        with self._lock:
+            histogram = {f"le_{bucket}": count for bucket, count in self.size_histogram.items()}
+            histogram["overflow"] = self.size_overflow
+            return {
+                "queue_depth": queue_depth,
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "batch_size_histogram": histogram,
+                "avg_wait_ms": round(self.wait_total / self.items * 1000, 3) if self.items else 0.0,
+                "max_wait_ms": round(self.wait_max * 1000, 3)
+            }
+
+
+class MicroBatcher:
+    """Thread-based batching queue in front of a list-valued inference function
+
+    infer(texts) must return one result per text, in order. Up to
+    `max_concurrent_batches` batches may be in flight while the next one is
+    being collected.
+    """
+
+    def __init__(self, infer, window=0.01, max_batch_size=32, max_concurrent_batches=4):
+        self.infer = infer
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.stats = BatchStats()
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches,
+                                            thread_name_prefix="micro-batch")
+        self._closed = False
+        self._collector = threading.Thread(target=self._collect, name="micro-batch-collector", daemon=True)
+        self._collector.start()
+
+    def submit(self, text):
+        """Queue one text; returns a Future resolving to its result"""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._queue.put((text, future, time.monotonic()))
+        return future
+
+    def __call__(self, text, timeout=None):
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = first[2] + self.window
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._executor.submit(self._dispatch, batch)
+            if stopping:
+                break
+
+    def _dispatch(self, batch):
+        dispatched = time.monotonic()
+        self.stats.record(len(batch), [dispatched - enqueued for _, _, enqueued in batch])
+        try:
+            results = self.infer([text for text, _, _ in batch])
+            if not isinstance(results, list) or len(results) != len(batch):
+                raise ValueError(f"Expected {len(batch)} results from batch inference")
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def describe(self):
+        stats = self.stats.snapshot(self.queue_depth())
+        stats["window_ms"] = self.window * 1000
+        stats["max_batch_size"] = self.max_batch_size
+        return stats
+
+    def close(self):
+        """Stop accepting work, flush queued texts and wait for in-flight batches"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._collector.join()
+        self._executor.shutdown(wait=True)
+
+
+class AsyncMicroBatcher:
+    """asyncio counterpart of MicroBatcher; infer is a coroutine function
+
+    Must be created inside a running event loop.
+    """
+
+    def __init__(self, infer, window=0.01, max_batch_size=32):
+        self.infer = infer
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.stats = BatchStats()
+        self._queue = asyncio.Queue()
+        self._in_flight = set()
+        self._collector = asyncio.get_running_loop().create_task(self._collect())
+
+    async def __call__(self, text):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future, time.monotonic()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = first[2] + self.window
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            task = loop.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+            if stopping:
+                break
+
+    async def _dispatch(self, batch):
+        dispatched = time.monotonic()
+        self.stats.record(len(batch), [dispatched - enqueued for _, _, enqueued in batch])
+        try:
+            results = await self.infer([text for text, _, _ in batch])
+            if not isinstance(results, list) or len(results) != len(batch):
+                raise ValueError(f"Expected {len(batch)} results from batch inference")
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def describe(self):
+        stats = self.stats.snapshot(self.queue_depth())
+        stats["window_ms"] = self.window * 1000
+        stats["max_batch_size"] = self.max_batch_size
+        return stats
+
+    async def close(self):
+        """Flush queued texts and wait for in-flight batches"""
+        self._queue.put_nowait(None)
+        await self._collector
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
@@ -0,0 +1,171 @@
+"""
+Benchmark: interactive latency under a bulk flood, with and without admission control.
+
+Simulates the inference path with a sleep of --base-ms plus --per-item-ms
+per entry (so it runs the same on any machine) behind --slots slots, and
+drives it with:
+    - --bulk-clients threads that each send chunks of --chunk entries back
+      to back, as a large /batch-analyze or stream would
+    - one interactive request (a single entry) every --interactive-ms
+
+for --seconds, under each policy:
+    semaphore   a plain semaphore over the slots, first come first served
+    fair        AdmissionController (weighted fair queuing, interactive
+                weight --interactive-weight) with budgets too large to reject
+    budgeted    the same with the service's default budgets, so work that
+                would queue past them is refused with 503/429 instead
+
+Reports interactive p50/p95/p99 latency, bulk entries/sec, and per lane the
+rejections and how long a rejection took to come back.
+
+Usage:
+    python -m benchmarks.admission --slots 4 --bulk-clients 8 --seconds 10
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from admission import BULK, INTERACTIVE, AdmissionController, AdmissionRejected
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+
+class SemaphoreGate:
+    """The baseline: slots handed out in arrival order, nothing refused"""
+
+    def __init__(self, slots):
+        self._semaphore = threading.Semaphore(slots)
+
+    def admit(self, lane, client=None, cost=1):
+        gate = self
+
+        class Slot:
+            def __enter__(self):
+                gate._semaphore.acquire()
+
+            def __exit__(self, *exc_info):
+                gate._semaphore.release()
+
+        return Slot()
+
+
+def run(gate, args):
+    stop = threading.Event()
+    interactive = []
+    rejected = {INTERACTIVE: [], BULK: []}
+    bulk_entries = [0]
+    lock = threading.Lock()
+
+    def model_call(cost):
+        time.sleep((args.base_ms + args.per_item_ms * cost) / 1000)
+
+    def call(lane, client, cost):
+        started = time.perf_counter()
+        try:
+            with gate.admit(lane, client, cost):
+                model_call(cost)
+        except AdmissionRejected:
+            with lock:
+                rejected[lane].append(time.perf_counter() - started)
+            return None
+        return time.perf_counter() - started
+
+    def bulk_client(number):
+        while not stop.is_set():
+            if call(BULK, f"bulk-{number}", args.chunk) is None:
+                # A client honouring Retry-After backs off instead of hammering
+                time.sleep(args.retry_ms / 1000)
+                continue
+            with lock:
+                bulk_entries[0] += args.chunk
+
+    def interactive_request():
+        seconds = call(INTERACTIVE, "interactive", 1)
+        if seconds is not None:
+            with lock:
+                interactive.append(seconds)
+
+    workers = [threading.Thread(target=bulk_client, args=(i,)) for i in range(args.bulk_clients)]
+    for worker in workers:
+        worker.start()
+    # Let the bulk queue build up before measuring
+    time.sleep(args.warmup)
+    started = time.perf_counter()
+    requests = []
+    while time.perf_counter() - started < args.seconds:
+        request = threading.Thread(target=interactive_request)
+        request.start()
+        requests.append(request)
+        time.sleep(args.interactive_ms / 1000)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in workers + requests:
+        thread.join()
+
+    return {
+        "interactive_ms": {
+            "requests": len(requests),
+            "served": len(interactive),
+            "p50": percentile(interactive, 0.5),
+            "p95": percentile(interactive, 0.95),
+            "p99": percentile(interactive, 0.99)
+        },
+        "bulk_entries_per_s": round(bulk_entries[0] / elapsed),
+        "rejected": {
+            lane: {"count": len(samples), "p95_ms_to_reject": percentile(samples, 0.95)}
+            for lane, samples in rejected.items()
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--slots', type=int, default=4)
+    parser.add_argument('--bulk-clients', type=int, default=8)
+    parser.add_argument('--chunk', type=int, default=16, help="entries per bulk chunk")
+    parser.add_argument('--interactive-ms', type=float, default=50, help="time between interactive requests")
+    parser.add_argument('--base-ms', type=float, default=20, help="fixed cost of a model call")
+    parser.add_argument('--per-item-ms', type=float, default=5, help="added cost per entry in a call")
+    parser.add_argument('--interactive-weight', type=float, default=8)
+    parser.add_argument('--interactive-budget', type=float, default=2)
+    parser.add_argument('--bulk-budget', type=float, default=30)
+    parser.add_argument('--max-queued-per-client', type=int, default=64)
+    parser.add_argument('--retry-ms', type=float, default=100, help="bulk client backoff after a rejection")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=1)
+    args = parser.parse_args()
+
+    def controller(interactive_budget, bulk_budget):
+        return AdmissionController(
+            args.slots,
+            {INTERACTIVE: (args.interactive_weight, interactive_budget), BULK: (1, bulk_budget)},
+            max_queued_per_client=args.max_queued_per_client
+        )
+
+    policies = {
+        "semaphore": SemaphoreGate(args.slots),
+        "fair": controller(3600, 3600),
+        "budgeted": controller(args.interactive_budget, args.bulk_budget)
+    }
+    report = {
+        "slots": args.slots,
+        "bulk_clients": args.bulk_clients,
+        "chunk": args.chunk,
+        "interactive_every_ms": args.interactive_ms,
+        "seconds": args.seconds,
+        "results": {}
+    }
+    for name, gate in policies.items():
+        report["results"][name] = run(gate, args)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
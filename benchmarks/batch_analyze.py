@@ -0,0 +1,91 @@
+"""
+Benchmark: per-entry serial loop vs micro-batched /batch-analyze inference.
+Runs entirely offline against benchmarks.stub_inference.
+
+Every run analyzes the same entries, so the result cache is off (and
+cleared before each run if CACHE_SIZE turns it on); a run that makes no
+upstream calls is an error rather than a report.
+
+Usage:
+    python -m benchmarks.batch_analyze --entries 200 --latency 0.05
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+os.environ.setdefault('CACHE_SIZE', '0')
+
+import application  # noqa: E402
+from backends import RemoteBackend  # noqa: E402
+from benchmarks.stub_inference import StubInferenceServer  # noqa: E402
+
+
+def make_entries(count):
+    return [
+        {
+            "title": f"Entry {i}",
+            "content": f"Today was day {i}. I spent time with friends and felt grateful for the small things."
+        }
+        for i in range(count)
+    ]
+
+
+def run_serial(entries):
+    results = []
+    for entry in entries:
+        results.append(application.analyze_journal_entry(entry['title'], entry['content']))
+    return results
+
+
+def run_batched(entries, batch_size):
+    results, errors = application.analyze_journal_entries(entries, batch_size=batch_size)
+    if errors:
+        raise RuntimeError(f"{len(errors)} entries failed: {errors[0]}")
+    return results
+
+
+def timed(stub, fn, *args):
+    if application.result_cache is not None:
+        # Scores from an earlier run would answer this one without the model
+        application.result_cache.clear()
+    calls_before = stub.request_count
+    start = time.perf_counter()
+    results = fn(*args)
+    elapsed = time.perf_counter() - start
+    upstream_calls = stub.request_count - calls_before
+    if upstream_calls == 0:
+        raise RuntimeError(f"{fn.__name__} made no upstream calls; its results came from a cache")
+    return {
+        "seconds": round(elapsed, 4),
+        "entries_per_sec": round(len(results) / elapsed, 2),
+        "upstream_calls": upstream_calls
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help="stub seconds per request")
+    parser.add_argument('--per-item-latency', type=float, default=0.002, help="stub seconds per input")
+    parser.add_argument('--batch-sizes', default="8,16,32,64")
+    args = parser.parse_args()
+
+    logging.getLogger('application').setLevel(logging.WARNING)
+    entries = make_entries(args.entries)
+    report = {"entries": args.entries, "latency": args.latency, "per_item_latency": args.per_item_latency}
+
+    with StubInferenceServer(latency=args.latency, per_item_latency=args.per_item_latency) as stub:
+        application.inference_backend = RemoteBackend(stub.url)
+        report["serial"] = timed(stub, run_serial, entries)
+        report["batched"] = {}
+        for size in [int(s) for s in args.batch_sizes.split(',')]:
+            report["batched"][size] = timed(stub, run_batched, entries, size)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+"""
+Regression checks for the inference clients, the local backend and the stores.
+
+Unlike the benchmarks, which print numbers for a person to read, every
+check here asserts the expected behavior, and the script exits 1 if any
+check fails, so it can gate a CI job or a deploy:
+    - InferenceClient against the local stub: a 503 then 200 is retried
+      exactly once per failure on the same keep-alive connection,
+      Retry-After is honored and capped at backoff_max, backoff without it
+      stays under its ceilings, retries stop at max_retries and at the
+      request deadline, and 4xx responses are not retried
+    - sequential calls reuse one pooled connection where bare
+      requests.post opens one per call
+    - AsyncInferenceClient retries the same way (skipped without aiohttp)
+    - the fixture model (benchmarks/fixture_model.py) loads through
+      LocalBackend on torch, torch int8 and ONNX Runtime and returns the
+      API's output shape (skipped without torch/transformers; the ONNX
+      runtime is skipped without onnxruntime)
+    - MoodStore keeps separate entries that share a timestamp apart and
+      replaces an entry analyzed again under its entry_id
+    - VectorIndex does the same, and an approximate search over one user
+      falls back to the exact one when the inverted file misses their rows
+    - JobQueue renews the lease of a chunk that outlasts it, so a second
+      queue on the same file never redoes it, and a queue restarted after
+      close() resumes the job at its cursor
+    - AdmissionController refuses with 429 past a client's queue limit and
+      with 503 past the lane budget, up front or after waiting
+    - CircuitBreaker opens on backend failures but not on 4xx responses,
+      lets one probe through once half-open and closes when it succeeds
+
+Usage:
+    python -m benchmarks.checks
+    python -m benchmarks.checks --only retry,connection
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import sys
+import tempfile
+import time
+
+import requests
+
+import deadlines
+from backends import AsyncInferenceClient, InferenceClient
+from benchmarks.stub_inference import StubInferenceServer
+
+PAYLOAD = {"inputs": "I had a lovely afternoon with my family.", "options": {"wait_for_model": True}}
+
+# Extra seconds allowed over a computed wait for scheduling and local HTTP round trips
+SLACK = 0.15
+
+# Labels for the checks of the stores, which only need a fixed order
+LABELS = [f"label{i}" for i in range(8)]
+
+CHECKS = []
+
+
+class Skipped(Exception):
+    """A check that can't run here, e.g. because an optional package is missing"""
+
+
+def check(func):
+    CHECKS.append(func)
+    return func
+
+
+def require(*modules):
+    missing = [name for name in modules if importlib.util.find_spec(name) is None]
+    if missing:
+        raise Skipped(f"{', '.join(missing)} not installed")
+
+
+@check
+def retry_503_then_200():
+    with StubInferenceServer(latency=0, per_item_latency=0, fail_first=2, fail_status=503, retry_after=0) as stub:
+        client = InferenceClient(stub.url, max_retries=3)
+        result = client.post(PAYLOAD)
+        stats = client.stats()
+        client.close()
+    assert len(result) == 1 and len(result[0]) == 28, result
+    assert stats["retries"] == 2, stats
+    assert stats["failures"] == 0, stats
+    assert stats["status_codes"] == {"503": 2, "200": 1}, stats
+    assert stub.request_count == 3, stub.request_count
+    # A failed response is read to the end, so the retry goes out on the same connection
+    assert stub.connection_count == 1, stub.connection_count
+
+
+@check
+def retry_after_honored():
+    # backoff_base is far above Retry-After: only honoring the header gets in under the deadline
+    with StubInferenceServer(latency=0, per_item_latency=0, fail_first=2, fail_status=503, retry_after=0.2) as stub:
+        client = InferenceClient(stub.url, max_retries=3, backoff_base=30, backoff_max=30)
+        started = time.perf_counter()
+        with deadlines.deadline_scope(2.0):
+            client.post(PAYLOAD)
+        elapsed = time.perf_counter() - started
+        client.close()
+    assert 0.4 <= elapsed <= 0.4 + SLACK, elapsed
+
+
+@check
+def retry_after_capped():
+    with StubInferenceServer(latency=0, per_item_latency=0, fail_first=1, fail_status=503, retry_after=60) as stub:
+        client = InferenceClient(stub.url, max_retries=3, backoff_max=0.1)
+        started = time.perf_counter()
+        client.post(PAYLOAD)
+        elapsed = time.perf_counter() - started
+        client.close()
+    assert 0.1 <= elapsed <= 0.1 + SLACK, elapsed
+
+
+@check
+def backoff_without_retry_after():
+    # Full jitter: each wait is drawn from [0, min(backoff_max, base * 2^attempt)]
+    with StubInferenceServer(latency=0, per_item_latency=0, fail_first=3, fail_status=429) as stub:
+        client = InferenceClient(stub.url, max_retries=3, backoff_base=0.05, backoff_max=0.1)
+        started = time.perf_counter()
+        client.post(PAYLOAD)
+        elapsed = time.perf_counter() - started
+        stats = client.stats()
+        client.close()
+    assert stats["retries"] == 3, stats
+    assert elapsed <= 0.05 + 0.1 + 0.1 + SLACK, elapsed
+
+
+@check
+def retries_exhausted():
+    with StubInferenceServer(latency=0, per_item_latency=0, fail_first=10, fail_status=503, retry_after=0) as stub:
+        client = InferenceClient(stub.url, max_retries=2)
+        try:
+            client.post(PAYLOAD)
+        except requests.exceptions.HTTPError as e:
+            assert e.response.status_code == 503, e
+        else:
+            raise AssertionError("no HTTPError after exhausting retries")
+        stats = client.stats()
+        client.close()
+    assert stub.request_count == 3, stub.request_count
+    assert stats["retries"] == 2 and stats["failures"] == 1, stats
+
+
+@check
+def client_error_not_retried():
+    with StubInferenceServer(latency=0, per_item_latency=0, fail_first=1, fail_status=400, retry_after=0) as stub:
+        client = InferenceClient(stub.url, max_retries=3)
+        try:
+            client.post(PAYLOAD)
+        except requests.exceptions.HTTPError as e:
+            assert e.response.status_code == 400, e
+        else:
+            raise AssertionError("a 400 was not raised")
+        client.close()
+    assert stub.request_count == 1, stub.request_count
+
+
+@check
+def retry_stops_at_deadline():
+    # Waiting out Retry-After would pass the deadline, so the client gives up at once
+    with StubInferenceServer(latency=0, per_item_latency=0, fail_first=1, fail_status=503, retry_after=5) as stub:
+        client = InferenceClient(stub.url, max_retries=3, backoff_max=10)
+        started = time.perf_counter()
+        try:
+            with deadlines.deadline_scope(1.0):
+                client.post(PAYLOAD)
+        except deadlines.DeadlineExceeded:
+            pass
+        else:
+            raise AssertionError("no DeadlineExceeded")
+        elapsed = time.perf_counter() - started
+        client.close()
+    assert elapsed <= SLACK, elapsed
+    assert stub.request_count == 1, stub.request_count
+
+
+@check
+def connection_reuse():
+    calls = 20
+    with StubInferenceServer(latency=0, per_item_latency=0) as stub:
+        for _ in range(calls):
+            requests.post(stub.url, json=PAYLOAD, timeout=30).raise_for_status()
+        unpooled = stub.connection_count
+    with StubInferenceServer(latency=0, per_item_latency=0) as stub:
+        client = InferenceClient(stub.url)
+        for _ in range(calls):
+            client.post(PAYLOAD)
+        client.close()
+        pooled = stub.connection_count
+    assert unpooled == calls, unpooled
+    assert pooled == 1, pooled
+
+
+@check
+def async_retry_503_then_200():
+    require('aiohttp')
+
+    async def run(url):
+        client = AsyncInferenceClient(url, max_retries=3)
+        try:
+            started = time.perf_counter()
+            result = await client.post(PAYLOAD)
+            return result, time.perf_counter() - started, client.stats()
+        finally:
+            await client.close()
+
+    with StubInferenceServer(latency=0, per_item_latency=0, fail_first=2, fail_status=503, retry_after=0.1) as stub:
+        result, elapsed, stats = asyncio.run(run(stub.url))
+    assert len(result) == 1 and len(result[0]) == 28, result
+    assert stats["retries"] == 2 and stub.request_count == 3, stats
+    assert 0.2 <= elapsed <= 0.2 + SLACK, elapsed
+    assert stub.connection_count == 1, stub.connection_count
+
+
+@check
+def fixture_model():
+    require('torch', 'transformers', 'tokenizers')
+    from benchmarks.fixture_model import build_fixture_model, check_fixture_model
+
+    with_onnx = importlib.util.find_spec('onnxruntime') is not None
+    variants = [('torch', None), ('torch', 'int8')]
+    if with_onnx:
+        variants += [('onnx', None), ('onnx', 'int8')]
+    with tempfile.TemporaryDirectory() as path:
+        build_fixture_model(path, export_onnx=with_onnx)
+        for runtime, quantize in variants:
+            check_fixture_model(path, runtime, quantize)
+    if not with_onnx:
+        raise Skipped("torch variants passed; onnxruntime not installed")
+
+
+@check
+def mood_store_dedupe():
+    from datetime import datetime
+
+    import numpy as np
+
+    from analytics import MoodStore
+    from scoring import ScoreLayout
+
+    layout = ScoreLayout(LABELS)
+    scores = np.eye(len(LABELS))
+    day = datetime(2024, 1, 1)
+    with tempfile.TemporaryDirectory() as path:
+        store = MoodStore(f"{path}/mood.db", layout)
+        # Two different entries written at the same moment, neither with an id
+        store.record([("u", day, scores[0], 0, None), ("u", day, scores[1], 1, None)])
+        # One entry analyzed twice, the second time dated a day later
+        store.record([("u", day, scores[2], 2, "e1")])
+        store.flush()
+        store.record([("u", datetime(2024, 1, 2), scores[3], 3, "e1")])
+        store.flush()
+        trends = store.trends("u", limit=5)
+        store.close()
+    assert trends["entries"] == 3, trends["entries"]
+    counts = {bucket["start"]: bucket["entries"] for bucket in trends["buckets"]}
+    assert counts == {"2024-01-01": 2, "2024-01-02": 1}, counts
+
+
+@check
+def similarity_index_supersede():
+    import numpy as np
+
+    from similarity import VectorIndex
+
+    rng = np.random.default_rng(0)
+    dim = len(LABELS)
+    with tempfile.TemporaryDirectory() as path:
+        index = VectorIndex(f"{path}/scores", dim, "scores", ann_probes=1)
+        # Another user re-analyzes 20 entries ten times over: 180 superseded rows
+        index.append(rng.random((200, dim)), [{"user_id": "a", "entry_id": f"a{i % 20}"} for i in range(200)])
+        # Ten entries written at the same moment without an id, then one entry analyzed twice
+        index.append(rng.random((10, dim)), [{"user_id": "b", "timestamp": "2024-01-01T00:00:00"}] * 10)
+        index.append(rng.random((2, dim)), [{"user_id": "b", "entry_id": "e1"}] * 2)
+        query = rng.random(dim)
+        latest = index.lookup("b", "e1")
+        exact, _, _ = index.search(query, k=20, user_id="b", approximate=False)
+        others, _, _ = index.search(query, k=50, user_id="a", approximate=False)
+        # One probed list can't hold all of b's rows, so this has to answer exactly
+        index.build_ann()
+        approximate, _, _ = index.search(query, k=20, user_id="b", approximate=True)
+    assert latest == 211, latest
+    assert len(exact) == 11 and 210 not in exact.tolist(), exact
+    assert len(others) == 20, len(others)
+    assert approximate.tolist() == exact.tolist(), approximate
+
+
+@check
+def job_queue_lease_and_resume():
+    from jobs import JobQueue
+
+    processed = []
+
+    def process(entries, options):
+        time.sleep(options["seconds"])
+        processed.extend(entry["n"] for entry in entries)
+        return [{"index": i, "n": entry["n"]} for i, entry in enumerate(entries)], []
+
+    def wait_for(queue, job_id, processed_at_least, timeout=10):
+        stop = time.monotonic() + timeout
+        while time.monotonic() < stop:
+            job = queue.get(job_id)
+            if job["processed"] >= processed_at_least:
+                return job
+            time.sleep(0.02)
+        raise AssertionError(f"job stuck at {job}")
+
+    with tempfile.TemporaryDirectory() as path:
+        # Two queues on one file, as two workers on a host; each chunk outlasts the lease
+        queues = [JobQueue(f"{path}/jobs.db", process, workers=1, chunk_size=2, lease_seconds=0.3, poll_interval=0.02)
+                  for _ in range(2)]
+        job = queues[0].submit([{"n": n} for n in range(8)], {"seconds": 0.5})
+        for queue in queues:
+            queue.start()
+        done = wait_for(queues[1], job["id"], 8)
+        for queue in queues:
+            queue.close()
+        assert done["status"] == "done", done
+        assert sorted(processed) == list(range(8)), processed
+
+        # Stopped after its first chunk, the job picks up at its cursor in a new queue
+        del processed[:]
+        first = JobQueue(f"{path}/jobs.db", process, workers=1, chunk_size=2, poll_interval=0.02)
+        job = first.submit([{"n": n} for n in range(6)], {"seconds": 0.1})
+        first.start()
+        wait_for(first, job["id"], 2)
+        first.close()
+        stopped_at = first.get(job["id"])["processed"]
+        second = JobQueue(f"{path}/jobs.db", process, workers=1, chunk_size=2, poll_interval=0.02)
+        second.start()
+        done = wait_for(second, job["id"], 6)
+        results, errors = second.results(job["id"])
+        second.close()
+    assert stopped_at < 6, stopped_at
+    assert done["status"] == "done", done
+    assert sorted(processed) == list(range(6)), processed
+    assert [result["n"] for result in results] == list(range(6)) and not errors, results
+
+
+@check
+def admission_rejections():
+    import threading
+
+    from admission import BULK, INTERACTIVE, AdmissionController, AdmissionRejected
+
+    controller = AdmissionController(1, {INTERACTIVE: (4, 1.0), BULK: (1, 0.2)}, max_queued_per_client=1)
+    # One finished unit of work teaches the controller about 0.05s per unit of cost
+    ticket = controller.acquire(BULK, "x")
+    time.sleep(0.05)
+    controller.release(ticket)
+
+    def refused(lane, client, cost=1):
+        started = time.perf_counter()
+        try:
+            controller.release(controller.acquire(lane, client, cost))
+        except AdmissionRejected as e:
+            return e.status, time.perf_counter() - started
+        raise AssertionError(f"{lane} work from {client} was admitted")
+
+    held = controller.acquire(BULK, "x")
+    waiter = threading.Thread(target=lambda: controller.release(controller.acquire(INTERACTIVE, "alice")))
+    waiter.start()
+    while controller.stats()["queued"][INTERACTIVE] == 0:
+        time.sleep(0.005)
+    too_many = refused(INTERACTIVE, "alice")
+    over_budget = refused(BULK, "bob", cost=10)
+    controller.release(held)
+    waiter.join()
+
+    held = controller.acquire(BULK, "x")
+    timed_out = refused(BULK, "carol")
+    controller.release(held)
+    stats = controller.stats()
+    assert too_many[0] == 429 and too_many[1] <= SLACK, too_many
+    assert over_budget[0] == 503 and over_budget[1] <= SLACK, over_budget
+    assert timed_out[0] == 503 and 0.2 <= timed_out[1] <= 0.2 + SLACK, timed_out
+    assert stats["running"] == 0 and not any(stats["queued"].values()), stats
+    assert stats["lanes"][INTERACTIVE]["admitted"] == 1, stats
+    assert stats["lanes"][BULK]["timed_out"] == 1, stats
+
+
+@check
+def circuit_breaker_trips():
+    from backends import is_backend_failure
+    from circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+    def http_error(status):
+        response = requests.Response()
+        response.status_code = status
+        return requests.exceptions.HTTPError(response=response)
+
+    def rejected():
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            return True
+        return False
+
+    breaker = CircuitBreaker(window=4, min_calls=4, failure_rate=0.5, open_seconds=0.2)
+    # Bad requests are the caller's problem and don't count against the backend
+    for _ in range(4):
+        breaker.before_call()
+        breaker.record(0.01, is_backend_failure(http_error(400)))
+    assert breaker.state == CLOSED, breaker.describe()
+    for error in (http_error(503), requests.exceptions.ConnectionError()):
+        breaker.before_call()
+        breaker.record(0.01, is_backend_failure(error))
+    assert breaker.state == OPEN and rejected(), breaker.describe()
+
+    time.sleep(0.2)
+    assert breaker.state == HALF_OPEN, breaker.describe()
+    # One probe at a time; a probe that ends without a verdict hands its turn back
+    assert not rejected() and rejected(), breaker.describe()
+    breaker.release()
+    assert not rejected(), breaker.describe()
+    breaker.record(0.01, True)
+    assert breaker.state == OPEN, breaker.describe()
+
+    time.sleep(0.2)
+    assert not rejected(), breaker.describe()
+    breaker.record(0.01, False)
+    assert breaker.state == CLOSED and not rejected(), breaker.describe()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', help="comma-separated substrings; run the checks whose names contain one")
+    args = parser.parse_args()
+
+    selected = CHECKS
+    if args.only:
+        patterns = args.only.split(',')
+        selected = [func for func in CHECKS if any(pattern in func.__name__ for pattern in patterns)]
+
+    outcomes = {"passed": 0, "failed": 0, "skipped": 0}
+    for func in selected:
+        started = time.perf_counter()
+        try:
+            func()
+        except Skipped as e:
+            outcomes["skipped"] += 1
+            print(f"SKIP {func.__name__}: {e}")
+        except Exception as e:
+            outcomes["failed"] += 1
+            print(f"FAIL {func.__name__}: {type(e).__name__}: {e}")
+        else:
+            outcomes["passed"] += 1
+            print(f"PASS {func.__name__} ({time.perf_counter() - started:.2f}s)")
+    print(", ".join(f"{count} {outcome}" for outcome, count in outcomes.items()))
+    sys.exit(1 if outcomes["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: "fast" lexicon mode vs the model on the 28-case emotion test set.
+
+Each case from test_all_emotions.py is analyzed with analyze_text in both
+modes. Reports per-text latency of each, accuracy against the expected
+labels and how often the fast mode agrees with the model (same primary
+emotion, or the model's primary within the fast mode's top 3).
+
+The model is whatever backend application.py is configured with
+(INFERENCE_BACKEND=local with LOCAL_MODEL_PATH for an offline run), or a
+deployed service with --url. The result cache is disabled so every model
+call is timed. Set LEXICON_PATH to evaluate a distilled lexicon; the seed
+table was written with these cases in view, so treat its accuracy here as
+a smoke check and agreement on your own entries as the real measure.
+
+Usage:
+    INFERENCE_BACKEND=local LOCAL_MODEL_PATH=/models/go_emotions python -m benchmarks.fast_classifier
+    python -m benchmarks.fast_classifier --url http://localhost:5001 --repeat 1000
+"""
+
+import argparse
+import json
+import os
+import time
+
+import requests
+
+os.environ.setdefault('CACHE_SIZE', '0')
+
+import application  # noqa: E402
+from test_all_emotions import EMOTION_TEST_CASES  # noqa: E402
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def top_labels(result, k=3):
+    return [item['emotion'] for item in result['all_scores'][:k]]
+
+
+def model_analyzer(url):
+    """analyze_text in model mode, in process or through a service's /analyze-text"""
+    if url is None:
+        return application.analyze_text
+    session = requests.Session()
+
+    def analyze(text):
+        response = session.post(f"{url.rstrip('/')}/analyze-text", json={"text": text}, timeout=60)
+        response.raise_for_status()
+        return response.json()['data']
+    return analyze
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="service to use as the model reference instead of the in-process backend")
+    parser.add_argument('--repeat', type=int, default=200, help="timed passes over the cases in fast mode")
+    parser.add_argument('--model-repeat', type=int, default=1, help="timed passes over the cases in model mode")
+    args = parser.parse_args()
+
+    cases = [(name, f"{case['title']}. {case['content']}", case['expected'])
+             for name, case in EMOTION_TEST_CASES.items()]
+    analyze_model = model_analyzer(args.url)
+
+    model_results = {}
+    model_seconds = []
+    for _ in range(args.model_repeat):
+        for name, text, _ in cases:
+            started = time.perf_counter()
+            model_results[name] = analyze_model(text)
+            model_seconds.append(time.perf_counter() - started)
+
+    fast_results = {}
+    fast_seconds = []
+    for _ in range(args.repeat):
+        for name, text, _ in cases:
+            started = time.perf_counter()
+            fast_results[name] = application.analyze_text(text, mode='fast')
+            fast_seconds.append(time.perf_counter() - started)
+
+    rows = []
+    for name, _, expected in cases:
+        model, fast = model_results[name], fast_results[name]
+        rows.append({
+            "case": name,
+            "expected": expected,
+            "model": model['primary_emotion'],
+            "fast": fast['primary_emotion'],
+            "agree": model['primary_emotion'] == fast['primary_emotion'],
+            "model_in_fast_top3": model['primary_emotion'] in top_labels(fast)
+        })
+
+    count = len(rows)
+    model_p50 = percentile(model_seconds, 0.5)
+    fast_p50 = percentile(fast_seconds, 0.5)
+    report = {
+        "cases": count,
+        "model": args.url or application.inference_backend.describe(),
+        "lexicon": application.lexicon_classifier.describe(),
+        "fast_mode": {
+            "p50_us": round(fast_p50 * 1e6, 1),
+            "p99_us": round(percentile(fast_seconds, 0.99) * 1e6, 1),
+            "accuracy": round(sum(row['fast'] == row['expected'] for row in rows) / count, 4)
+        },
+        "model_mode": {
+            "p50_ms": round(model_p50 * 1000, 3),
+            "p99_ms": round(percentile(model_seconds, 0.99) * 1000, 3),
+            "accuracy": round(sum(row['model'] == row['expected'] for row in rows) / count, 4)
+        },
+        "speedup_p50": round(model_p50 / fast_p50, 1),
+        "agreement": {
+            "primary": round(sum(row['agree'] for row in rows) / count, 4),
+            "model_primary_in_fast_top3": round(sum(row['model_in_fast_top3'] for row in rows) / count, 4)
+        },
+        "disagreements": [row for row in rows if not row['agree']]
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
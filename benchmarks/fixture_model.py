@@ -0,0 +1,130 @@
+"""
+Build a tiny randomly initialised 28-label GoEmotions-shaped model for
+exercising the local backend offline (no downloads). Scores are
+meaningless; only the shapes, labels and runtimes are real.
+
+Usage:
+    python -m benchmarks.fixture_model /tmp/eunoia-fixture --onnx
+    INFERENCE_BACKEND=local LOCAL_MODEL_PATH=/tmp/eunoia-fixture python application.py
+"""
+
+import argparse
+import json
+import os
+import re
+
+from scoring import EMOTION_LABELS
+from test_all_emotions import EMOTION_TEST_CASES
+
+SPECIAL_TOKENS = ["<s>", "<pad>", "</s>", "<unk>"]
+
+
+def build_vocab():
+    words = set(EMOTION_LABELS)
+    for case in EMOTION_TEST_CASES.values():
+        words.update(re.findall(r"[a-z']+", f"{case['title']} {case['content']}".lower()))
+    return {token: i for i, token in enumerate(SPECIAL_TOKENS + sorted(words))}
+
+
+def build_fixture_model(out_dir, export_onnx=False, hidden_size=32, layers=2, seed=0):
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors, normalizers
+    from transformers import PreTrainedTokenizerFast, RobertaConfig, RobertaForSequenceClassification
+
+    os.makedirs(out_dir, exist_ok=True)
+    vocab = build_vocab()
+
+    # Word-level tokenizer that mimics RoBERTa's <s> ... </s> framing
+    tokenizer = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    tokenizer.normalizer = normalizers.Lowercase()
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="<s> $A </s>",
+        special_tokens=[("<s>", vocab["<s>"]), ("</s>", vocab["</s>"])]
+    )
+    fast_tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        bos_token="<s>", eos_token="</s>", pad_token="<pad>", unk_token="<unk>",
+        model_max_length=512
+    )
+    fast_tokenizer.save_pretrained(out_dir)
+
+    torch.manual_seed(seed)
+    config = RobertaConfig(
+        vocab_size=len(vocab),
+        hidden_size=hidden_size,
+        num_hidden_layers=layers,
+        num_attention_heads=2,
+        intermediate_size=hidden_size * 2,
+        max_position_embeddings=514,
+        pad_token_id=vocab["<pad>"],
+        bos_token_id=vocab["<s>"],
+        eos_token_id=vocab["</s>"],
+        num_labels=len(EMOTION_LABELS),
+        id2label=dict(enumerate(EMOTION_LABELS)),
+        label2id={label: i for i, label in enumerate(EMOTION_LABELS)},
+        problem_type="multi_label_classification"
+    )
+    model = RobertaForSequenceClassification(config)
+    model.eval()
+    model.save_pretrained(out_dir)
+
+    if export_onnx:
+        export_to_onnx(model, fast_tokenizer, out_dir)
+    return out_dir
+
+
+def export_to_onnx(model, tokenizer, out_dir):
+    """Export a sequence classifier to out_dir/model.onnx with dynamic batch/sequence axes"""
+    import torch
+
+    sample = tokenizer(["a short sample", "another sample text here"], padding=True, return_tensors='pt')
+    torch.onnx.export(
+        model,
+        (sample['input_ids'], sample['attention_mask']),
+        os.path.join(out_dir, 'model.onnx'),
+        input_names=['input_ids', 'attention_mask'],
+        output_names=['logits'],
+        dynamic_axes={
+            'input_ids': {0: 'batch', 1: 'sequence'},
+            'attention_mask': {0: 'batch', 1: 'sequence'},
+            'logits': {0: 'batch'}
+        },
+        opset_version=17,
+        dynamo=False
+    )
+
+
+def check_fixture_model(model_path, runtime, quantize=None):
+    """Load the fixture through LocalBackend and verify the output contract"""
+    from backends import LocalBackend
+
+    backend = LocalBackend(model_path, runtime=runtime, quantize=quantize)
+    texts = [case['content'] for case in EMOTION_TEST_CASES.values()]
+    results = backend.predict(texts)
+    assert len(results) == len(texts)
+    for scores in results:
+        assert sorted(s['label'] for s in scores) == sorted(EMOTION_LABELS)
+        assert all(0.0 <= s['score'] <= 1.0 for s in scores)
+        assert scores == sorted(scores, key=lambda x: x['score'], reverse=True)
+    single = backend.predict(texts[0])
+    assert len(single) == 1 and len(single[0]) == len(EMOTION_LABELS)
+    return {"runtime": runtime, "quantize": quantize, "texts": len(texts), "top_label": results[0][0]['label']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir')
+    parser.add_argument('--onnx', action='store_true', help="also export model.onnx")
+    parser.add_argument('--check', action='store_true', help="load the result through LocalBackend")
+    args = parser.parse_args()
+
+    build_fixture_model(args.out_dir, export_onnx=args.onnx)
+    print(f"Fixture model written to {args.out_dir}")
+    if args.check:
+        runtimes = ['torch', 'onnx'] if args.onnx else ['torch']
+        print(json.dumps([check_fixture_model(args.out_dir, runtime) for runtime in runtimes], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: gunicorn worker/thread settings for the Flask service.
+
+Each WORKERSxTHREADS setting in --configs runs application.py under
+gunicorn.conf.py against the local inference stub and is driven on
+/analyze at --concurrency. The Flask development server is included as
+the baseline. Per-worker memory is read from /proc to show what preloading
+shares.
+
+Usage:
+    python -m benchmarks.gunicorn_workers --configs 1x1,1x8,2x8,4x8 --concurrency 64 --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+
+from benchmarks.load_test import analyze_payload, drive, start_server
+from benchmarks.stub_inference import StubInferenceServer
+
+
+def children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory_mb(pid):
+    """(rss, private) MB of a process, from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {"rss_mb": round(fields.get("Rss", 0) / 1024, 1), "private_mb": round(private / 1024, 1)}
+
+
+def run(stub, kind, env, args):
+    process, base_url = start_server(kind, stub.url, env)
+    try:
+        calls_before = stub.request_count
+        result = asyncio.run(drive(base_url, "/analyze", analyze_payload, args.concurrency, args.requests))
+        result["upstream_calls"] = stub.request_count - calls_before
+        result["worker_memory"] = [memory_mb(pid) for pid in children(process.pid)] or [memory_mb(process.pid)]
+        return result
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', default="1x1,1x8,2x8,4x8,2x32", help="comma-separated WORKERSxTHREADS")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.05, help="stub seconds per upstream call")
+    parser.add_argument('--no-preload', action='store_true', help="import the app in every worker")
+    args = parser.parse_args()
+
+    report = {"concurrency": args.concurrency, "latency": args.latency, "preload": not args.no_preload}
+    with StubInferenceServer(latency=args.latency, per_item_latency=0) as stub:
+        report["flask_dev_server"] = run(stub, "flask", {}, args)
+        for config in args.configs.split(','):
+            workers, threads = config.split('x')
+            env = {
+                "GUNICORN_WORKERS": workers,
+                "GUNICORN_THREADS": threads,
+                "GUNICORN_PRELOAD": "0" if args.no_preload else "1"
+            }
+            report[f"gunicorn_{config}"] = run(stub, "gunicorn", env, args)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark and behaviour check for the pooled InferenceClient.
+
+1. Connection reuse: sequential calls through bare requests.post (new
+   connection per call) vs InferenceClient (pooled keep-alive session).
+   The stub is plain HTTP, so this measures TCP setup only; against the real
+   HTTPS endpoint the TLS handshake makes the gap larger.
+2. Retries: the stub fails the first requests with 503/429 and the client
+   is expected to recover, honoring Retry-After.
+
+The pass/fail versions of these checks, which exit 1 on a regression, are
+in benchmarks/checks.py.
+
+Usage:
+    python -m benchmarks.http_client --calls 200
+"""
+
+import argparse
+import json
+import time
+
+import requests
+
+from backends import InferenceClient
+from benchmarks.stub_inference import StubInferenceServer
+
+PAYLOAD = {"inputs": "I had a lovely afternoon with my family.", "options": {"wait_for_model": True}}
+
+
+def bench_connections(calls):
+    report = {}
+    with StubInferenceServer(latency=0, per_item_latency=0) as stub:
+        start = time.perf_counter()
+        for _ in range(calls):
+            response = requests.post(stub.url, json=PAYLOAD, timeout=30)
+            response.raise_for_status()
+        elapsed = time.perf_counter() - start
+        report["requests_post"] = {
+            "ms_per_call": round(elapsed / calls * 1000, 3),
+            "connections": stub.connection_count
+        }
+
+    with StubInferenceServer(latency=0, per_item_latency=0) as stub:
+        client = InferenceClient(stub.url)
+        start = time.perf_counter()
+        for _ in range(calls):
+            client.post(PAYLOAD)
+        elapsed = time.perf_counter() - start
+        client.close()
+        report["inference_client"] = {
+            "ms_per_call": round(elapsed / calls * 1000, 3),
+            "connections": stub.connection_count
+        }
+    return report
+
+
+def check_retries():
+    report = {}
+
+    # Recovers after two 503s, waiting the advertised Retry-After each time
+    with StubInferenceServer(latency=0, fail_first=2, fail_status=503, retry_after=0.1) as stub:
+        client = InferenceClient(stub.url, max_retries=3)
+        start = time.perf_counter()
+        client.post(PAYLOAD)
+        elapsed = time.perf_counter() - start
+        stats = client.stats()
+        assert stats["retries"] == 2 and stub.request_count == 3, stats
+        assert elapsed >= 0.2, elapsed
+        report["retry_after_503"] = {"seconds": round(elapsed, 3), **stats}
+
+    # 429 without Retry-After falls back to jittered exponential backoff
+    with StubInferenceServer(latency=0, fail_first=3, fail_status=429) as stub:
+        client = InferenceClient(stub.url, max_retries=3, backoff_base=0.05, backoff_max=0.2)
+        start = time.perf_counter()
+        client.post(PAYLOAD)
+        stats = client.stats()
+        assert stats["retries"] == 3 and stub.request_count == 4, stats
+        report["backoff_429"] = {"seconds": round(time.perf_counter() - start, 3), **stats}
+
+    # Gives up after max_retries and surfaces the HTTP error
+    with StubInferenceServer(latency=0, fail_first=10, fail_status=503, retry_after=0) as stub:
+        client = InferenceClient(stub.url, max_retries=2)
+        try:
+            client.post(PAYLOAD)
+            raise AssertionError("expected HTTPError after exhausting retries")
+        except requests.exceptions.HTTPError:
+            pass
+        assert stub.request_count == 3, stub.request_count
+        report["exhausted"] = client.stats()
+
+    # Non-retryable statuses fail immediately
+    with StubInferenceServer(latency=0, fail_first=1, fail_status=400) as stub:
+        client = InferenceClient(stub.url, max_retries=3)
+        try:
+            client.post(PAYLOAD)
+            raise AssertionError("expected HTTPError for a 400")
+        except requests.exceptions.HTTPError:
+            pass
+        assert stub.request_count == 1, stub.request_count
+        report["non_retryable_400"] = client.stats()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    print(json.dumps({
+        "calls": args.calls,
+        "connection_reuse": bench_connections(args.calls),
+        "retries": check_retries()
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
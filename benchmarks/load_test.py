@@ -0,0 +1,148 @@
+"""
+Load test: Flask (application.py) vs ASGI (async_application.py).
+
+`--servers` also accepts "gunicorn" (application.py under gunicorn.conf.py).
+
+Both servers run as subprocesses pointed at an in-process stub of the
+inference endpoint (caching disabled, so every request reaches the stub),
+and are driven by concurrent asyncio clients.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 128 --requests 2000 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import aiohttp
+import requests
+
+from benchmarks.stub_inference import StubInferenceServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    "flask": [sys.executable, "application.py"],
+    "asgi": [sys.executable, "-m", "uvicorn", "async_application:app",
+             "--host", "127.0.0.1", "--log-level", "warning"],
+    # Port comes from PORT; workers/threads from GUNICORN_WORKERS/GUNICORN_THREADS
+    "gunicorn": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning"]
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, upstream_url, extra_env=None):
+    """Start one of SERVERS on a free port and wait for /ready
+
+    Servers run without warmup, so every upstream call the stub counts was
+    made by the benchmark; pass WARMUP=1 in extra_env to include it.
+    """
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), HF_API_URL=upstream_url, CACHE_SIZE="0", WARMUP="0")
+    env.update(extra_env or {})
+    command = list(SERVERS[kind])
+    if kind == "asgi":
+        command += ["--port", str(port)]
+    process = subprocess.Popen(command, cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{kind} server exited with code {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/ready", timeout=1).status_code == 200:
+                return process, base_url
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"{kind} server did not become ready")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def drive(base_url, path, make_payload, concurrency, total):
+    """Send `total` POSTs from `concurrency` clients; return latency/throughput stats"""
+    latencies = []
+    failures = 0
+    counter = iter(range(total))
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as client:
+        async def worker():
+            nonlocal failures
+            for i in counter:
+                start = time.perf_counter()
+                try:
+                    async with client.post(base_url + path, json=make_payload(i)) as response:
+                        await response.read()
+                        if response.status != 200:
+                            failures += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    failures += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2)
+    }
+
+
+def analyze_payload(i):
+    return {"title": f"Entry {i}", "content": f"Load test entry {i}. I felt calm and grateful today."}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=128)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.05, help="stub seconds per upstream call")
+    parser.add_argument('--servers', default="flask,asgi")
+    args = parser.parse_args()
+
+    report = {"concurrency": args.concurrency, "latency": args.latency, "path": "/analyze"}
+    with StubInferenceServer(latency=args.latency, per_item_latency=0) as stub:
+        for kind in args.servers.split(','):
+            process, base_url = start_server(kind, stub.url)
+            try:
+                calls_before = stub.request_count
+                report[kind] = asyncio.run(
+                    drive(base_url, "/analyze", analyze_payload, args.concurrency, args.requests)
+                )
+                report[kind]["upstream_calls"] = stub.request_count - calls_before
+            finally:
+                process.terminate()
+                process.wait()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
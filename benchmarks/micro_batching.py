@@ -0,0 +1,58 @@
+"""
+Benchmark: concurrent /analyze traffic with and without dynamic micro-batching.
+
+Each server variant runs against the stub inference endpoint; the report
+shows throughput, latency, upstream calls and the batcher's own stats
+(batch size histogram, added wait) taken from /health.
+
+Usage:
+    python -m benchmarks.micro_batching --concurrency 64 --requests 1000 --window-ms 10
+"""
+
+import argparse
+import asyncio
+import json
+
+import requests
+
+from benchmarks.load_test import analyze_payload, drive, start_server
+from benchmarks.stub_inference import StubInferenceServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.05, help="stub seconds per upstream call")
+    parser.add_argument('--per-item-latency', type=float, default=0.001, help="stub seconds per input")
+    parser.add_argument('--window-ms', type=float, default=10)
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--servers', default="flask,asgi")
+    args = parser.parse_args()
+
+    report = {"concurrency": args.concurrency, "latency": args.latency, "window_ms": args.window_ms}
+    with StubInferenceServer(latency=args.latency, per_item_latency=args.per_item_latency) as stub:
+        for kind in args.servers.split(','):
+            for window in (0, args.window_ms):
+                env = {
+                    "MICRO_BATCH_WINDOW_MS": str(window),
+                    "MICRO_BATCH_MAX_SIZE": str(args.max_batch_size)
+                }
+                process, base_url = start_server(kind, stub.url, env)
+                try:
+                    calls_before = stub.request_count
+                    result = asyncio.run(
+                        drive(base_url, "/analyze", analyze_payload, args.concurrency, args.requests)
+                    )
+                    result["upstream_calls"] = stub.request_count - calls_before
+                    result["micro_batching"] = requests.get(f"{base_url}/health", timeout=5).json()["micro_batching"]
+                finally:
+                    process.terminate()
+                    process.wait()
+                report[f"{kind}_{'batched' if window else 'unbatched'}"] = result
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
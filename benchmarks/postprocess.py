@@ -0,0 +1,105 @@
+"""
+Microbenchmark: per-entry score post-processing, list-based vs vectorized.
+
+The list-based path is the original per-entry code (build [{emotion, score}],
+sort the 28 labels, filter by threshold, look up the summary); the
+vectorized path converts the whole batch to an (N, 28) matrix and uses
+ScoreLayout. Both start from the model's [{label, score}] output and end
+with the primary emotion, confidence, top emotions and summary per entry.
+Tag extraction is not included.
+
+Usage:
+    python -m benchmarks.postprocess --sizes 1,100,10000
+"""
+
+import argparse
+import json
+import time
+
+from application import EMOTION_LABELS, EMOTION_SUMMARIES, score_layout
+from benchmarks.stub_inference import fake_scores
+
+
+def legacy_postprocess(scores_list, top_k=5, threshold=0.3):
+    emotion_scores = [{"emotion": item["label"], "score": item["score"]} for item in scores_list]
+    emotion_scores = sorted(emotion_scores, key=lambda x: x['score'], reverse=True)
+    filtered_emotions = [e for e in emotion_scores if e['score'] >= threshold][:top_k]
+    primary = emotion_scores[0]['emotion']
+    return {
+        "primary_emotion": primary,
+        "emotion_confidence": emotion_scores[0]['score'],
+        "detected_emotions": filtered_emotions,
+        "emotional_state_summary": EMOTION_SUMMARIES.get(primary, f"Experiencing {primary}")
+    }
+
+
+def vectorized_postprocess(score_lists, top_k=5, threshold=0.3):
+    matrix = score_layout.to_matrix(score_lists)
+    analysis = score_layout.analyze(matrix, top_k, threshold)
+    return [
+        {
+            "primary_emotion": primary,
+            "emotion_confidence": confidence,
+            "detected_emotions": top,
+            "emotional_state_summary": summary
+        }
+        for primary, confidence, top, summary in zip(
+            score_layout.primary_emotions(analysis),
+            analysis['confidence'].tolist(),
+            score_layout.top_emotions(analysis),
+            score_layout.summaries_for(analysis)
+        )
+    ]
+
+
+def check_same(legacy, vectorized):
+    """Same labels and summaries; scores equal up to float32 rounding"""
+    for a, b in zip(legacy, vectorized):
+        assert a["primary_emotion"] == b["primary_emotion"]
+        assert a["emotional_state_summary"] == b["emotional_state_summary"]
+        assert abs(a["emotion_confidence"] - b["emotion_confidence"]) < 1e-6
+        assert [e["emotion"] for e in a["detected_emotions"]] == [e["emotion"] for e in b["detected_emotions"]]
+
+
+def time_per_entry(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default="1,100,10000")
+    parser.add_argument('--repeat', type=int, default=5, help="best of this many runs")
+    args = parser.parse_args()
+
+    report = {"labels": len(EMOTION_LABELS), "results": []}
+    for n in [int(size) for size in args.sizes.split(',')]:
+        score_lists = [fake_scores(f"Benchmark entry {i}. I felt a lot of things today.") for i in range(n)]
+        # Give some entries two labels over the threshold so filtering does real work
+        for scores in score_lists[::3]:
+            scores[1]["score"] = scores[0]["score"] * 0.9
+
+        legacy = [legacy_postprocess(scores) for scores in score_lists]
+        check_same(legacy, vectorized_postprocess(score_lists))
+
+        legacy_s = time_per_entry(lambda: [legacy_postprocess(scores) for scores in score_lists], args.repeat)
+        vector_s = time_per_entry(lambda: vectorized_postprocess(score_lists), args.repeat)
+        matrix = score_layout.to_matrix(score_lists)
+        analyze_s = time_per_entry(lambda: score_layout.analyze(matrix), args.repeat)
+        report["results"].append({
+            "entries": n,
+            "legacy_us_per_entry": round(legacy_s / n * 1e6, 2),
+            "vectorized_us_per_entry": round(vector_s / n * 1e6, 2),
+            "array_ops_only_us_per_entry": round(analyze_s / n * 1e6, 3),
+            "speedup": round(legacy_s / vector_s, 2)
+        })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Benchmark: fp32 vs int8 local model, agreement and cost per variant.
+
+Each variant (runtime:precision, e.g. torch:fp32, torch:int8, onnx:int8)
+is loaded through LocalBackend in its own process, so its RSS is its own,
+and then runs:
+    cases   the 28 test_all_emotions.py cases one text per call, --repeat
+            times (interactive latency)
+    corpus  a larger set of entries in calls of --batch-size (throughput)
+
+Reports per variant the load time, RSS after importing the runtime, what
+loading the model added to it and the peak, single-text p50/p95 latency
+and accuracy on the cases, and entries/sec and per-call p50/p95 latency on
+the corpus. Scores are compared with the first
+variant (the reference): how often the primary emotion is the same, how
+often the reference's primary is in the variant's top 3, and the mean and
+max absolute score difference.
+
+--corpus takes a file of entries, one per line: JSON with `text` or
+`title`/`content`, or plain text. Without it, --entries entries are made by
+recombining sentences of the test cases, which is enough to compare speed
+but not a substitute for agreement on real journal entries.
+
+Usage:
+    python -m benchmarks.quantization --model /models/go_emotions
+    python -m benchmarks.quantization --model /models/go_emotions --variants torch:fp32,torch:int8,onnx:fp32,onnx:int8 \\
+        --corpus entries.jsonl --batch-size 16 --threads 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import time
+
+from test_all_emotions import EMOTION_TEST_CASES
+
+PRECISIONS = {'fp32': None, 'int8': 'int8'}
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+
+def memory_mb():
+    """(current, peak) RSS of this process in MB, from /proc/self/status"""
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                name, value = line.split(':')
+                fields[name] = int(value.split()[0])
+    return round(fields["VmRSS"] / 1024, 1), round(fields["VmHWM"] / 1024, 1)
+
+
+def case_texts():
+    return [(name, f"{case['title']}. {case['content']}", case['expected']) for name, case in EMOTION_TEST_CASES.items()]
+
+
+def load_corpus(path):
+    texts = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                texts.append(line)
+                continue
+            if isinstance(entry, str):
+                texts.append(entry)
+            elif 'text' in entry:
+                texts.append(entry['text'])
+            else:
+                texts.append(f"{entry.get('title', '')}. {entry['content']}")
+    return texts
+
+
+def synthetic_corpus(count, seed=0):
+    """Entries of 2-6 sentences drawn from different test cases"""
+    sentences = []
+    for case in EMOTION_TEST_CASES.values():
+        sentences.extend(s for s in re.split(r'(?<=[.!?])\s+', case['content']) if s)
+    rng = random.Random(seed)
+    return [" ".join(rng.sample(sentences, rng.randint(2, 6))) for _ in range(count)]
+
+
+def score_rows(results, labels):
+    """Score lists as rows in the model's label order"""
+    index = {label: i for i, label in enumerate(labels)}
+    rows = []
+    for scores in results:
+        row = [0.0] * len(labels)
+        for item in scores:
+            row[index[item['label']]] = item['score']
+        rows.append(row)
+    return rows
+
+
+def run_variant(variant, args, texts, output):
+    """Load one variant and time it; runs in a fresh process"""
+    from backends import LocalBackend
+
+    runtime, precision = variant.split(':')
+    # Import the runtime first so the model's own memory can be told apart from the libraries'
+    from transformers import AutoConfig, AutoTokenizer  # noqa: F401
+    __import__('torch' if runtime == 'torch' else 'onnxruntime')
+    runtime_rss, _ = memory_mb()
+
+    started = time.perf_counter()
+    backend = LocalBackend(args.model, runtime=runtime, num_threads=args.threads, quantize=PRECISIONS[precision])
+    load_seconds = time.perf_counter() - started
+    loaded_rss, _ = memory_mb()
+
+    cases = case_texts()
+    # The first forward pass pays for lazy allocations; keep it out of the timings
+    backend.predict([cases[0][1]])
+
+    case_results = {}
+    case_seconds = []
+    for _ in range(args.repeat):
+        for name, text, _ in cases:
+            started = time.perf_counter()
+            case_results[name] = backend.predict([text])[0]
+            case_seconds.append(time.perf_counter() - started)
+
+    corpus_results = []
+    corpus_seconds = []
+    for offset in range(0, len(texts), args.batch_size):
+        started = time.perf_counter()
+        corpus_results.extend(backend.predict(texts[offset:offset + args.batch_size]))
+        corpus_seconds.append(time.perf_counter() - started)
+
+    _, peak_rss = memory_mb()
+    output.put({
+        "labels": backend.labels,
+        "cases": {name: scores for name, scores in case_results.items()},
+        "corpus": score_rows(corpus_results, backend.labels),
+        "report": {
+            "model_id": backend.model_id,
+            "load_seconds": round(load_seconds, 2),
+            "runtime_rss_mb": runtime_rss,
+            "model_rss_mb": round(loaded_rss - runtime_rss, 1),
+            "peak_rss_mb": peak_rss,
+            "cases": {
+                "calls": len(case_seconds),
+                "p50_ms": percentile(case_seconds, 0.5),
+                "p95_ms": percentile(case_seconds, 0.95),
+                "accuracy": round(
+                    sum(case_results[name][0]['label'] == expected for name, _, expected in cases) / len(cases), 4
+                )
+            },
+            "corpus": {
+                "entries": len(texts),
+                "batch_size": args.batch_size,
+                "entries_per_s": round(len(texts) / sum(corpus_seconds), 1),
+                "p50_ms": percentile(corpus_seconds, 0.5),
+                "p95_ms": percentile(corpus_seconds, 0.95)
+            }
+        }
+    })
+
+
+def measure(variant, args, texts):
+    context = multiprocessing.get_context('spawn')
+    output = context.Queue()
+    process = context.Process(target=run_variant, args=(variant, args, texts, output))
+    process.start()
+    try:
+        result = output.get()
+    finally:
+        process.join()
+    return result
+
+
+def agreement(reference_rows, rows):
+    """Primary-emotion agreement and score drift of rows against reference_rows"""
+    primary = in_top3 = 0
+    total_diff = max_diff = 0.0
+    for expected, actual in zip(reference_rows, rows):
+        reference_primary = max(range(len(expected)), key=expected.__getitem__)
+        top3 = sorted(range(len(actual)), key=actual.__getitem__, reverse=True)[:3]
+        primary += top3[0] == reference_primary
+        in_top3 += reference_primary in top3
+        diffs = [abs(a - b) for a, b in zip(expected, actual)]
+        total_diff += sum(diffs)
+        max_diff = max(max_diff, max(diffs))
+    count = len(rows)
+    return {
+        "primary": round(primary / count, 4),
+        "reference_primary_in_top3": round(in_top3 / count, 4),
+        "mean_abs_score_diff": round(total_diff / (count * len(reference_rows[0])), 5),
+        "max_abs_score_diff": round(max_diff, 5)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=os.environ.get('LOCAL_MODEL_PATH', 'SamLowe/roberta-base-go_emotions'),
+                        help="model id or directory (default: LOCAL_MODEL_PATH)")
+    parser.add_argument('--variants', default='torch:fp32,torch:int8',
+                        help="comma-separated runtime:precision list; the first is the reference")
+    parser.add_argument('--corpus', help="file of entries, one per line (JSON or plain text)")
+    parser.add_argument('--entries', type=int, default=500, help="synthetic corpus size when --corpus is not given")
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=3, help="timed passes over the test cases")
+    parser.add_argument('--threads', type=int, default=None, help="intra-op threads per variant")
+    args = parser.parse_args()
+
+    variants = args.variants.split(',')
+    for variant in variants:
+        runtime, _, precision = variant.partition(':')
+        if runtime not in ('torch', 'onnx') or precision not in PRECISIONS:
+            parser.error(f"Unknown variant '{variant}', expected torch|onnx:fp32|int8")
+    texts = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.entries)
+
+    results = {variant: measure(variant, args, texts) for variant in variants}
+    reference = results[variants[0]]
+    names = [name for name, _, _ in case_texts()]
+    report = {
+        "model": args.model,
+        "reference": variants[0],
+        "corpus": args.corpus or f"synthetic ({len(texts)} entries)",
+        "threads": args.threads,
+        "variants": {}
+    }
+    for variant in variants:
+        result = results[variant]
+        if result["labels"] != reference["labels"]:
+            raise RuntimeError(f"{variant} has different labels than {variants[0]}")
+        entry = result["report"]
+        if variant != variants[0]:
+            case_rows = score_rows([result["cases"][name] for name in names], result["labels"])
+            reference_case_rows = score_rows([reference["cases"][name] for name in names], reference["labels"])
+            entry["agreement"] = {
+                "cases": agreement(reference_case_rows, case_rows),
+                "corpus": agreement(reference["corpus"], result["corpus"])
+            }
+            entry["case_disagreements"] = [
+                {"case": name, "reference": reference["cases"][name][0]['label'], "variant": result["cases"][name][0]['label']}
+                for name in names if reference["cases"][name][0]['label'] != result["cases"][name][0]['label']
+            ]
+            entry["speedup"] = round(entry["corpus"]["entries_per_s"] / reference["report"]["corpus"]["entries_per_s"], 2)
+        report["variants"][variant] = entry
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
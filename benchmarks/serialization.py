@@ -0,0 +1,104 @@
+"""
+Benchmark: response size and encoding time of a /batch-analyze payload.
+
+Builds the results for a batch of entries (1,000 by default) once per
+result view, from stub scores, then encodes the full response with each
+encoder: Flask's JSON provider (what jsonify did before), the orjson path
+used by payload_response, that output gzipped, and MessagePack when the
+`msgpack` package is installed. Reports bytes and best-of-N milliseconds
+per view and encoder, plus the time to build the results for each view.
+
+Views:
+    default   the standard entry result
+    labeled   plus all_scores, the 28 {emotion, score} pairs per entry
+    array     plus scores, the same 28 values as a float array in EMOTION_LABELS order
+    lean      fields=primary_emotion,emotion_confidence,scores with score_format=array
+    minimal   fields=primary_emotion,emotion_confidence
+
+Usage:
+    python -m benchmarks.serialization --entries 1000
+"""
+
+import argparse
+import json
+import time
+
+import application
+from benchmarks.stub_inference import fake_scores
+from serialization import ResultView, dumps, encode, load_msgpack
+
+VIEWS = {
+    "default": ResultView(),
+    "labeled": ResultView(score_format='labeled'),
+    "array": ResultView(score_format='array'),
+    "lean": ResultView(['primary_emotion', 'emotion_confidence', 'scores'], 'array'),
+    "minimal": ResultView(['primary_emotion', 'emotion_confidence'], 'none')
+}
+
+
+def best_seconds(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def encoders():
+    """{name: payload -> bytes}"""
+    flask_json = application.app.json
+    found = {
+        "flask_json": lambda payload: flask_json.dumps(payload).encode('utf-8'),
+        "orjson": dumps,
+        "orjson_gzip": lambda payload: encode(payload, accept_encoding='gzip', gzip_min_bytes=0)[0]
+    }
+    msgpack = load_msgpack()
+    if msgpack is not None:
+        found["msgpack"] = lambda payload: msgpack.packb(payload, use_bin_type=True)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5, help="best of this many runs")
+    args = parser.parse_args()
+
+    entries = [
+        (f"Entry {i}", f"Entry {i}. Work was stressful but dinner with friends made me happy again.")
+        for i in range(args.entries)
+    ]
+    matrix = application.score_layout.to_matrix([fake_scores(full_text) for _, full_text in entries])
+    available = encoders()
+
+    report = {"entries": args.entries, "encoders": list(available), "views": {}}
+    baseline = None
+    for name, view in VIEWS.items():
+        results = application.build_entry_results(entries, matrix, view=view)
+        for index, result in enumerate(results):
+            result["index"] = index
+        payload = {"success": True, "data": results, "count": len(results), "errors": []}
+
+        row = {
+            "build_ms": round(best_seconds(
+                lambda: application.build_entry_results(entries, matrix, view=view), args.repeat
+            ) * 1000, 2)
+        }
+        for encoder, fn in available.items():
+            body = fn(payload)
+            row[encoder] = {
+                "bytes": len(body),
+                "ms": round(best_seconds(lambda: fn(payload), args.repeat) * 1000, 2)
+            }
+        if baseline is None:
+            baseline = row["flask_json"]
+        row["orjson_gzip_bytes_vs_default_flask_json"] = round(row["orjson_gzip"]["bytes"] / baseline["bytes"], 3)
+        row["encode_speedup_orjson"] = round(row["flask_json"]["ms"] / row["orjson"]["ms"], 1)
+        report["views"][name] = row
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: similarity search over the on-disk score index (similarity.py).
+
+Fills a VectorIndex with synthetic 28-dim score vectors (Dirichlet draws,
+peaked like the model's softmax output) spread over --users users, then
+reports per size:
+    - append throughput and the on-disk size
+    - time to reopen the index (reloading the row metadata)
+    - exact search latency over every row and over one user's rows
+    - inverted-file build time, approximate search latency over every row
+      and recall@k against the exact results, per --probes setting
+
+Usage:
+    python -m benchmarks.similarity_search --sizes 10000,100000,1000000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from similarity import VectorIndex
+
+DIM = 28
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def timed(fn, queries):
+    seconds = []
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(fn(query))
+        seconds.append(time.perf_counter() - started)
+    return results, {
+        "p50_ms": round(percentile(seconds, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 0.95) * 1000, 3)
+    }
+
+
+def synthetic_scores(rng, n, concentration=0.1):
+    return rng.dirichlet(np.full(DIM, concentration), size=n).astype(np.float32)
+
+
+def run(size, args, directory):
+    rng = np.random.default_rng(size)
+    path = os.path.join(directory, f"scores-{size}")
+    index = VectorIndex(path, DIM, "scores", ann_min_rows=size + 1, ann_probes=args.probes[0])
+
+    started = time.perf_counter()
+    for start in range(0, size, args.append_batch):
+        count = min(args.append_batch, size - start)
+        metas = [{"user_id": f"u{(start + i) % args.users}", "entry_id": str(start + i)} for i in range(count)]
+        index.append(synthetic_scores(rng, count), metas)
+    append_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = VectorIndex(path, DIM, "scores", ann_min_rows=size + 1, ann_probes=args.probes[0])
+    open_seconds = time.perf_counter() - started
+
+    queries = synthetic_scores(rng, args.queries)
+    exact, exact_all = timed(lambda q: index.search(q, args.k, approximate=False)[0], queries)
+    _, exact_user = timed(lambda q: index.search(q, args.k, user_id="u0", approximate=False)[0], queries)
+
+    started = time.perf_counter()
+    index.build_ann()
+    build_seconds = time.perf_counter() - started
+
+    approximate = {}
+    for probes in args.probes:
+        index.ann_probes = probes
+        found, latency = timed(lambda q: index.search(q, args.k, approximate=True)[0], queries)
+        recall = np.mean([len(set(a.tolist()) & set(e.tolist())) / len(e) for a, e in zip(found, exact)])
+        approximate[str(probes)] = dict(latency, recall_at_k=round(float(recall), 4))
+
+    return {
+        "rows": size,
+        "rows_per_user": size // args.users,
+        "append_rows_per_s": round(size / append_seconds),
+        "disk_mb": round(sum(os.path.getsize(path + ext) for ext in ('.f32', '.ndjson')) / 1e6, 1),
+        "reopen_s": round(open_seconds, 3),
+        "exact_all_rows": exact_all,
+        "exact_one_user": exact_user,
+        "ann_build_s": round(build_seconds, 2),
+        "ann": index.stats()["ann"],
+        "approximate_all_rows_by_probes": approximate
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default="10000,100000,1000000")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--probes', default="8,16,32", help="comma-separated inverted-file probe counts to compare")
+    parser.add_argument('--append-batch', type=int, default=10000)
+    parser.add_argument('--dir', help="where to write the indexes (default: a temporary directory, removed after)")
+    args = parser.parse_args()
+    args.probes = [int(p) for p in args.probes.split(',')]
+
+    directory = args.dir or tempfile.mkdtemp(prefix="similarity-bench-")
+    try:
+        report = {"k": args.k, "users": args.users, "queries": args.queries, "results": []}
+        for size in [int(s) for s in args.sizes.split(',')]:
+            report["results"].append(run(size, args, directory))
+        print(json.dumps(report, indent=2))
+    finally:
+        if args.dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: single-flight deduplication of identical concurrent texts.
+
+Concurrent clients send /analyze requests drawn from a small set of
+distinct texts, as happens with client retries or fan-out of the same
+entry. Result caching is off so every collapsed call shows up as a saved
+upstream request. The cross-process run starts two Flask workers that
+share a lock file and a SQLite cache and splits the load between them.
+
+Usage:
+    python -m benchmarks.single_flight --concurrency 64 --requests 1000 --distinct 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+import requests
+
+from benchmarks.load_test import drive, start_server
+from benchmarks.stub_inference import StubInferenceServer
+
+
+def repeated_payload(distinct):
+    def make_payload(i):
+        n = i % distinct
+        return {"title": f"Entry {n}", "content": f"Retried entry {n}. I felt calm and grateful today."}
+    return make_payload
+
+
+async def drive_split(base_urls, make_payload, concurrency, total):
+    """Split the clients and requests evenly across several servers"""
+    share = total // len(base_urls)
+    results = await asyncio.gather(*(
+        drive(url, "/analyze", lambda i, offset=k * share: make_payload(i + offset),
+              concurrency // len(base_urls), share)
+        for k, url in enumerate(base_urls)
+    ))
+    return {
+        "requests": sum(r["requests"] for r in results),
+        "failures": sum(r["failures"] for r in results),
+        "requests_per_sec": round(sum(r["requests_per_sec"] for r in results), 2),
+        "p95_ms": max(r["p95_ms"] for r in results)
+    }
+
+
+def run(stub, kind, envs, make_payload, concurrency, total):
+    servers = [start_server(kind, stub.url, env) for env in envs]
+    try:
+        calls_before = stub.request_count
+        base_urls = [base_url for _, base_url in servers]
+        if len(base_urls) == 1:
+            result = asyncio.run(drive(base_urls[0], "/analyze", make_payload, concurrency, total))
+        else:
+            result = asyncio.run(drive_split(base_urls, make_payload, concurrency, total))
+        result["upstream_calls"] = stub.request_count - calls_before
+        result["single_flight"] = [
+            requests.get(f"{base_url}/health", timeout=5).json()["single_flight"] for base_url in base_urls
+        ]
+        return result
+    finally:
+        for process, _ in servers:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--distinct', type=int, default=16, help="number of distinct texts")
+    parser.add_argument('--latency', type=float, default=0.1, help="stub seconds per upstream call")
+    parser.add_argument('--servers', default="flask,asgi")
+    args = parser.parse_args()
+
+    make_payload = repeated_payload(args.distinct)
+    report = {"concurrency": args.concurrency, "distinct_texts": args.distinct, "latency": args.latency}
+    with StubInferenceServer(latency=args.latency, per_item_latency=0) as stub:
+        for kind in args.servers.split(','):
+            for enabled in ("0", "1"):
+                name = f"{kind}_{'single_flight' if enabled == '1' else 'baseline'}"
+                report[name] = run(stub, kind, [{"SINGLE_FLIGHT": enabled}], make_payload,
+                                   args.concurrency, args.requests)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for lock in (False, True):
+                # A fresh cache per run so the second doesn't start warm
+                shared = {
+                    "CACHE_SIZE": "2048",
+                    "CACHE_TTL": "0",
+                    "CACHE_DB_PATH": os.path.join(tmp, f"cache-{lock}.db")
+                }
+                if lock:
+                    shared["SINGLE_FLIGHT_LOCK_PATH"] = os.path.join(tmp, "single-flight.lock")
+                name = f"flask_2_workers_{'lock_file' if lock else 'no_lock_file'}"
+                report[name] = run(stub, "flask", [shared, shared], make_payload, args.concurrency, args.requests)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
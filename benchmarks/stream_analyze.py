@@ -0,0 +1,124 @@
+"""
+Benchmark: NDJSON streaming through /batch-analyze/stream.
+
+Uploads `--entries` generated entries as a chunked NDJSON body while reading
+results back concurrently, and samples the server's RSS while it runs. Flat
+RSS across entry counts shows memory stays constant; `--read-delay` makes
+the client slow to show backpressure instead of unbounded buffering.
+
+Usage:
+    python -m benchmarks.stream_analyze --entries 100000
+    python -m benchmarks.stream_analyze --entries 5000 --read-delay 0.001
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+
+from benchmarks.load_test import start_server
+from benchmarks.stub_inference import StubInferenceServer
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+async def entry_lines(count):
+    for i in range(count):
+        line = json.dumps({"title": f"Entry {i}", "content": f"Export entry {i}. Slept well and felt rested."})
+        yield (line + "\n").encode('utf-8')
+        if i % 1000 == 0:
+            await asyncio.sleep(0)
+
+
+async def stream_once(base_url, pid, entries, batch_size, read_delay):
+    samples = []
+    sent = {"lines": 0}
+
+    async def sample():
+        while True:
+            samples.append(rss_mb(pid))
+            await asyncio.sleep(0.25)
+
+    async def body():
+        async for line in entry_lines(entries):
+            sent["lines"] += 1
+            yield line
+
+    sampler = asyncio.ensure_future(sample())
+    received = 0
+    errors = 0
+    max_lag = 0
+    start = time.perf_counter()
+    first_result = None
+    try:
+        timeout = aiohttp.ClientTimeout(total=None)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            url = f"{base_url}/batch-analyze/stream?batch_size={batch_size}"
+            async with session.post(url, data=body(), headers={"Content-Type": "application/x-ndjson"}) as response:
+                response.raise_for_status()
+                async for line in response.content:
+                    item = json.loads(line)
+                    if first_result is None:
+                        first_result = time.perf_counter() - start
+                    if "done" in item:
+                        break
+                    received += 1
+                    errors += "error" in item
+                    # How far the upload ran ahead of what we've consumed
+                    max_lag = max(max_lag, sent["lines"] - received)
+                    if read_delay:
+                        await asyncio.sleep(read_delay)
+    finally:
+        sampler.cancel()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "entries": entries,
+        "received": received,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "entries_per_sec": round(received / elapsed, 1),
+        "first_result_ms": round((first_result or 0) * 1000, 1),
+        "max_upload_lead": max_lag,
+        "server_rss_mb": {
+            "start": round(samples[0], 1) if samples else None,
+            "max": round(max(samples), 1) if samples else None,
+            "end": round(samples[-1], 1) if samples else None
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--read-delay', type=float, default=0.0, help="client seconds per result line")
+    parser.add_argument('--latency', type=float, default=0.005, help="stub seconds per upstream call")
+    parser.add_argument('--servers', default="flask,asgi")
+    args = parser.parse_args()
+
+    report = {}
+    with StubInferenceServer(latency=args.latency, per_item_latency=0) as stub:
+        for kind in args.servers.split(','):
+            process, base_url = start_server(kind, stub.url)
+            try:
+                report[kind] = asyncio.run(
+                    stream_once(base_url, process.pid, args.entries, args.batch_size, args.read_delay)
+                )
+            finally:
+                process.terminate()
+                process.wait()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Local stub of the Hugging Face Inference API for offline benchmarks.
+Answers POSTs with deterministic fake GoEmotions scores in the same
+[[{label, score}, ...]] shape as the real endpoint.
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scoring import EMOTION_LABELS
+
+
+def fake_scores(text):
+    """Deterministic 28-label score list for a piece of text"""
+    digest = hashlib.sha256(text.encode('utf-8')).digest()
+    raw = [digest[i % len(digest)] + 1 for i in range(len(EMOTION_LABELS))]
+    # Give one label a clear lead so top-k filtering has something to keep
+    lead = digest[0] % len(EMOTION_LABELS)
+    raw[lead] += sum(raw)
+    total = float(sum(raw))
+    scores = [{"label": label, "score": value / total} for label, value in zip(EMOTION_LABELS, raw)]
+    return sorted(scores, key=lambda x: x['score'], reverse=True)
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under high fan-out
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StubInferenceServer:
+    """Threaded HTTP server emulating the HF endpoint
+
+    latency: seconds slept per request
+    per_item_latency: extra seconds slept per input in a list payload
+    jitter: up to this many extra seconds, drawn uniformly, per request
+    cold_start: for this many seconds after start() every request gets a 503
+        with the remaining time as `estimated_time`, like a model still loading
+    fail_first: answer the first N requests with `fail_status`
+    error_rate: fraction of later requests answered with `fail_status`
+    retry_after: Retry-After header value sent with failures (None to omit)
+    estimated_time: `estimated_time` reported in failure bodies, like a loading HF model
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.05, per_item_latency=0.002, jitter=0.0,
+                 cold_start=0.0, fail_first=0, error_rate=0.0, fail_status=503, retry_after=None,
+                 estimated_time=None, seed=0):
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.jitter = jitter
+        self.cold_start = cold_start
+        self._ready_at = 0.0
+        self.fail_first = fail_first
+        self.error_rate = error_rate
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.estimated_time = estimated_time
+        self._random = random.Random(seed)
+        self.request_count = 0
+        self.error_count = 0
+        self.cold_start_count = 0
+        # New TCP connections accepted; with keep-alive this stays far below request_count
+        self.connection_count = 0
+        self._lock = threading.Lock()
+        self._server = _StubHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/models/stub"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls on keep-alive
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connection_count += 1
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                inputs = payload.get('inputs', '')
+                loading = stub._ready_at - time.monotonic()
+                with stub._lock:
+                    stub.request_count += 1
+                    if loading > 0:
+                        stub.cold_start_count += 1
+                    failing = (stub.request_count <= stub.fail_first
+                               or stub._random.random() < stub.error_rate)
+                    if failing:
+                        stub.error_count += 1
+                    delay = stub.latency + stub._random.uniform(0, stub.jitter) if stub.jitter else stub.latency
+
+                if loading > 0:
+                    self._send_json(503, {"error": "Model is currently loading", "estimated_time": loading})
+                    return
+
+                if failing:
+                    body = {"error": "Model is currently loading"}
+                    if stub.estimated_time is not None:
+                        body["estimated_time"] = stub.estimated_time
+                    self._send_json(stub.fail_status, body)
+                    return
+
+                if isinstance(inputs, list):
+                    time.sleep(delay + stub.per_item_latency * len(inputs))
+                    body = [fake_scores(text) for text in inputs]
+                else:
+                    time.sleep(delay + stub.per_item_latency)
+                    body = [fake_scores(inputs)]
+
+                self._send_json(200, body)
+
+            def _send_json(self, status, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                if status != 200 and stub.retry_after is not None:
+                    self.send_header('Retry-After', str(stub.retry_after))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._ready_at = time.monotonic() + self.cold_start
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,152 @@
+"""
+Benchmark suite: every analysis endpoint on each server against the local stub.
+
+For each server in --servers a fresh stub of the inference endpoint is
+started (so --cold-start applies to every run), the server is launched
+against it, and /analyze, /batch-analyze and /analyze-text are driven in
+turn at --concurrency. The report holds p50/p95/p99 latency, requests/sec,
+failures and upstream calls per request for every server/endpoint pair,
+plus the git commit it was measured on.
+
+Save a report with --output and compare a later run against it with
+--baseline; the comparison lists the relative change of each metric.
+
+Usage:
+    python -m benchmarks.suite --concurrency 32 --requests 500 --output before.json
+    python -m benchmarks.suite --concurrency 32 --requests 500 --baseline before.json
+    python -m benchmarks.suite --error-rate 0.05 --cold-start 2 --env MICRO_BATCH_WINDOW_MS=5
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+
+from benchmarks.load_test import ROOT, drive, start_server
+from benchmarks.stub_inference import StubInferenceServer
+
+ENDPOINTS = ("analyze", "batch-analyze", "analyze-text")
+COMPARED = ("requests_per_sec", "p50_ms", "p95_ms", "p99_ms", "upstream_calls_per_request")
+
+
+def entry(i):
+    return {"title": f"Entry {i}", "content": f"Benchmark entry {i}. Work was stressful but dinner with friends helped."}
+
+
+def make_payloads(batch_entries):
+    return {
+        "analyze": entry,
+        "batch-analyze": lambda i: {"entries": [entry(i * batch_entries + j) for j in range(batch_entries)]},
+        "analyze-text": lambda i: {"text": f"Benchmark text {i}. I can't believe how well that went!"}
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_env(pairs):
+    env = {}
+    for pair in pairs:
+        name, sep, value = pair.partition('=')
+        if not sep:
+            raise SystemExit(f"--env expects NAME=VALUE, got '{pair}'")
+        env[name] = value
+    return env
+
+
+def run_server(kind, args, env):
+    stub = StubInferenceServer(latency=args.latency, per_item_latency=args.per_item_latency, jitter=args.jitter,
+                               cold_start=args.cold_start, error_rate=args.error_rate)
+    results = {}
+    with stub:
+        process, base_url = start_server(kind, stub.url, env)
+        try:
+            payloads = make_payloads(args.batch_entries)
+            for endpoint in args.endpoints.split(','):
+                calls_before = stub.request_count
+                errors_before = stub.error_count + stub.cold_start_count
+                result = asyncio.run(drive(base_url, f"/{endpoint}", payloads[endpoint],
+                                           args.concurrency, args.requests))
+                result["upstream_calls"] = stub.request_count - calls_before
+                result["upstream_calls_per_request"] = round(result["upstream_calls"] / args.requests, 3)
+                result["upstream_errors"] = stub.error_count + stub.cold_start_count - errors_before
+                results[endpoint] = result
+        finally:
+            process.terminate()
+            process.wait()
+    return results
+
+
+def compare(report, baseline):
+    """Relative change of each COMPARED metric against a saved report"""
+    changes = {}
+    for kind, endpoints in report["results"].items():
+        for endpoint, result in endpoints.items():
+            before = baseline.get("results", {}).get(kind, {}).get(endpoint)
+            if before is None:
+                continue
+            changes[f"{kind} /{endpoint}"] = {
+                metric: f"{(result[metric] - before[metric]) / before[metric] * 100:+.1f}%" if before[metric] else None
+                for metric in COMPARED
+            }
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', default="flask,asgi")
+    parser.add_argument('--endpoints', default=",".join(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=500, help="requests per endpoint")
+    parser.add_argument('--batch-entries', type=int, default=8, help="entries per /batch-analyze request")
+    parser.add_argument('--latency', type=float, default=0.05, help="stub seconds per upstream call")
+    parser.add_argument('--per-item-latency', type=float, default=0.002, help="stub seconds per batched input")
+    parser.add_argument('--jitter', type=float, default=0.0, help="stub extra random seconds per call")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of stub calls answered 503")
+    parser.add_argument('--cold-start', type=float, default=0.0, help="seconds the stub reports a loading model")
+    parser.add_argument('--env', action='append', default=[], metavar="NAME=VALUE",
+                        help="extra server environment, e.g. CACHE_SIZE=2048 (caching is off by default)")
+    parser.add_argument('--output', help="also write the report to this file")
+    parser.add_argument('--baseline', help="report from an earlier run to compare against")
+    args = parser.parse_args()
+
+    for endpoint in args.endpoints.split(','):
+        if endpoint not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint '{endpoint}', expected one of {', '.join(ENDPOINTS)}")
+    env = parse_env(args.env)
+
+    report = {
+        "commit": git_commit(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "batch_entries": args.batch_entries,
+            "latency": args.latency,
+            "per_item_latency": args.per_item_latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "cold_start": args.cold_start,
+            "env": env
+        },
+        "results": {kind: run_server(kind, args, env) for kind in args.servers.split(',')}
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["baseline_commit"] = baseline.get("commit")
+        report["change"] = compare(report, baseline)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
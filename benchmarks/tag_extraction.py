@@ -0,0 +1,108 @@
+"""
+Microbenchmark: content tag extraction, original per-character loop vs tagging.TagExtractor.
+
+Single entries of each `--sizes` length (bytes) are tagged one at a time,
+then `--batch` 1 KB entries are tagged one by one and with extract_batch.
+Both implementations are checked to return the same tags first.
+
+Usage:
+    python -m benchmarks.tag_extraction --sizes 1000,10000,100000 --batch 1000
+"""
+
+import argparse
+import json
+import random
+import time
+
+from tagging import TagExtractor, build_idf
+
+WORDS = (
+    "today I felt really tired after work, but the evening walk with Sam helped. "
+    "Worried about the deadline; my manager's feedback was harsh. Grateful for "
+    "coffee, sunshine and a long call with mom! Couldn't sleep again... anxious "
+    "thoughts about money, rent, and whether I'm doing enough. Therapy session "
+    "went well - we talked about boundaries & self-compassion."
+).split()
+
+
+def legacy_content_tags(text):
+    words = text.lower().split()
+    stopwords = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+                 'of', 'with', 'by', 'from', 'as', 'is', 'was', 'were', 'been', 'be',
+                 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+                 'should', 'may', 'might', 'i', 'you', 'he', 'she', 'it', 'we', 'they'}
+
+    word_freq = {}
+    for word in words:
+        word = ''.join(c for c in word if c.isalnum())
+        if len(word) > 3 and word not in stopwords:
+            word_freq[word] = word_freq.get(word, 0) + 1
+
+    content_tags = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:3]
+    return [tag[0] for tag in content_tags]
+
+
+def make_entry(size, rng):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:size]
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default="1000,10000,100000")
+    parser.add_argument('--batch', type=int, default=1000, help="number of 1 KB entries in the batch run")
+    parser.add_argument('--repeat', type=int, default=5, help="best of this many runs")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    extractor = TagExtractor()
+    report = {"single": [], "batch": None}
+
+    for size in [int(size) for size in args.sizes.split(',')]:
+        text = make_entry(size, rng)
+        assert extractor.extract(text) == legacy_content_tags(text)
+        legacy_s = best_time(lambda: legacy_content_tags(text), args.repeat)
+        fast_s = best_time(lambda: extractor.extract(text), args.repeat)
+        report["single"].append({
+            "bytes": size,
+            "legacy_ms": round(legacy_s * 1000, 3),
+            "extractor_ms": round(fast_s * 1000, 3),
+            "speedup": round(legacy_s / fast_s, 2)
+        })
+
+    texts = [make_entry(1000, rng) for _ in range(args.batch)]
+    assert extractor.extract_batch(texts) == [legacy_content_tags(text) for text in texts]
+    legacy_s = best_time(lambda: [legacy_content_tags(text) for text in texts], args.repeat)
+    single_s = best_time(lambda: [extractor.extract(text) for text in texts], args.repeat)
+    batch_s = best_time(lambda: extractor.extract_batch(texts), args.repeat)
+    documents, idf = build_idf(texts)
+    weighted = TagExtractor(idf, documents)
+    idf_s = best_time(lambda: weighted.extract_batch(texts), args.repeat)
+    report["batch"] = {
+        "entries": args.batch,
+        "legacy_us_per_entry": round(legacy_s / args.batch * 1e6, 2),
+        "extract_us_per_entry": round(single_s / args.batch * 1e6, 2),
+        "extract_batch_us_per_entry": round(batch_s / args.batch * 1e6, 2),
+        "extract_batch_idf_us_per_entry": round(idf_s / args.batch * 1e6, 2),
+        "speedup": round(legacy_s / batch_s, 2)
+    }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Content-addressed result cache for emotion scores.
+
+Entries are keyed by a hash of the normalized text plus the model id and
+hold the raw score vector in EMOTION_LABELS order. The in-memory layer is a
+bounded LRU with a TTL; an optional SQLite store lets several gunicorn
+workers on the same host share hits.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """Canonical form used for cache keys: NFC, collapsed whitespace"""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def cache_key(text, model_id):
+    digest = hashlib.sha256()
+    digest.update(model_id.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalize_text(text).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class SQLiteCacheStore:
+    """Score vectors in a local SQLite file, shared between processes"""
+
+    def __init__(self, path, ttl, max_size):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scores ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS scores_accessed ON scores (accessed)")
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def after_fork(self):
+        """Forget connections inherited from the parent; SQLite handles can't cross fork()"""
+        self._local = threading.local()
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT vector, created FROM scores WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if self.ttl and now - row[1] > self.ttl:
+            conn.execute("DELETE FROM scores WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE scores SET accessed = ? WHERE key = ?", (now, key))
+        return array('f', row[0]).tolist()
+
+    def put(self, key, vector):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO scores (key, vector, created, accessed) VALUES (?, ?, ?, ?)",
+            (key, array('f', vector).tobytes(), now, now)
+        )
+        self._writes += 1
+        # Trim occasionally rather than on every write
+        if self._writes % 100 == 0:
+            return self.trim()
+        return 0
+
+    def trim(self):
+        """Drop expired rows and the least recently used rows beyond max_size"""
+        conn = self._connect()
+        removed = 0
+        if self.ttl:
+            removed += conn.execute("DELETE FROM scores WHERE created < ?", (time.time() - self.ttl,)).rowcount
+        removed += conn.execute(
+            "DELETE FROM scores WHERE key IN ("
+            "SELECT key FROM scores ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,)
+        ).rowcount
+        return removed
+
+    def size(self):
+        return self._connect().execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+
+class ResultCache:
+    """Bounded LRU + TTL cache of score vectors, optionally backed by a shared store"""
+
+    def __init__(self, labels, max_size=2048, ttl=3600, shared_store=None):
+        self.labels = list(labels)
+        self._label_index = {label: i for i, label in enumerate(self.labels)}
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_store = shared_store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+
+    def to_vector(self, scores_list):
+        """[{label, score}] -> list of floats in label order, or None if labels don't match"""
+        vector = [0.0] * len(self.labels)
+        seen = 0
+        for item in scores_list:
+            index = self._label_index.get(item['label'])
+            if index is None:
+                return None
+            vector[index] = float(item['score'])
+            seen += 1
+        return vector if seen == len(self.labels) else None
+
+    def from_vector(self, vector):
+        scores = [{"label": label, "score": score} for label, score in zip(self.labels, vector)]
+        return sorted(scores, key=lambda x: x['score'], reverse=True)
+
+    def get(self, key):
+        """Return the cached [{label, score}] list for key, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, expires = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return self.from_vector(vector)
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+        if self.shared_store is not None:
+            try:
+                vector = self.shared_store.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"Shared cache read failed: {str(e)}")
+                vector = None
+            if vector is not None:
+                self._store_local(key, vector)
+                with self._lock:
+                    self._stats["shared_hits"] += 1
+                return self.from_vector(vector)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key, scores_list):
+        vector = self.to_vector(scores_list)
+        if vector is None:
+            return
+        self._store_local(key, vector)
+        if self.shared_store is not None:
+            try:
+                self.shared_store.put(key, vector)
+            except sqlite3.Error as e:
+                logger.warning(f"Shared cache write failed: {str(e)}")
+
+    def _store_local(self, key, vector):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (vector, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["max_size"] = self.max_size
+        stats["ttl"] = self.ttl
+        stats["hit_rate"] = round((stats["hits"] + stats["shared_hits"]) / lookups, 4) if lookups else 0.0
+        stats["shared"] = self.shared_store.path if self.shared_store is not None else None
+        return stats
@@ -0,0 +1,85 @@
+"""
+Sentence-boundary chunking and score aggregation for long journal entries.
+
+The classifier only sees its first 512 tokens, so long entries are split
+into windows of whole sentences that fit comfortably inside that limit
+(measured in characters, ~4 characters per RoBERTa token for English), and
+the per-chunk score rows are combined into one.
+"""
+
+import re
+
+import numpy as np
+
+# Sentence ends (., !, ? and closing quotes/brackets) followed by whitespace, or line breaks
+SENTENCE_BOUNDARY = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+|\n+')
+
+AGGREGATIONS = ('mean', 'max')
+
+
+def split_sentences(text):
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(text) if sentence and sentence.strip()]
+
+
+def _split_long_sentence(sentence, max_chars):
+    """Hard-wrap a single over-long sentence on whitespace"""
+    pieces = []
+    current = ''
+    for word in sentence.split():
+        while len(word) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(word[:max_chars])
+            word = word[max_chars:]
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text, max_chars=1500):
+    """Greedily pack whole sentences into chunks of at most max_chars
+
+    Text that already fits is returned as a single chunk, unchanged.
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks = []
+    current = ''
+    for sentence in split_sentences(text):
+        sentence = sentence.strip()
+        if len(sentence) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.extend(_split_long_sentence(sentence, max_chars))
+            continue
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks or [text[:max_chars]]
+
+
+def aggregate_scores(chunk_matrix, weights=None, method='mean'):
+    """Combine an (n_chunks, n_labels) score matrix into one score vector
+
+    method="mean" is a weighted mean (weights are usually chunk lengths);
+    method="max" keeps each label's strongest chunk score.
+    """
+    if method not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{method}', expected one of {', '.join(AGGREGATIONS)}")
+    if len(chunk_matrix) == 1:
+        return chunk_matrix[0]
+    if method == 'max':
+        return chunk_matrix.max(axis=0)
+    return np.average(chunk_matrix, axis=0, weights=weights).astype(np.float32)
@@ -0,0 +1,142 @@
+"""
+Circuit breaker for the inference backend.
+
+The breaker tracks the outcome of the last `window` calls. Once at least
+`min_calls` have been seen and either the failure rate reaches
+`failure_rate` or the share of calls slower than `slow_call_seconds`
+reaches `slow_call_rate`, it opens: calls are rejected with
+CircuitOpenError for `open_seconds`, so request threads stop queueing
+behind a dead or overloaded upstream. After that it is half-open and lets
+`half_open_calls` probe calls through. If they all succeed the breaker
+closes, and any failure opens it again.
+"""
+
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the backend while the breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Inference backend unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, window=20, min_calls=10, failure_rate=0.5, slow_call_seconds=10.0,
+                 slow_call_rate=0.8, open_seconds=30.0, half_open_calls=1):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        # Ring buffers of the last `window` outcomes
+        self._failed = [False] * window
+        self._slow = [False] * window
+        self._position = 0
+        self._calls = 0
+        self._failures = 0
+        self._slow_calls = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN:
+                remaining = self._opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(remaining)
+                self._state = HALF_OPEN
+                self._probes = 0
+                self._probe_successes = 0
+            if self._probes >= self.half_open_calls:
+                self._stats["rejected"] += 1
+                raise CircuitOpenError(self.open_seconds)
+            self._probes += 1
+
+    def record(self, seconds, failed):
+        """Report a finished call's duration and whether it raised"""
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._reset(CLOSED)
+                return
+            if self._state == OPEN:
+                # A call that started before the breaker opened
+                return
+
+            if self._calls == self.window:
+                self._failures -= self._failed[self._position]
+                self._slow_calls -= self._slow[self._position]
+            else:
+                self._calls += 1
+            self._failed[self._position] = failed
+            self._slow[self._position] = slow
+            self._failures += failed
+            self._slow_calls += slow
+            self._position = (self._position + 1) % self.window
+
+            if self._calls >= self.min_calls and (
+                    self._failures / self._calls >= self.failure_rate
+                    or self._slow_calls / self._calls >= self.slow_call_rate):
+                self._open()
+
+    def release(self):
+        """Give back a half-open probe slot for a call that ended without a verdict"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def _open(self):
+        self._reset(OPEN)
+        self._opened_at = time.monotonic()
+        self._stats["opened"] += 1
+
+    def _reset(self, state):
+        self._state = state
+        self._failed = [False] * self.window
+        self._slow = [False] * self.window
+        self._position = 0
+        self._calls = 0
+        self._failures = 0
+        self._slow_calls = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() >= self._opened_at + self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def describe(self):
+        state = self.state
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "state": state,
+                "window_calls": self._calls,
+                "failure_rate": round(self._failures / self._calls, 4) if self._calls else 0.0,
+                "slow_call_rate": round(self._slow_calls / self._calls, 4) if self._calls else 0.0,
+                "open_seconds": self.open_seconds
+            })
+        return stats
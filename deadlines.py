@@ -0,0 +1,90 @@
+"""
+Per-request deadlines.
+
+A route opens a deadline_scope() and everything it calls, in the same
+thread or asyncio task, can ask how much time is left. The inference
+clients cap each HTTP attempt at the remaining time and give up instead
+of retrying past it. Waits on shared work (single-flight, micro-batches)
+are bounded the same way. A batch request's chunks share the request's
+deadline, so one slow chunk can't push the response past it.
+
+Worker threads don't inherit context variables: the micro-batcher's own
+model calls run without a deadline (each caller's wait is still bounded)
+and streamed chunks open their own scope.
+"""
+
+import asyncio
+import concurrent.futures
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_deadline = ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    def __init__(self, message="Request deadline exceeded"):
+        super().__init__(message)
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """Run the block with at most `seconds` left (None or 0 adds no limit)
+
+    A tighter deadline already in effect is kept.
+    """
+    if not seconds:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None without one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check():
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+def bound(timeout):
+    """timeout capped at the time left; raises DeadlineExceeded once it has passed"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(timeout, left) if timeout is not None else left
+
+
+def wait(future):
+    """future.result(), given up on at the deadline"""
+    try:
+        return future.result(timeout=remaining() if _deadline.get() is not None else None)
+    except concurrent.futures.TimeoutError:
+        if future.done():
+            raise
+        raise DeadlineExceeded()
+
+
+async def wait_async(awaitable):
+    """Await, given up on at the deadline (wrap shared futures in asyncio.shield)"""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout=max(left, 0))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded()
@@ -0,0 +1,50 @@
+"""
+Gunicorn settings for the Flask service (application.py).
+
+The app is preloaded: the master imports application.py once, loading the
+model, tokenizer, tag tables and caches, and forks workers that share
+that memory copy-on-write. Each worker then opens its own upstream
+connection pool and starts its micro-batcher and mood store threads
+(post_fork), also when the app is not preloaded. On shutdown, workers finish in-flight requests within
+graceful_timeout and flush queued batches and mood writes before exiting.
+
+Run with:
+    gunicorn -c gunicorn.conf.py
+
+Tuning (see the README for measured settings):
+    GUNICORN_WORKERS   processes (default 2)
+    GUNICORN_THREADS   request threads per worker (default 16, also the default HF_POOL_SIZE)
+    GUNICORN_PRELOAD   0 to import the app in every worker instead
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 7860)}"
+wsgi_app = "application:create_app()"
+
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+worker_class = "gthread" if threads > 1 else "sync"
+# One pooled upstream connection per request thread unless configured otherwise
+os.environ.setdefault('HF_POOL_SIZE', str(threads))
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# Long enough for HF_TIMEOUT plus retries on a slow upstream
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Without preloading this is the worker's first import of the app
+    import application
+    application.after_fork()
+
+
+def worker_exit(server, worker):
+    import application
+    application.stop_background_threads()
@@ -0,0 +1,386 @@
+"""
+Persistent job queue for large batch analyses.
+
+A submitted job's entries are written to a local SQLite file in one
+transaction and a job id is returned at once. Worker threads claim jobs
+with a lease and analyze them `chunk_size` entries at a time; each chunk's
+results and the job's cursor are committed together, so a chunk is either
+fully recorded or redone. A heartbeat thread renews the leases of the
+jobs being worked on every third of `lease_seconds`, so a chunk may take
+longer than the lease; only a stalled or dead process loses it. If a
+process dies its leases expire and another worker (after a restart, or in
+another process on the same host) picks the job up at its cursor. A clean
+shutdown releases leases so a restarted worker resumes immediately.
+
+A chunk that raises (the upstream is down, the circuit is open) is retried
+with backoff and fails the job after `max_attempts` tries in a row.
+Per-entry validation errors are stored alongside the results. Finished
+jobs are kept for `retention_seconds`.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ('queued', 'running', 'done', 'failed')
+
+# Backoff between failed attempts at a chunk, doubled per attempt
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 60.0
+
+# How often a worker deletes expired jobs
+PURGE_INTERVAL_SECONDS = 300
+
+
+class JobQueue:
+    """SQLite-backed batch jobs processed by a local pool of worker threads
+
+    process(entries, options) analyzes one chunk and returns (results,
+    errors) as /batch-analyze does, indexed within the chunk.
+    """
+
+    def __init__(self, path, process, workers=2, chunk_size=64, lease_seconds=60, max_attempts=5,
+                 retention_seconds=7 * 86400, poll_interval=1.0):
+        self.path = path
+        self.process = process
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"chunks": 0, "entries": 0, "chunk_failures": 0}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._active = {}
+        self._purged_at = 0.0
+
+        conn = self._connect()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "  id TEXT PRIMARY KEY, status TEXT NOT NULL, options TEXT NOT NULL,"
+            "  total INTEGER NOT NULL, cursor INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0,"
+            "  attempts INTEGER NOT NULL DEFAULT 0, error TEXT,"
+            "  created_at REAL NOT NULL, updated_at REAL NOT NULL, finished_at REAL,"
+            "  lease_owner TEXT, lease_expires REAL NOT NULL DEFAULT 0);"
+            "CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, lease_expires);"
+            "CREATE TABLE IF NOT EXISTS job_entries ("
+            "  job_id TEXT NOT NULL, idx INTEGER NOT NULL, entry TEXT NOT NULL,"
+            "  PRIMARY KEY (job_id, idx)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS job_results ("
+            "  job_id TEXT NOT NULL, idx INTEGER NOT NULL, is_error INTEGER NOT NULL, body TEXT NOT NULL,"
+            "  PRIMARY KEY (job_id, idx)) WITHOUT ROWID;"
+        )
+
+    def _connect(self):
+        # sqlite3 connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, entries, options, job_id=None):
+        """Store a job and its entries; returns the job description
+
+        job_id is one from new_job_id(), for callers that need it before
+        the job is stored; a new one is made otherwise.
+        """
+        job_id = job_id or new_job_id()
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, status, options, total, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(options), len(entries), now, now)
+            )
+            conn.executemany(
+                "INSERT INTO job_entries (job_id, idx, entry) VALUES (?, ?, ?)",
+                ((job_id, index, json.dumps(entry)) for index, entry in enumerate(entries))
+            )
+            if not entries:
+                conn.execute(
+                    "UPDATE jobs SET status = 'done', finished_at = ? WHERE id = ?", (now, job_id)
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._wakeup.set()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """{id, status, total, processed, failed, ...} or None for an unknown job"""
+        row = self._connect().execute(
+            "SELECT id, status, total, cursor, failed, error, created_at, updated_at, finished_at "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "status": row[1],
+            "total": row[2],
+            "processed": row[3],
+            "failed": row[4],
+            "error": row[5],
+            "created_at": iso_time(row[6]),
+            "updated_at": iso_time(row[7]),
+            "finished_at": iso_time(row[8])
+        }
+
+    def results(self, job_id, offset=0, limit=100):
+        """(results, errors) for entries offset..offset+limit-1 that have been processed"""
+        rows = self._connect().execute(
+            "SELECT is_error, body FROM job_results WHERE job_id = ? AND idx >= ? AND idx < ? ORDER BY idx",
+            (job_id, offset, offset + limit)
+        ).fetchall()
+        results = []
+        errors = []
+        for is_error, body in rows:
+            (errors if is_error else results).append(json.loads(body))
+        return results, errors
+
+    def delete(self, job_id):
+        """Remove a job and everything stored for it; a worker on it stops after its chunk"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,)).rowcount
+            conn.execute("DELETE FROM job_entries WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM job_results WHERE job_id = ?", (job_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted > 0
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def close(self):
+        """Let workers finish their current chunk, then release their jobs"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _work(self):
+        owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        while not self._stopping.is_set():
+            try:
+                self._purge_expired()
+                job = self._claim(owner)
+            except sqlite3.Error as e:
+                logger.warning(f"Job queue poll failed: {str(e)}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            with self._lock:
+                self._active[owner] = job[0]
+            try:
+                self._run(owner, *job)
+            except sqlite3.Error as e:
+                # The lease runs out and the job is picked up again
+                logger.warning(f"Job {job[0]} stopped on a database error: {str(e)}")
+            finally:
+                with self._lock:
+                    self._active.pop(owner, None)
+
+    def _heartbeat(self):
+        """Extend the leases of jobs this queue's workers are on until close()"""
+        while not self._stopping.wait(self.lease_seconds / 3):
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                continue
+            expires = time.time() + self.lease_seconds
+            try:
+                conn = self._connect()
+                conn.executemany(
+                    "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ?",
+                    ((expires, job_id, owner) for owner, job_id in active)
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"Job lease renewal failed: {str(e)}")
+
+    def _claim(self, owner):
+        """(job_id, options, cursor, total) of the oldest job with no live lease, leased to owner"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, options, cursor, total FROM jobs "
+                "WHERE status IN ('queued', 'running') AND lease_expires <= ? ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?, updated_at = ? "
+                    "WHERE id = ?", (owner, now + self.lease_seconds, now, row[0])
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), row[2], row[3]
+
+    def _run(self, owner, job_id, options, cursor, total):
+        conn = self._connect()
+        while cursor < total:
+            if self._stopping.is_set():
+                self._release(owner, job_id)
+                return
+            end = min(cursor + self.chunk_size, total)
+            entries = [json.loads(row[0]) for row in conn.execute(
+                "SELECT entry FROM job_entries WHERE job_id = ? AND idx >= ? AND idx < ? ORDER BY idx",
+                (job_id, cursor, end)
+            )]
+            try:
+                results, errors = self.process(entries, options)
+            except Exception as e:
+                with self._lock:
+                    self._stats["chunk_failures"] += 1
+                logger.warning(f"Job {job_id} chunk at entry {cursor} failed: {str(e)}")
+                self._retry_later(owner, job_id, e)
+                return
+            if not self._commit_chunk(owner, job_id, cursor, end, total, results, errors):
+                # Deleted, or our lease lapsed and someone else has it
+                return
+            with self._lock:
+                self._stats["chunks"] += 1
+                self._stats["entries"] += end - cursor
+            cursor = end
+
+    def _commit_chunk(self, owner, job_id, start, end, total, results, errors):
+        """Store a chunk's outcome and advance the cursor, if owner still holds the job"""
+        now = time.time()
+        rows = []
+        for item in results:
+            item = dict(item, index=start + item["index"])
+            rows.append((job_id, item["index"], 0, json.dumps(item)))
+        for item in errors:
+            item = dict(item, index=start + item["index"])
+            rows.append((job_id, item["index"], 1, json.dumps(item)))
+        done = end >= total
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            updated = conn.execute(
+                "UPDATE jobs SET cursor = ?, failed = failed + ?, attempts = 0, error = NULL, updated_at = ?,"
+                "  status = ?, finished_at = ?, lease_expires = ?, lease_owner = ? "
+                "WHERE id = ? AND lease_owner = ? AND cursor = ?",
+                (end, len(errors), now, 'done' if done else 'running', now if done else None,
+                 0 if done else now + self.lease_seconds, None if done else owner, job_id, owner, start)
+            ).rowcount
+            if not updated:
+                conn.execute("ROLLBACK")
+                return False
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_results (job_id, idx, is_error, body) VALUES (?, ?, ?, ?)", rows
+            )
+            if done:
+                # Inputs aren't needed once every entry has a result
+                conn.execute("DELETE FROM job_entries WHERE job_id = ?", (job_id,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def _retry_later(self, owner, job_id, error):
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT attempts FROM jobs WHERE id = ? AND lease_owner = ?", (job_id, owner)
+            ).fetchone()
+            if row is not None:
+                attempts = row[0] + 1
+                if attempts >= self.max_attempts:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', attempts = ?, error = ?, updated_at = ?,"
+                        "  finished_at = ?, lease_owner = NULL, lease_expires = 0 WHERE id = ?",
+                        (attempts, str(error), now, now, job_id)
+                    )
+                    conn.execute("DELETE FROM job_entries WHERE job_id = ?", (job_id,))
+                else:
+                    delay = getattr(error, 'retry_after', None) or min(
+                        RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+                    )
+                    conn.execute(
+                        "UPDATE jobs SET attempts = ?, error = ?, updated_at = ?, lease_owner = NULL,"
+                        "  lease_expires = ? WHERE id = ?",
+                        (attempts, str(error), now, now + delay, job_id)
+                    )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _release(self, owner, job_id):
+        self._connect().execute(
+            "UPDATE jobs SET lease_owner = NULL, lease_expires = 0 WHERE id = ? AND lease_owner = ?",
+            (job_id, owner)
+        )
+
+    def _purge_expired(self):
+        now = time.time()
+        with self._lock:
+            if now - self._purged_at < PURGE_INTERVAL_SECONDS:
+                return
+            self._purged_at = now
+        conn = self._connect()
+        expired = [row[0] for row in conn.execute(
+            "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (now - self.retention_seconds,)
+        )]
+        for job_id in expired:
+            self.delete(job_id)
+        if expired:
+            logger.info(f"Purged {len(expired)} expired jobs")
+
+    def stats(self):
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        with self._lock:
+            stats = dict(self._stats)
+        stats["jobs"] = counts
+        stats["workers"] = sum(thread.name.startswith("job-worker") for thread in self._threads)
+        stats["path"] = self.path
+        return stats
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def iso_time(timestamp):
+    if timestamp is None:
+        return None
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
@@ -0,0 +1,234 @@
+"""
+Keyword lexicon classifier: the fast analysis mode and the degraded fallback.
+
+Each token found in the lexicon adds its weights to one or more of the 28
+GoEmotions labels, and the totals are normalized into scores shaped like
+the model's output. Text with no lexicon hits comes out neutral. Scoring a
+journal entry takes microseconds, so it suits high-volume, low-stakes
+paths (re-tagging old entries, live previews) and answers requests while
+the upstream circuit is open. It is coarse: agreement with the model is
+measured by benchmarks/fast_classifier.py.
+
+The built-in table is a small hand-written seed. A better one can be
+distilled from the model's own outputs on your entries (cached results are
+reused, so only unseen texts reach the model):
+    python -m lexicon entries.ndjson lexicon.json
+and loaded with LEXICON_PATH.
+"""
+
+import argparse
+import json
+import re
+
+import numpy as np
+
+from tagging import STOPWORDS
+
+_TOKEN = re.compile(r"[a-z']+")
+
+# Neutral keeps this much mass, so a single weak hit doesn't read as certainty
+NEUTRAL_PRIOR = 1.0
+
+# Distillation: words must appear in this many entries, vote for at most this many
+# labels, and only for labels they lift by at least MIN_LIFT over the corpus mean
+MIN_WORD_COUNT = 3
+MAX_WORD_LABELS = 3
+MIN_LIFT = 0.05
+
+SEED_LEXICON = {
+    'admiration': ['admire', 'admiration', 'inspiring', 'impressive', 'impressed', 'respect', 'awe', 'amazing'],
+    'amusement': ['funny', 'hilarious', 'laugh', 'laughing', 'laughed', 'lol', 'haha', 'chuckling', 'amused'],
+    'anger': ['angry', 'furious', 'rage', 'mad', 'hate', 'outraged', 'livid', 'scream'],
+    'annoyance': ['annoying', 'annoyed', 'irritated', 'irritating', 'bothering', 'nerves', 'ugh'],
+    'approval': ['agree', 'approve', 'support', 'sensible', 'right', 'yes'],
+    'caring': ['care', 'caring', 'concerned', 'protective', 'wellbeing', 'support'],
+    'confusion': ['confused', 'confusing', 'puzzled', 'bewildered', 'lost', 'unsure', 'understand'],
+    'curiosity': ['curious', 'wonder', 'wondering', 'explore', 'discover', 'learn', 'fascinating'],
+    'desire': ['want', 'wish', 'crave', 'long', 'yearn', 'desire', 'desperately'],
+    'disappointment': ['disappointed', 'disappointing', 'letdown', 'discouraged', 'disheartening'],
+    'disapproval': ['disagree', 'disapprove', 'wrong', 'against', 'terrible', 'unacceptable'],
+    'disgust': ['disgusting', 'disgusted', 'gross', 'revolting', 'repulsive', 'nauseated', 'sick'],
+    'embarrassment': ['embarrassed', 'embarrassing', 'awkward', 'humiliated', 'mortifying', 'cringing'],
+    'excitement': ['excited', 'exciting', 'thrilled', 'pumped', 'energized', 'celebrate'],
+    'fear': ['afraid', 'scared', 'terrified', 'fear', 'dread', 'frightened', 'panic'],
+    'gratitude': ['grateful', 'thankful', 'thanks', 'thank', 'appreciate', 'blessed'],
+    'grief': ['grief', 'grieving', 'died', 'death', 'funeral', 'mourning', 'loss'],
+    'joy': ['happy', 'joy', 'joyful', 'delight', 'wonderful', 'bliss', 'happiness'],
+    'love': ['love', 'loved', 'adore', 'cherish', 'affection', 'partner'],
+    'nervousness': ['nervous', 'anxious', 'uneasy', 'jittery', 'tense', 'worried', 'worry'],
+    'optimism': ['hopeful', 'optimistic', 'hope', 'brighter', 'confident', 'better'],
+    'pride': ['proud', 'pride', 'accomplished', 'achieved', 'persevered'],
+    'realization': ['realized', 'realize', 'epiphany', 'clicked', 'understand'],
+    'relief': ['relieved', 'relief', 'finally', 'phew', 'lifted'],
+    'remorse': ['sorry', 'regret', 'guilt', 'guilty', 'remorse', 'apologize'],
+    'sadness': ['sad', 'unhappy', 'cry', 'crying', 'depressed', 'lonely', 'empty', 'melancholy'],
+    'surprise': ['surprise', 'surprised', 'shocked', 'unexpected', 'wow', 'amazed'],
+    'neutral': ['normal', 'ordinary', 'usual', 'routine', 'average']
+}
+
+
+def seed_table(labels):
+    """{word: [(label_index, weight), ...]} from SEED_LEXICON"""
+    index = {label: i for i, label in enumerate(labels)}
+    table = {}
+    for label, words in SEED_LEXICON.items():
+        for word in words:
+            table.setdefault(word, []).append((index[label], 1.0))
+    return table
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def distill_table(texts, matrix, labels, min_count=MIN_WORD_COUNT, max_labels=MAX_WORD_LABELS):
+    """{word: [(label_index, weight), ...]} learned from texts and their model scores
+
+    matrix is the (N, labels) score matrix for texts. A word's weight for a
+    label is how far the mean score of the texts containing it rises above
+    the corpus mean; its `max_labels` strongest labels are kept. Stopwords
+    and words seen in fewer than `min_count` texts are dropped.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if not len(matrix):
+        return {}
+    baseline = matrix.mean(axis=0)
+    sums = {}
+    counts = {}
+    for text, row in zip(texts, matrix):
+        for word in set(tokenize(text)):
+            if word in sums:
+                sums[word] += row
+                counts[word] += 1
+            else:
+                sums[word] = row.copy()
+                counts[word] = 1
+
+    neutral = labels.index('neutral')
+    table = {}
+    for word, count in counts.items():
+        if count < min_count or word in STOPWORDS:
+            continue
+        lift = sums[word] / count - baseline
+        # Neutral is the prior, not something a word votes for
+        lift[neutral] = 0.0
+        strongest = np.argsort(-lift)[:max_labels]
+        weights = [(int(i), round(float(lift[i]), 4)) for i in strongest if lift[i] >= MIN_LIFT]
+        if weights:
+            table[word] = weights
+    return table
+
+
+def merge_tables(base, overrides):
+    """base with every word in overrides replaced by the override's weights"""
+    table = dict(base)
+    table.update(overrides)
+    return table
+
+
+def save_table(path, labels, table, documents=0):
+    words = {word: {labels[i]: weight for i, weight in weights} for word, weights in table.items()}
+    with open(path, 'w') as f:
+        json.dump({"documents": documents, "words": words}, f, sort_keys=True)
+
+
+def load_table(path, labels):
+    """(documents, table) from a file written by save_table"""
+    index = {label: i for i, label in enumerate(labels)}
+    with open(path) as f:
+        data = json.load(f)
+    table = {
+        word: [(index[label], float(weight)) for label, weight in weights.items()]
+        for word, weights in data["words"].items()
+    }
+    return int(data.get("documents", 0)), table
+
+
+class LexiconClassifier:
+    """Scores text against a word -> label weight table, in the model's output shape"""
+
+    def __init__(self, labels, table=None, source="seed"):
+        self.labels = list(labels)
+        self.neutral = self.labels.index('neutral')
+        self.table = table if table is not None else seed_table(self.labels)
+        self.source = source
+
+    def matrix(self, texts):
+        """(N, labels) float32 score matrix, each row summing to 1"""
+        matrix = np.zeros((len(texts), len(self.labels)), dtype=np.float32)
+        table = self.table
+        for row, text in zip(matrix, texts):
+            totals = [0.0] * len(self.labels)
+            for token in _TOKEN.findall(text.lower()):
+                weights = table.get(token)
+                if weights is not None:
+                    for label, weight in weights:
+                        totals[label] += weight
+            row[:] = totals
+        matrix[:, self.neutral] += NEUTRAL_PRIOR
+        matrix /= matrix.sum(axis=1, keepdims=True)
+        return matrix
+
+    def scores(self, text):
+        row = self.matrix([text])[0].tolist()
+        return sorted(
+            ({"label": label, "score": value} for label, value in zip(self.labels, row)),
+            key=lambda x: x['score'],
+            reverse=True
+        )
+
+    def predict(self, inputs):
+        """Same contract as the inference backends: one score list per input"""
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        return [self.scores(text) for text in texts]
+
+    def describe(self):
+        return {"source": self.source, "words": len(self.table)}
+
+
+def read_entry_texts(path):
+    """"title. content" (or "text") per line of an NDJSON export of entries"""
+    texts = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'text' in entry:
+                texts.append(entry['text'])
+            else:
+                texts.append(f"{entry.get('title', 'Untitled Entry')}. {entry.get('content', '')}")
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Distill a lexicon for the fast analysis mode from model scores of an NDJSON entry export"
+    )
+    parser.add_argument('entries', help="NDJSON file, one {title, content} or {text} per line")
+    parser.add_argument('output', help="lexicon JSON to write (load it with LEXICON_PATH)")
+    parser.add_argument('--min-count', type=int, default=MIN_WORD_COUNT,
+                        help="drop words found in fewer entries than this")
+    parser.add_argument('--max-labels', type=int, default=MAX_WORD_LABELS, help="labels kept per word")
+    parser.add_argument('--no-seed', action='store_true', help="don't keep seed words the entries never used")
+    args = parser.parse_args()
+
+    # Scores come from the configured backend through the result cache
+    import application
+
+    texts = read_entry_texts(args.entries)
+    score_lists = []
+    for start in range(0, len(texts), application.BATCH_SIZE):
+        score_lists.extend(application.get_emotion_scores_batch(texts[start:start + application.BATCH_SIZE]))
+    matrix = application.score_layout.to_matrix(score_lists)
+
+    labels = application.EMOTION_LABELS
+    table = distill_table(texts, matrix, labels, args.min_count, args.max_labels)
+    if not args.no_seed:
+        table = merge_tables(seed_table(labels), table)
+    save_table(args.output, labels, table, len(texts))
+    print(f"Wrote {len(table)} words distilled from {len(texts)} entries to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
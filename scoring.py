@@ -0,0 +1,150 @@
+"""
+Vectorized post-processing of emotion scores.
+
+A batch of model outputs is held as an (N, labels) float32 matrix in label
+order (EMOTION_LABELS), so the primary emotion, top-k, thresholding and the
+summary lookup are a handful of array operations for the whole batch. The
+[{emotion, score}] JSON shapes are only built at the edge.
+"""
+
+import numpy as np
+
+# Batches up to this many rows take the full-sort path in ScoreLayout.top_k
+FULL_SORT_ROWS = 64
+
+# The GoEmotions labels, in the order the model outputs them
+EMOTION_LABELS = [
+    'admiration', 'amusement', 'anger', 'annoyance', 'approval', 
+    'caring', 'confusion', 'curiosity', 'desire', 'disappointment', 
+    'disapproval', 'disgust', 'embarrassment', 'excitement', 'fear', 
+    'gratitude', 'grief', 'joy', 'love', 'nervousness', 
+    'optimism', 'pride', 'realization', 'relief', 'remorse', 
+    'sadness', 'surprise', 'neutral'
+]
+
+EMOTION_SUMMARIES = {
+    'joy': 'Happy and positive',
+    'sadness': 'Feeling down',
+    'anger': 'Frustrated or angry',
+    'fear': 'Anxious or worried',
+    'excitement': 'Excited and energized',
+    'love': 'Loving and warm',
+    'gratitude': 'Grateful and appreciative',
+    'nervousness': 'Nervous and uneasy',
+    'optimism': 'Hopeful and optimistic',
+    'disappointment': 'Disappointed',
+    'confusion': 'Confused or uncertain',
+    'caring': 'Caring and compassionate',
+    'neutral': 'Calm and neutral',
+    'grief': 'Experiencing deep loss and sorrow',
+    'admiration': 'Experiencing admiration',
+    'amusement': 'Experiencing amusement',
+    'annoyance': 'Feeling irritated',
+    'approval': 'Feeling supportive',
+    'desire': 'Feeling longing or desire',
+    'disapproval': 'Feeling critical',
+    'disgust': 'Feeling disgusted',
+    'embarrassment': 'Feeling embarrassed',
+    'pride': 'Feeling proud',
+    'realization': 'Having a realization',
+    'relief': 'Feeling relieved',
+    'remorse': 'Feeling regretful',
+    'surprise': 'Experiencing surprise'
+}
+
+
+class ScoreLayout:
+    """Fixed label order for score matrices, plus the per-label summary text"""
+
+    def __init__(self, labels, summaries=None):
+        self.labels = list(labels)
+        self.label_index = {label: i for i, label in enumerate(self.labels)}
+        summaries = summaries or {}
+        self.summaries = np.array(
+            [summaries.get(label, f"Experiencing {label}") for label in self.labels],
+            dtype=object
+        )
+
+    def to_matrix(self, score_lists):
+        """[[{label, score}], ...] -> (N, labels) float32 matrix"""
+        columns = []
+        values = []
+        lengths = []
+        for scores in score_lists:
+            try:
+                columns.extend([self.label_index[item['label']] for item in scores])
+            except KeyError as e:
+                raise ValueError(f"Unexpected label {e} in model output")
+            values.extend([item['score'] for item in scores])
+            lengths.append(len(scores))
+
+        matrix = np.zeros((len(lengths), len(self.labels)), dtype=np.float32)
+        if values:
+            rows = np.repeat(np.arange(len(lengths)), lengths)
+            matrix[rows, columns] = values
+        return matrix
+
+    def top_k(self, matrix, k):
+        """Indexes and scores of each row's k highest labels, highest first"""
+        k = max(1, min(k, matrix.shape[1]))
+        if len(matrix) <= FULL_SORT_ROWS or k == matrix.shape[1]:
+            # For a few rows one full sort beats partition + gather + sort
+            indexes = np.argsort(-matrix, axis=1, kind='stable')[:, :k]
+            return indexes, matrix[np.arange(len(matrix))[:, None], indexes]
+        # Partial selection first; only the k survivors are sorted
+        indexes = np.argpartition(-matrix, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(matrix, indexes, axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')
+        return np.take_along_axis(indexes, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def analyze(self, matrix, top_k=5, threshold=0.3):
+        """Whole-batch breakdown as arrays
+
+        primary/confidence are (N,), top/top_scores/keep are (N, top_k) with
+        keep marking the top-k scores at or above the threshold.
+        """
+        top, top_scores = self.top_k(matrix, top_k)
+        return {
+            "primary": top[:, 0],
+            "confidence": top_scores[:, 0],
+            "top": top,
+            "top_scores": top_scores,
+            "keep": top_scores >= threshold
+        }
+
+    def primary_emotions(self, analysis):
+        return [self.labels[i] for i in analysis["primary"].tolist()]
+
+    def summaries_for(self, analysis):
+        return self.summaries[analysis["primary"]].tolist()
+
+    def top_emotions(self, analysis):
+        """Per row [{emotion, score}] for the kept top-k labels"""
+        labels = self.labels
+        return [
+            [{"emotion": labels[i], "score": score} for i, score, keep in zip(row, scores, kept) if keep]
+            for row, scores, kept in zip(analysis["top"].tolist(),
+                                         analysis["top_scores"].tolist(),
+                                         analysis["keep"].tolist())
+        ]
+
+    def all_scores(self, matrix):
+        """Per row [{emotion, score}] for every label, highest first"""
+        order, scores = self.top_k(matrix, matrix.shape[1])
+        labels = self.labels
+        return [
+            [{"emotion": labels[i], "score": score} for i, score in zip(row, row_scores)]
+            for row, row_scores in zip(order.tolist(), scores.tolist())
+        ]
+
+    def summarize(self, matrix, top_k=5, threshold=0.3, include_all=False):
+        """Per row {primary_emotion, top_emotions[, all_scores]} in the API's JSON shape"""
+        analysis = self.analyze(matrix, top_k, threshold)
+        summaries = [
+            {"primary_emotion": primary, "top_emotions": top}
+            for primary, top in zip(self.primary_emotions(analysis), self.top_emotions(analysis))
+        ]
+        if include_all:
+            for summary, scores in zip(summaries, self.all_scores(matrix)):
+                summary["all_scores"] = scores
+        return summaries
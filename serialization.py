@@ -0,0 +1,150 @@
+"""
+Response encoding for analysis payloads.
+
+Payloads are encoded with orjson when it is installed (several times
+faster than the json module on result-heavy responses) and with the json
+module otherwise. Clients that send `Accept: application/msgpack` get
+MessagePack instead, if the optional `msgpack` package is installed, and
+bodies above a size threshold are gzipped for clients that accept it.
+
+ResultView trims analysis results per request: a whitelist of result
+fields, and the format of the full 28-label score breakdown (labeled
+dicts, a float array in label order, or left out).
+"""
+
+import gzip
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+
+# labeled: all_scores as [{emotion, score}]; array: scores as floats in label order; none: neither
+SCORE_FORMATS = ('labeled', 'array', 'none')
+
+# Result keys a field selection never drops: batch position and the degraded-mode flag
+ALWAYS_KEPT = frozenset({'index', 'degraded'})
+
+# Every key an entry (/analyze, /batch-analyze) or text (/analyze-text) result can carry
+RESULT_FIELDS = ALWAYS_KEPT | {
+    'timestamp', 'title', 'primary_emotion', 'emotion_confidence', 'detected_emotions', 'top_emotions',
+    'tags', 'emotional_state_summary', 'chunks', 'mode', 'all_scores', 'scores'
+}
+
+# Decimal places kept in the score array; float32 scores carry about 7 significant digits
+ARRAY_PRECISION = 6
+
+_msgpack = None
+
+
+def dumps(payload):
+    """JSON bytes for payload"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def load_msgpack():
+    """The msgpack module, or None if it isn't installed"""
+    global _msgpack
+    if _msgpack is None:
+        try:
+            import msgpack
+        except ImportError:
+            _msgpack = False
+        else:
+            _msgpack = msgpack
+    return _msgpack or None
+
+
+def accepts(header, value):
+    """Whether an Accept or Accept-Encoding header lists value without q=0"""
+    for item in header.split(','):
+        name, *params = item.split(';')
+        if name.strip().lower() != value:
+            continue
+        for param in params:
+            key, _, quality = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    return float(quality) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def encode(payload, accept='', accept_encoding='', gzip_min_bytes=1024, gzip_level=1):
+    """(body, headers) for payload, negotiated from the request's Accept headers
+
+    gzip_min_bytes below 0 turns compression off.
+    """
+    wants_msgpack = accept and (accepts(accept, MSGPACK) or accepts(accept, 'application/x-msgpack'))
+    msgpack = load_msgpack() if wants_msgpack else None
+    if msgpack is not None:
+        body = msgpack.packb(payload, use_bin_type=True)
+        headers = {"Content-Type": MSGPACK}
+    else:
+        body = dumps(payload)
+        headers = {"Content-Type": JSON}
+    headers["Vary"] = "Accept, Accept-Encoding"
+    if 0 <= gzip_min_bytes <= len(body) and accept_encoding and accepts(accept_encoding, 'gzip'):
+        body = gzip.compress(body, compresslevel=gzip_level)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+class ResultView:
+    """Per-request shape of analysis results
+
+    fields is None (everything) or the result keys to keep; ALWAYS_KEPT
+    keys survive any selection. score_format
+    is one of SCORE_FORMATS; None adds no scores.
+    """
+
+    def __init__(self, fields=None, score_format=None):
+        self.fields = frozenset(fields) | ALWAYS_KEPT if fields is not None else None
+        self.score_format = score_format
+
+    def wants(self, field):
+        return self.fields is None or field in self.fields
+
+    def add_scores(self, results, matrix, layout):
+        """Attach each row of the (N, labels) score matrix in the requested format"""
+        if self.score_format == 'labeled' and self.wants('all_scores'):
+            for result, scores in zip(results, layout.all_scores(matrix)):
+                result["all_scores"] = scores
+        elif self.score_format == 'array' and self.wants('scores'):
+            for result, scores in zip(results, np.round(matrix.astype(np.float64), ARRAY_PRECISION).tolist()):
+                result["scores"] = scores
+
+    def select(self, result):
+        if self.fields is None:
+            return result
+        return {key: value for key, value in result.items() if key in self.fields}
+
+
+def parse_view_options(data, default_score_format=None):
+    """(fields, score_format) for a ResultView from a request body or query string
+
+    Query strings pass fields comma-separated. Raises ValueError, also for a
+    field name outside RESULT_FIELDS.
+    """
+    fields = data.get('fields')
+    if isinstance(fields, str):
+        fields = [field for field in fields.split(',') if field]
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+        raise ValueError("'fields' must be an array of field names")
+    unknown = sorted(set(fields or ()) - RESULT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field(s) in 'fields': {', '.join(unknown)}")
+    score_format = data.get('score_format', default_score_format)
+    if score_format is not None and score_format not in SCORE_FORMATS:
+        raise ValueError(f"'score_format' must be one of: {', '.join(SCORE_FORMATS)}")
+    return fields, score_format
@@ -0,0 +1,572 @@
+"""
+Similarity search over analyzed entries ("entries that felt like this one").
+
+Every analyzed entry that carries a user_id has its 28-label score vector
+appended to an on-disk float32 matrix and, optionally, a pooled text
+embedding from the local model to a second one. Vectors are L2-normalized
+on the way in, so cosine similarity is a dot product. Rows are never
+rewritten: re-analyzing an entry under the same entry_id appends a row
+that supersedes the old one; an entry without one is always new.
+Per-row metadata (user, entry id, title, timestamp, primary emotion)
+lives in an NDJSON file, one line per row, and is only read back for
+the rows a query returns. The matrices are
+memory-mapped, so a query pages in just the rows it scores.
+
+Queries are vectorized brute force over the user's rows. When a search
+covers at least `ann_min_rows` rows, an inverted-file index (spherical
+k-means centroids, every row filed under its nearest one) answers it
+approximately by scoring only the rows filed under the `ann_probes`
+centroids closest to the query. It is built in the background the first
+time it is needed and never rebuilt for appends: new rows are scored
+exactly until enough have arrived to file them under the existing
+centroids in bulk.
+
+Appends hold an exclusive flock on the metadata file, so server processes
+can share one index directory; each catches up on the rows the others
+appended before it searches.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+SPACES = ('scores', 'embedding')
+
+# Longest title kept in the row metadata
+MAX_TITLE_CHARS = 200
+
+# Rows appended since the inverted file was built are filed into it once they
+# reach this share of the filed rows; it is retrained once the index has grown
+# by ANN_RETRAIN_GROWTH times
+ANN_FILE_FRACTION = 0.1
+ANN_RETRAIN_GROWTH = 4
+
+# Rows scored per block when assigning rows to centroids (bounds the temporary matrix)
+ASSIGN_BLOCK_ROWS = 16384
+
+
+def normalize(vectors):
+    """Rows scaled to unit length; all-zero rows stay zero"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class GrowableArray:
+    """Append-only 1-D array; views taken earlier stay valid as it grows"""
+
+    def __init__(self, dtype, capacity=16):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        end = self._size + len(values)
+        if end > len(self._data):
+            grown = np.empty(max(end, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:end] = values
+        self._size = end
+
+    def view(self):
+        return self._data[:self._size]
+
+    def __len__(self):
+        return self._size
+
+
+def assign(matrix, centroids, start=0, stop=None):
+    """Index of the nearest centroid for rows start:stop of matrix"""
+    stop = len(matrix) if stop is None else stop
+    assignments = np.empty(stop - start, dtype=np.int32)
+    for block in range(start, stop, ASSIGN_BLOCK_ROWS):
+        end = min(block + ASSIGN_BLOCK_ROWS, stop)
+        assignments[block - start:end - start] = np.argmax(np.asarray(matrix[block:end]) @ centroids.T, axis=1)
+    return assignments
+
+
+class InvertedFile:
+    """Rows grouped by nearest centroid, for approximate search
+
+    Covers the first `filed_rows` rows of the matrix it was built on.
+    """
+
+    def __init__(self, centroids, assignments, trained_rows):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.trained_rows = trained_rows
+        self.filed_rows = len(assignments)
+        self.order = np.argsort(assignments, kind='stable').astype(np.int32)
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(len(centroids) + 1))
+
+    @classmethod
+    def train(cls, matrix, lists=None, iterations=8, sample_per_list=64, seed=0):
+        """Spherical k-means on a sample of the rows, then every row filed under its nearest centroid"""
+        rows = len(matrix)
+        lists = lists or int(min(4096, max(1, np.sqrt(rows))))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(rows, min(rows, lists * sample_per_list), replace=False))
+        points = np.asarray(matrix[sample])
+        centroids = points[rng.choice(len(points), min(lists, len(points)), replace=False)].copy()
+        for _ in range(iterations):
+            nearest = np.argmax(points @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, points)
+            counts = np.bincount(nearest, minlength=len(centroids))
+            # A centroid nothing was assigned to keeps its place
+            filled = counts > 0
+            centroids[filled] = normalize(sums[filled])
+        return cls(centroids, assign(matrix, centroids), rows)
+
+    def extended(self, matrix, rows):
+        """A copy with rows filed_rows:rows filed under the existing centroids"""
+        assignments = np.concatenate([self.assignments, assign(matrix, self.centroids, self.filed_rows, rows)])
+        return InvertedFile(self.centroids, assignments, self.trained_rows)
+
+    def candidates(self, query, probes):
+        """Filed rows under the `probes` centroids nearest to query, sorted"""
+        probes = min(probes, len(self.centroids))
+        nearest = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+        rows = np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in nearest])
+        rows.sort()
+        return rows
+
+    def describe(self):
+        return {"lists": len(self.centroids), "filed_rows": self.filed_rows, "trained_rows": self.trained_rows}
+
+
+class VectorIndex:
+    """Append-only float32 vectors on disk with per-user cosine similarity search
+
+    path is a file prefix: <path>.f32 holds the vectors, <path>.ndjson one
+    metadata line per row and <path>.json the dimension and vector source.
+    """
+
+    def __init__(self, path, dim, source, ann_min_rows=100000, ann_probes=8):
+        self.path = path
+        self.dim = dim
+        self.source = source
+        self.ann_min_rows = ann_min_rows
+        self.ann_probes = ann_probes
+        self._vectors_path = path + '.f32'
+        self._meta_path = path + '.ndjson'
+        self._check_info(path + '.json')
+        for file_path in (self._vectors_path, self._meta_path):
+            open(file_path, 'ab').close()
+
+        self._lock = threading.RLock()
+        self._count = 0
+        self._meta_end = 0
+        self._offsets = GrowableArray(np.int64, 1024)
+        self._users = GrowableArray(np.int32, 1024)
+        self._user_codes = {}
+        self._user_rows = []
+        self._entries = {}
+        # Per user code, the rows a later row for the same entry_id replaced
+        self._superseded = {}
+        self._matrix = None
+        self._ann = None
+        self._ann_building = False
+        self._stats = {"appended": 0, "searches": 0, "approximate_searches": 0}
+        with self._lock:
+            self._catch_up()
+
+    def _check_info(self, info_path):
+        """Record the dimension and source on first use; refuse files written for another model"""
+        if os.path.exists(info_path):
+            with open(info_path) as f:
+                info = json.load(f)
+            if info["dim"] != self.dim or info["source"] != self.source:
+                raise ValueError(
+                    f"{self.path} holds {info['dim']}-dim vectors from {info['source']}, "
+                    f"not {self.dim}-dim vectors from {self.source}; move it aside to start a new index"
+                )
+            return
+        with open(info_path, 'w') as f:
+            json.dump({"dim": self.dim, "source": self.source}, f)
+
+    def _catch_up(self):
+        """Load metadata lines appended since the last look, by this process or another"""
+        size = os.path.getsize(self._meta_path)
+        if size <= self._meta_end:
+            return
+        with open(self._meta_path, 'rb') as f:
+            f.seek(self._meta_end)
+            data = f.read(size - self._meta_end)
+        # A line without its newline is an append in progress (or a crashed one)
+        data = data[:data.rfind(b'\n') + 1]
+        loads = orjson.loads if orjson is not None else json.loads
+        offsets = []
+        metas = []
+        offset = self._meta_end
+        for line in data.splitlines(keepends=True):
+            offsets.append(offset)
+            metas.append(loads(line))
+            offset += len(line)
+        self._add_rows(offsets, metas)
+        self._meta_end = offset
+
+    def _add_rows(self, offsets, metas):
+        codes = []
+        user_rows = {}
+        for row, meta in enumerate(metas, start=self._count):
+            user_id = meta["user_id"]
+            code = self._user_codes.get(user_id)
+            if code is None:
+                code = self._user_codes[user_id] = len(self._user_rows)
+                self._user_rows.append(GrowableArray(np.int32))
+            codes.append(code)
+            user_rows.setdefault(code, []).append(row)
+            entry_id = meta.get("entry_id")
+            if entry_id is not None:
+                previous = self._entries.get((user_id, entry_id))
+                if previous is not None:
+                    self._superseded.setdefault(code, set()).add(previous)
+                self._entries[(user_id, entry_id)] = row
+        self._offsets.extend(offsets)
+        self._users.extend(codes)
+        for code, rows in user_rows.items():
+            self._user_rows[code].extend(rows)
+        self._count += len(metas)
+
+    def _matrix_view(self):
+        if self._count == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        if self._matrix is None or len(self._matrix) != self._count:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(self._count, self.dim))
+        return self._matrix
+
+    def append(self, vectors, metas):
+        """Append one normalized vector and one metadata dict per row
+
+        metas carry user_id and optionally entry_id, title, timestamp and
+        primary_emotion.
+        """
+        if not metas:
+            return
+        vectors = normalize(np.asarray(vectors, dtype=np.float32).reshape(len(metas), self.dim))
+        lines = b"".join(json.dumps(meta, separators=(',', ':')).encode('utf-8') + b"\n" for meta in metas)
+        with self._lock:
+            with open(self._meta_path, 'r+b') as meta_file, open(self._vectors_path, 'r+b') as vector_file:
+                fcntl.flock(meta_file, fcntl.LOCK_EX)
+                try:
+                    self._catch_up()
+                    # Drop whatever a crashed append left past the last complete row
+                    vector_file.truncate(self._count * self.dim * 4)
+                    vector_file.seek(0, os.SEEK_END)
+                    vector_file.write(vectors.tobytes())
+                    vector_file.flush()
+                    meta_file.truncate(self._meta_end)
+                    meta_file.seek(self._meta_end)
+                    meta_file.write(lines)
+                    meta_file.flush()
+                    self._catch_up()
+                finally:
+                    fcntl.flock(meta_file, fcntl.LOCK_UN)
+            self._stats["appended"] += len(metas)
+        self._maintain_ann()
+
+    def lookup(self, user_id, entry_id):
+        """Row of the latest vector stored for a user's entry, or None"""
+        with self._lock:
+            self._catch_up()
+            return self._entries.get((user_id, entry_id))
+
+    def vector(self, row):
+        with self._lock:
+            return np.array(self._matrix_view()[row])
+
+    def metadata(self, rows):
+        """Metadata dicts for rows, read from the NDJSON file"""
+        with self._lock:
+            offsets = self._offsets.view()[rows]
+        metas = []
+        with open(self._meta_path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                metas.append(json.loads(f.readline()))
+        return metas
+
+    def search(self, query, k=10, user_id=None, exclude=None, approximate=None):
+        """(rows, similarities, approximate) of the k rows most similar to query
+
+        user_id limits the search to one user's rows (None searches all).
+        exclude is a row to leave out, such as the query entry itself.
+        approximate: None uses the inverted file for searches over at least
+        ann_min_rows rows once it is built, True whenever it is built, False
+        never. The third value says whether it was used.
+        """
+        query = normalize(np.asarray(query, dtype=np.float32).reshape(1, self.dim))[0]
+        with self._lock:
+            self._catch_up()
+            matrix = self._matrix_view()
+            if user_id is None:
+                code, rows = None, None
+            else:
+                code = self._user_codes.get(user_id)
+                if code is None:
+                    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), False
+                rows = self._user_rows[code].view()
+            users = self._users.view()
+            if code is None:
+                skip = set().union(*self._superseded.values())
+            else:
+                skip = set(self._superseded.get(code, ()))
+            ann = self._ann
+            self._stats["searches"] += 1
+        if exclude is not None:
+            skip.add(exclude)
+        scope = len(matrix) if rows is None else len(rows)
+
+        wants_ann = approximate is True or (approximate is None and scope >= self.ann_min_rows)
+        if wants_ann and ann is None and len(matrix) >= self.ann_min_rows:
+            self._start_ann_build()
+        if wants_ann and ann is not None:
+            candidates = np.concatenate([
+                ann.candidates(query, self.ann_probes),
+                np.arange(ann.filed_rows, len(matrix), dtype=np.int32)
+            ])
+            if code is not None:
+                candidates = candidates[users[candidates] == code]
+            found = top_k(matrix, candidates, query, k, skip)
+            # Too few of the user's rows near the probed centroids: answer exactly instead
+            if len(found[0]) >= min(k, scope - len(skip)):
+                with self._lock:
+                    self._stats["approximate_searches"] += 1
+                return found + (True,)
+        return top_k(matrix, rows, query, k, skip) + (False,)
+
+    def _start_ann_build(self):
+        with self._lock:
+            if self._ann_building:
+                return
+            self._ann_building = True
+        threading.Thread(target=self._build_ann, name="similarity-ann-build", daemon=True).start()
+
+    def _build_ann(self):
+        try:
+            started = time.perf_counter()
+            with self._lock:
+                matrix = self._matrix_view()
+            ann = InvertedFile.train(matrix)
+            with self._lock:
+                self._ann = ann
+            logger.info(f"Built an inverted file over {ann.filed_rows} rows of {self.path} "
+                        f"in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            logger.error(f"Building the inverted file for {self.path} failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._ann_building = False
+
+    def build_ann(self):
+        """Build the inverted file now, in this thread"""
+        with self._lock:
+            self._ann_building = True
+        self._build_ann()
+
+    def _maintain_ann(self):
+        """File newly appended rows into the inverted file in bulk, or retrain it once the index has outgrown it"""
+        with self._lock:
+            ann = self._ann
+            if ann is None or self._ann_building:
+                return
+            matrix = self._matrix_view()
+            if len(matrix) >= ann.trained_rows * ANN_RETRAIN_GROWTH:
+                self._ann_building = True
+                retrain = True
+            elif len(matrix) - ann.filed_rows >= max(1, ann.filed_rows * ANN_FILE_FRACTION):
+                retrain = False
+            else:
+                return
+        if retrain:
+            threading.Thread(target=self._build_ann, name="similarity-ann-build", daemon=True).start()
+            return
+        extended = ann.extended(matrix, len(matrix))
+        with self._lock:
+            if self._ann is ann:
+                self._ann = extended
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows": self._count,
+                "users": len(self._user_codes),
+                "dim": self.dim,
+                "source": self.source,
+                "ann": self._ann.describe() if self._ann is not None else None,
+                **self._stats
+            }
+
+
+def top_k(matrix, rows, query, k, skip=()):
+    """(rows, similarities) of the k best-scoring rows, best first
+
+    rows is an array of row indices to score, or None for all of them.
+    Rows in skip are never returned.
+    """
+    if rows is None:
+        similarities = np.asarray(matrix) @ query
+        rows = np.arange(len(similarities))
+    else:
+        similarities = np.asarray(matrix[rows]) @ query
+    if skip:
+        similarities[np.isin(rows, np.fromiter(skip, dtype=np.int64, count=len(skip)))] = -np.inf
+    k = min(k, len(similarities))
+    if k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    best = np.argpartition(-similarities, k - 1)[:k]
+    best = best[np.argsort(-similarities[best], kind='stable')]
+    best = best[np.isfinite(similarities[best])]
+    return np.asarray(rows)[best].astype(np.int64), similarities[best]
+
+
+class SimilarityStore:
+    """Score and (optionally) embedding indexes of analyzed entries
+
+    Appends go through a background thread, as in analytics.MoodStore, so
+    requests never wait on disk or on the embedding model. embed, when
+    given, maps a list of texts to an (N, embedding_dim) array.
+    """
+
+    def __init__(self, path, labels, embed=None, embedding_dim=None, embedding_source=None,
+                 ann_min_rows=100000, ann_probes=8, max_write_batch=256):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.labels = list(labels)
+        self.embed = embed
+        self.max_write_batch = max_write_batch
+        self.indexes = {
+            "scores": VectorIndex(os.path.join(path, 'scores'), len(self.labels), "scores",
+                                  ann_min_rows=ann_min_rows, ann_probes=ann_probes)
+        }
+        if embed is not None:
+            self.indexes["embedding"] = VectorIndex(os.path.join(path, 'embedding'), embedding_dim, embedding_source,
+                                                    ann_min_rows=ann_min_rows, ann_probes=ann_probes)
+        self._lock = threading.Lock()
+        self._stats = {"recorded": 0, "write_failures": 0, "embedding_failures": 0}
+        self._queue = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="similarity-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, rows):
+        """Queue (user_id, timestamp, entry_id, title, full_text, scores, primary_index) rows for indexing
+
+        A row for an entry_id already indexed supersedes the earlier one.
+        """
+        if self._closed:
+            raise RuntimeError("SimilarityStore is closed")
+        for row in rows:
+            self._queue.put(row)
+
+    def _write_loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            stopping = False
+            while len(batch) < self.max_write_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._write(batch)
+            except Exception as e:
+                # Anything escaping would end the writer and leave flush() and close() waiting forever
+                logger.warning(f"Similarity index write of {len(batch)} entries failed: {str(e)}")
+                with self._lock:
+                    self._stats["write_failures"] += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stopping:
+                break
+        self._queue.task_done()
+
+    def _write(self, rows):
+        metas = []
+        for user_id, timestamp, entry_id, title, _, _, primary in rows:
+            meta = {"user_id": user_id, "timestamp": timestamp.isoformat(), "primary_emotion": self.labels[primary]}
+            if entry_id is not None:
+                meta["entry_id"] = entry_id
+            if isinstance(title, str):
+                meta["title"] = title[:MAX_TITLE_CHARS]
+            metas.append(meta)
+        try:
+            self.indexes["scores"].append([row[5] for row in rows], metas)
+            with self._lock:
+                self._stats["recorded"] += len(rows)
+        except Exception as e:
+            # The embedding index is still worth a try
+            logger.warning(f"Similarity index write of {len(rows)} entries failed: {str(e)}")
+            with self._lock:
+                self._stats["write_failures"] += len(rows)
+        if "embedding" not in self.indexes:
+            return
+        try:
+            self.indexes["embedding"].append(self.embed([row[4] for row in rows]), metas)
+        except Exception as e:
+            logger.warning(f"Embedding {len(rows)} entries for the similarity index failed: {str(e)}")
+            with self._lock:
+                self._stats["embedding_failures"] += len(rows)
+
+    def flush(self):
+        """Wait until every queued entry has been indexed"""
+        self._queue.join()
+
+    def search(self, user_id, space='scores', query=None, entry_id=None, k=10, approximate=None):
+        """The user's k entries most similar to a query vector or to one of their stored entries
+
+        Returns {results, approximate}, or None when entry_id isn't indexed.
+        Each result is the entry's metadata plus its cosine `similarity`.
+        """
+        index = self.indexes[space]
+        exclude = None
+        if entry_id is not None:
+            exclude = index.lookup(user_id, entry_id)
+            if exclude is None:
+                return None
+            query = index.vector(exclude)
+        rows, similarities, approximate = index.search(query, k, user_id, exclude, approximate)
+        results = []
+        for meta, similarity in zip(index.metadata(rows), similarities.tolist()):
+            del meta["user_id"]
+            meta["similarity"] = round(similarity, 4)
+            results.append(meta)
+        return {"results": results, "approximate": approximate}
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["path"] = self.path
+        stats["indexes"] = {space: index.stats() for space, index in self.indexes.items()}
+        return stats
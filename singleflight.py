@@ -0,0 +1,255 @@
+"""
+Single-flight deduplication of identical in-flight model calls.
+
+Callers that ask for the same key (the normalized text hash) while a call
+for it is already running wait for that call and share its result instead
+of starting their own. SingleFlight covers threads in one worker and
+AsyncSingleFlight covers coroutines in the ASGI app.
+
+SingleFlight can also coordinate worker processes on the same host through
+a lock file: the process computing a key holds a one-byte POSIX record lock
+at an offset derived from the key, and other processes wait for that lock
+and then re-check the shared cache (CACHE_DB_PATH) before calling the model.
+
+Only the upstream's answer is shared. When the leader fails for a reason
+of its own (its deadline ran out, admission control refused it, the call
+rate limit would have kept it waiting too long), the waiting callers get
+LeaderAbandoned instead and one of them takes over as the new leader.
+"""
+
+import asyncio
+import deadlines
+import fcntl
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from admission import AdmissionRejected, RateLimited
+
+logger = logging.getLogger(__name__)
+
+# Record locks live at key-derived offsets in this range of the lock file
+LOCK_OFFSETS = 2 ** 31 - 1
+
+# Leader failures that say nothing about the text, only about the leader's request
+CALLER_ERRORS = (deadlines.DeadlineExceeded, AdmissionRejected, RateLimited)
+
+
+class LeaderAbandoned(Exception):
+    """The call being waited on failed for its leader's own reasons; retry as a new leader"""
+
+    def __init__(self):
+        super().__init__("The shared call was abandoned by its caller")
+
+
+def shared_error(error):
+    """What followers get when the leader fails with error"""
+    return LeaderAbandoned() if isinstance(error, CALLER_ERRORS) else error
+
+
+class FlightStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "leaders": 0,
+            "collapsed": 0,
+            "cross_process_waits": 0,
+            "cross_process_collapsed": 0,
+            "abandoned": 0
+        }
+
+    def add(self, name, count=1):
+        with self._lock:
+            self._stats[name] += count
+
+    def snapshot(self, in_flight):
+        with self._lock:
+            stats = dict(self._stats)
+        calls = stats["leaders"] + stats["collapsed"]
+        stats["in_flight"] = in_flight
+        stats["collapse_rate"] = round(
+            (stats["collapsed"] + stats["cross_process_collapsed"]) / calls, 4
+        ) if calls else 0.0
+        return stats
+
+
+class SingleFlight:
+    """Thread-level single-flight table, optionally extended across processes"""
+
+    def __init__(self, lock_path=None, lock_timeout=30.0):
+        self.lock_path = lock_path
+        self.lock_timeout = lock_timeout
+        self.stats = FlightStats()
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._lock_fd = None
+        if lock_path:
+            self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def join(self, key):
+        """Return (future, leader). The leader must call finish() for the key."""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.stats.add("collapsed")
+                return future, False
+            future = Future()
+            self._flights[key] = future
+        self.stats.add("leaders")
+        return future, True
+
+    def finish(self, key, result=None, error=None):
+        with self._lock:
+            future = self._flights.pop(key)
+        if error is not None:
+            error = shared_error(error)
+            if isinstance(error, LeaderAbandoned):
+                self.stats.add("abandoned")
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, recheck=None):
+        """Run fn() once for all concurrent callers of key and return its result
+
+        With a lock file, recheck() is called after waiting for another
+        process working on the same key; a non-None result is used as is.
+        """
+        while True:
+            future, leader = self.join(key)
+            if leader:
+                break
+            try:
+                return deadlines.wait(future)
+            except LeaderAbandoned:
+                # Join again; the first caller back becomes the new leader
+                continue
+        try:
+            result = self._run_leader(key, fn, recheck)
+        except Exception as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result)
+        return result
+
+    def _run_leader(self, key, fn, recheck):
+        if self._lock_fd is None:
+            return fn()
+        offset = int(key[:16], 16) % LOCK_OFFSETS
+        waited = self._lock_range(offset)
+        try:
+            if waited and recheck is not None:
+                result = recheck()
+                if result is not None:
+                    self.stats.add("cross_process_collapsed")
+                    return result
+            return fn()
+        finally:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, offset)
+
+    def _lock_range(self, offset):
+        """Take the record lock at offset; returns True if another process held it"""
+        try:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+            return False
+        except OSError:
+            pass
+        self.stats.add("cross_process_waits")
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.001
+        while True:
+            try:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+                return True
+            except OSError:
+                # The caller's own deadline ends the wait first
+                left = deadlines.remaining()
+                if left is not None and left <= 0:
+                    raise deadlines.DeadlineExceeded()
+                if time.monotonic() > deadline:
+                    # Give up on coordinating and take the lock outright
+                    logger.warning("Timed out waiting for another worker's in-flight call")
+                    fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, offset)
+                    return True
+                time.sleep(delay if left is None else min(delay, left))
+                delay = min(delay * 2, 0.05)
+
+    def describe(self):
+        with self._lock:
+            in_flight = len(self._flights)
+        stats = self.stats.snapshot(in_flight)
+        stats["lock_path"] = self.lock_path
+        return stats
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight (in-process only)
+
+    The shared call runs as its own task, so a caller that is cancelled
+    (e.g. its client disconnected) doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self.stats = FlightStats()
+        self._flights = {}
+
+    def join(self, key):
+        """Return (future, leader) for batch callers; the leader must call finish()"""
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.stats.add("collapsed")
+            return flight, False
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = future
+        self.stats.add("leaders")
+        return future, True
+
+    def finish(self, key, result=None, error=None):
+        future = self._flights.pop(key)
+        if error is not None:
+            error = shared_error(error)
+            if isinstance(error, LeaderAbandoned):
+                self.stats.add("abandoned")
+            future.set_exception(error)
+            future.exception()
+        else:
+            future.set_result(result)
+
+    async def do(self, key, fn):
+        """Await fn() once for all concurrent callers of key
+
+        The call runs in the context of the caller that started it, so it
+        carries that caller's deadline and client; when it fails for those
+        reasons the other callers start it again in their own.
+        """
+        while True:
+            task = self._flights.get(key)
+            leader = task is None
+            if leader:
+                self.stats.add("leaders")
+                task = asyncio.ensure_future(fn())
+                self._flights[key] = task
+                task.add_done_callback(lambda done: self._finish(key, done))
+            else:
+                self.stats.add("collapsed")
+            try:
+                return await deadlines.wait_async(asyncio.shield(task))
+            except CALLER_ERRORS:
+                if leader or not task.done() or task.cancelled() or not isinstance(task.exception(), CALLER_ERRORS):
+                    # Our own deadline, not the leader's
+                    raise
+                if self._flights.get(key) is task:
+                    del self._flights[key]
+                    self.stats.add("abandoned")
+
+    def _finish(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Retrieve it so a failure nobody awaited isn't logged as unhandled
+            task.exception()
+
+    def describe(self):
+        return self.stats.snapshot(len(self._flights))
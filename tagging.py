@@ -0,0 +1,141 @@
+"""
+Content tag extraction for journal entries.
+
+Words are taken as whitespace-separated tokens with every non-alphanumeric
+character removed (so "don't" -> "dont"), lowercased, longer than three
+characters and not stopwords. Tags are the most frequent words, or with an
+IDF table the words that are frequent here but rare across the corpus.
+
+Build an IDF table from an NDJSON export of entries with:
+    python -m tagging entries.ndjson idf.json
+"""
+
+import argparse
+import json
+import math
+import re
+from collections import Counter
+from heapq import nlargest
+
+STOPWORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'from', 'as', 'is', 'was', 'were', 'been', 'be',
+    'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'i', 'you', 'he', 'she', 'it', 'we', 'they'
+})
+
+MIN_WORD_LENGTH = 4
+
+# Separates texts in a batch; it is whitespace, so the strip below keeps it
+_DOCUMENT_SEPARATOR = '\x1e'
+_NON_WORD = re.compile(r'[^\w\s]+|_+')
+# ASCII text (the common case) is stripped with one str.translate call instead
+_ASCII_NON_WORD = str.maketrans('', '', ''.join(
+    c for c in map(chr, range(128)) if not c.isalnum() and not c.isspace()
+))
+
+
+def strip_non_word(text):
+    """Remove every character that is neither alphanumeric nor whitespace"""
+    if text.isascii():
+        return text.translate(_ASCII_NON_WORD)
+    return _NON_WORD.sub('', text)
+
+
+def tokenize(text):
+    """Candidate tag words of a text, in order of appearance"""
+    return [
+        word for word in strip_non_word(text.lower()).split()
+        if len(word) >= MIN_WORD_LENGTH and word not in STOPWORDS
+    ]
+
+
+def iter_tokenized(texts):
+    """tokenize() for many texts, with one strip pass over all of them
+
+    Yields one word list per text; lists are produced lazily so only one is
+    alive at a time.
+    """
+    if not texts:
+        return
+    joined = _DOCUMENT_SEPARATOR.join(text.replace(_DOCUMENT_SEPARATOR, ' ') for text in texts)
+    for document in strip_non_word(joined.lower()).split(_DOCUMENT_SEPARATOR):
+        yield [word for word in document.split() if len(word) >= MIN_WORD_LENGTH and word not in STOPWORDS]
+
+
+def build_idf(texts):
+    """Smoothed inverse document frequencies {word: idf} over a corpus of texts
+
+    Returns (documents, idf) so unseen words can be weighted as if df=0.
+    """
+    document_frequency = Counter()
+    documents = 0
+    for words in iter_tokenized(texts):
+        document_frequency.update(set(words))
+        documents += 1
+    idf = {
+        word: math.log((1 + documents) / (1 + df)) + 1.0
+        for word, df in document_frequency.items()
+    }
+    return documents, idf
+
+
+def save_idf(path, documents, idf):
+    with open(path, 'w') as f:
+        json.dump({"documents": documents, "idf": idf}, f)
+
+
+def load_idf(path):
+    with open(path) as f:
+        data = json.load(f)
+    return data["documents"], data["idf"]
+
+
+class TagExtractor:
+    """Top-k content tags by term frequency, optionally weighted by corpus IDF"""
+
+    def __init__(self, idf=None, documents=0):
+        self.idf = idf
+        # Words missing from the table are treated as never seen in the corpus
+        self.default_idf = math.log(1 + documents) + 1.0
+
+    def _top(self, words, k):
+        counts = Counter(words)
+        if self.idf is None:
+            # Counter.most_common is a bounded heap selection, stable on ties
+            return [word for word, _ in counts.most_common(k)]
+        idf = self.idf
+        default_idf = self.default_idf
+        weighted = nlargest(k, counts.items(), key=lambda item: item[1] * idf.get(item[0], default_idf))
+        return [word for word, _ in weighted]
+
+    def extract(self, text, k=3):
+        return self._top(tokenize(text), k)
+
+    def extract_batch(self, texts, k=3):
+        """One tag list per text"""
+        return [self._top(words, k) for words in iter_tokenized(texts)]
+
+    def describe(self):
+        return {"idf_terms": len(self.idf) if self.idf is not None else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a tag IDF table from an NDJSON export of entries")
+    parser.add_argument('entries', help="NDJSON file with one { title, content } per line")
+    parser.add_argument('output', help="JSON file to write, for TAG_IDF_PATH")
+    args = parser.parse_args()
+
+    texts = []
+    with open(args.entries) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                texts.append(f"{entry.get('title', 'Untitled')}. {entry.get('content', '')}")
+    documents, idf = build_idf(texts)
+    save_idf(args.output, documents, idf)
+    print(f"Wrote IDF for {len(idf)} words from {documents} entries to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,32 @@
 """
 Comprehensive Emotion Detection Test Suite
 Tests all 28 emotions supported by SamLowe/roberta-base-go_emotions model
+
+Cases run concurrently against a deployed service, or in-process against
+application.py with whatever backend its environment configures. --batch
+sends the whole suite in one /batch-analyze call. --min-accuracy makes the
+exit code usable as a pre-deploy gate.
+
+Usage:
+    python test_all_emotions.py
+    python test_all_emotions.py --url http://localhost:5001 --workers 8
+    python test_all_emotions.py --in-process --batch --min-accuracy 80
 """
 
-import requests
+import argparse
 import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-# ML Service endpoint
-ML_SERVICE_URL = "https://namanj11-eunoia-ml-service.hf.space/analyze"
+import requests
+
+# ML Service base URL
+ML_SERVICE_BASE_URL = os.environ.get('ML_SERVICE_URL', "https://namanj11-eunoia-ml-service.hf.space")
+ML_SERVICE_URL = f"{ML_SERVICE_BASE_URL}/analyze"
 
 # Test cases for all 28 emotions
 EMOTION_TEST_CASES = {
@@ -182,94 +200,185 @@ EMOTION_TEST_CASES = {
 }
 
 
-def test_emotion(emotion_name, test_case):
+class HTTPTransport:
+    """POSTs to a running service, one pooled session per worker thread"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path, payload):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.post(self.base_url + path, json=payload, timeout=self.timeout)
+        return response.status_code, response.json()
+
+    def describe(self):
+        return self.base_url
+
+
+class InProcessTransport:
+    """Calls application.py directly through Flask's test client"""
+
+    def __init__(self):
+        import application
+        self.app = application.app
+        self.backend = application.inference_backend.describe()["backend"]
+
+    def post(self, path, payload):
+        response = self.app.test_client().post(path, json=payload)
+        return response.status_code, response.get_json()
+
+    def describe(self):
+        return f"in-process ({self.backend} backend)"
+
+
+def check_result(emotion_name, test_case, data, latency_ms, top_k=3):
+    detected = data.get("primary_emotion")
+    confidence = data.get("emotion_confidence", 0)
+    expected = test_case["expected"]
+    top_emotions = [e["emotion"] for e in data.get("detected_emotions", [])]
+    
+    # Check if detection matches expected
+    is_correct = detected == expected
+    status = "✅ PASS" if is_correct else "❌ FAIL"
+    
+    return {
+        "emotion": emotion_name,
+        "expected": expected,
+        "detected": detected,
+        "confidence": confidence,
+        "is_correct": is_correct,
+        "in_top_k": expected in top_emotions[:top_k],
+        "status": status,
+        "latency_ms": latency_ms,
+        "all_emotions": data.get("detected_emotions", [])
+    }
+
+
+def error_result(emotion_name, error, latency_ms=None):
+    return {
+        "emotion": emotion_name,
+        "status": "❌ ERROR",
+        "error": error,
+        "latency_ms": latency_ms
+    }
+
+
+def test_emotion(emotion_name, test_case, transport=None, top_k=3):
+    transport = transport or HTTPTransport(ML_SERVICE_BASE_URL)
+    start = time.perf_counter()
     try:
-        response = requests.post(
-            ML_SERVICE_URL,
-            json={
-                "title": test_case["title"],
-                "content": test_case["content"]
-            },
-            timeout=30
-        )
+        status_code, result = transport.post('/analyze', {
+            "title": test_case["title"],
+            "content": test_case["content"]
+        })
+        latency_ms = round((time.perf_counter() - start) * 1000, 1)
         
-        if response.status_code == 200:
-            result = response.json()
-            if result.get("success"):
-                data = result.get("data", {})
-                detected = data.get("primary_emotion")
-                confidence = data.get("emotion_confidence", 0)
-                expected = test_case["expected"]
-                
-                # Check if detection matches expected
-                is_correct = detected == expected
-                status = "✅ PASS" if is_correct else "❌ FAIL"
-                
-                return {
-                    "emotion": emotion_name,
-                    "expected": expected,
-                    "detected": detected,
-                    "confidence": confidence,
-                    "is_correct": is_correct,
-                    "status": status,
-                    "all_emotions": data.get("detected_emotions", [])
-                }
-            else:
-                return {
-                    "emotion": emotion_name,
-                    "status": "❌ ERROR",
-                    "error": result.get("error", "Unknown error")
-                }
-        else:
-            return {
-                "emotion": emotion_name,
-                "status": "❌ ERROR",
-                "error": f"HTTP {response.status_code}"
-            }
+        if status_code == 200 and result.get("success"):
+            return check_result(emotion_name, test_case, result.get("data", {}), latency_ms, top_k)
+        if status_code == 200:
+            return error_result(emotion_name, result.get("error", "Unknown error"), latency_ms)
+        return error_result(emotion_name, f"HTTP {status_code}", latency_ms)
             
     except Exception as e:
-        return {
-            "emotion": emotion_name,
-            "status": "❌ ERROR",
-            "error": str(e)
-        }
+        return error_result(emotion_name, str(e))
+
+
+def test_batch(test_cases, transport, top_k=3):
+    """Send every case in one /batch-analyze call; each result carries the call's latency"""
+    names = list(test_cases)
+    start = time.perf_counter()
+    try:
+        status_code, result = transport.post('/batch-analyze', {
+            "entries": [{"title": test_cases[name]["title"], "content": test_cases[name]["content"]} for name in names],
+            "batch_size": len(names)
+        })
+    except Exception as e:
+        return [error_result(name, str(e)) for name in names]
+    latency_ms = round((time.perf_counter() - start) * 1000, 1)
+    
+    if status_code != 200 or not result.get("success"):
+        error = result.get("error", "Unknown error") if status_code == 200 else f"HTTP {status_code}"
+        return [error_result(name, error, latency_ms) for name in names]
+    
+    results = [error_result(name, "Missing from batch response", latency_ms) for name in names]
+    for data in result.get("data", []):
+        name = names[data["index"]]
+        results[data["index"]] = check_result(name, test_cases[name], data, latency_ms, top_k)
+    for error in result.get("errors", []):
+        results[error["index"]] = error_result(names[error["index"]], error["error"], latency_ms)
+    return results
+
+
+def confusion_matrix(results):
+    """{expected: {detected: count}} over the cases that got an answer"""
+    matrix = {}
+    for result in results:
+        if "error" not in result:
+            row = matrix.setdefault(result["expected"], {})
+            row[result["detected"]] = row.get(result["detected"], 0) + 1
+    return matrix
 
 
-def run_all_tests():
+def latency_summary(latencies):
+    if not latencies:
+        return None
+    latencies = sorted(latencies)
+    
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(round(p / 100.0 * (len(latencies) - 1))))]
+    return {"p50_ms": pct(50), "p95_ms": pct(95), "max_ms": latencies[-1]}
+
+
+def run_all_tests(transport=None, workers=8, batch=False, top_k=3, output_file=None):
+    transport = transport or HTTPTransport(ML_SERVICE_BASE_URL)
     print(f"Testing {len(EMOTION_TEST_CASES)} emotions")
-    print(f"ML Service: {ML_SERVICE_URL}")
+    print(f"ML Service: {transport.describe()}")
+    print(f"Mode: {'one /batch-analyze call' if batch else f'{workers} concurrent workers'}")
     print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print()
     
-    results = []
-    correct_count = 0
-    total_count = 0
-    
-    for emotion_name, test_case in EMOTION_TEST_CASES.items():
-        print(f"Testing {emotion_name.upper()}...", end=" ")
-        result = test_emotion(emotion_name, test_case)
-        results.append(result)
-        
+    start = time.perf_counter()
+    if batch:
+        results = test_batch(EMOTION_TEST_CASES, transport, top_k)
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = list(executor.map(
+                lambda item: test_emotion(item[0], item[1], transport, top_k), EMOTION_TEST_CASES.items()
+            ))
+    elapsed = time.perf_counter() - start
+    
+    for result in results:
+        latency = f" [{result['latency_ms']:.0f} ms]" if result.get("latency_ms") is not None else ""
         if result.get("is_correct"):
-            correct_count += 1
-            print(f"{result['status']} - Detected: {result['detected']} ({result['confidence']:.2%})")
+            print(f"{result['emotion'].upper()}: {result['status']} - Detected: {result['detected']} ({result['confidence']:.2%}){latency}")
         elif "error" in result:
-            print(f"{result['status']} - {result['error']}")
+            print(f"{result['emotion'].upper()}: {result['status']} - {result['error']}{latency}")
         else:
-            print(f"{result['status']} - Expected: {result['expected']}, Got: {result['detected']} ({result['confidence']:.2%})")
-        
-        total_count += 1
+            print(f"{result['emotion'].upper()}: {result['status']} - Expected: {result['expected']}, Got: {result['detected']} ({result['confidence']:.2%}){latency}")
     
     print()
     print("TEST RESULTS SUMMARY")
     
     # Calculate statistics
+    total_count = len(results)
+    correct_count = sum(1 for r in results if r.get("is_correct"))
+    top_k_count = sum(1 for r in results if r.get("in_top_k"))
     accuracy = (correct_count / total_count * 100) if total_count > 0 else 0
+    top_k_accuracy = (top_k_count / total_count * 100) if total_count > 0 else 0
+    latency = latency_summary([r["latency_ms"] for r in results if r.get("latency_ms") is not None])
     
     print(f"Total Tests: {total_count}")
     print(f"Passed: {correct_count}")
     print(f"Failed: {total_count - correct_count}")
     print(f"Accuracy: {accuracy:.1f}%")
+    print(f"Top-{top_k} Accuracy: {top_k_accuracy:.1f}%")
+    if latency:
+        print(f"Latency: p50 {latency['p50_ms']:.0f} ms, p95 {latency['p95_ms']:.0f} ms, max {latency['max_ms']:.0f} ms")
+    print(f"Wall time: {elapsed:.2f}s")
     print()
     
     # Show failed tests
@@ -304,15 +413,32 @@ def run_all_tests():
         for test in error_tests:
             print(f"  ❌ {test['emotion'].upper()}: {test['error']}")
     
+    # Misclassifications only; the full matrix is in the JSON file
+    matrix = confusion_matrix(results)
+    confusions = [(expected, detected, count) for expected, row in matrix.items()
+                  for detected, count in row.items() if detected != expected]
+    if confusions:
+        print()
+        print("CONFUSIONS (expected -> detected):")
+        for expected, detected, count in sorted(confusions):
+            print(f"  {expected} -> {detected}: {count}")
+    
     # Save results to JSON file
-    output_file = f"test_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output_file = output_file or f"test_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
     with open(output_file, 'w') as f:
         json.dump({
             "timestamp": datetime.now().isoformat(),
+            "service": transport.describe(),
+            "mode": "batch" if batch else "concurrent",
             "total_tests": total_count,
             "passed": correct_count,
             "failed": total_count - correct_count,
             "accuracy": accuracy,
+            "top_k": top_k,
+            "top_k_accuracy": top_k_accuracy,
+            "latency": latency,
+            "wall_time_seconds": round(elapsed, 3),
+            "confusion_matrix": matrix,
             "results": results
         }, f, indent=2)
     
@@ -321,5 +447,29 @@ def run_all_tests():
     return results
 
 
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', default=ML_SERVICE_BASE_URL, help="service base URL (default: $ML_SERVICE_URL)")
+    target.add_argument('--in-process', action='store_true', help="call application.py directly")
+    parser.add_argument('--workers', type=int, default=8, help="concurrent requests")
+    parser.add_argument('--batch', action='store_true', help="send the whole suite in one /batch-analyze call")
+    parser.add_argument('--timeout', type=float, default=30, help="seconds per HTTP request")
+    parser.add_argument('--top-k', type=int, default=3, help="k for top-k accuracy")
+    parser.add_argument('--output', help="results file (default: test_results_<timestamp>.json)")
+    parser.add_argument('--min-accuracy', type=float, help="exit with status 1 below this accuracy (percent)")
+    args = parser.parse_args()
+    
+    transport = InProcessTransport() if args.in_process else HTTPTransport(args.url, timeout=args.timeout)
+    results = run_all_tests(transport, workers=args.workers, batch=args.batch, top_k=args.top_k,
+                            output_file=args.output)
+    
+    if args.min_accuracy is not None:
+        accuracy = sum(1 for r in results if r.get("is_correct")) / len(results) * 100
+        if accuracy < args.min_accuracy:
+            print(f"Accuracy {accuracy:.1f}% is below the required {args.min_accuracy:.1f}%")
+            sys.exit(1)
+
+
 if __name__ == "__main__":
-    run_all_tests()
+    main()
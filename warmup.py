@@ -0,0 +1,185 @@
+"""
+Startup warmup and keep-warm pings for the inference backend.
+
+A hosted model that has been unloaded makes the first call block until it
+is loaded again (`wait_for_model`), which can take tens of seconds, and a
+local model pays for lazy allocations on its first forward pass. Warmup
+takes that cost in a background thread when the process starts, in three
+phases timed separately:
+    first       one text, which waits out a cold start
+    concurrent  `concurrency` single-text calls at once, opening that many
+                pooled upstream connections
+    batch       every warmup text in one call; the scores are handed to
+                `on_scores` (the service fills its result cache with them)
+
+The texts come from SAMPLE_TEXTS: short journal entries of different
+lengths and moods, so the tokenizer and model see a spread of shapes.
+
+Failed attempts are retried every `retry_seconds` until one succeeds, and
+the process reports itself ready from then on (see the /ready route).
+
+After that, if keep_warm_seconds is set, the same thread sends one text
+whenever the backend has gone that long without a call (`idle_seconds`
+reports how long it has been), so a quiet period doesn't get the hosted
+model unloaded.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_TEXTS = [
+    "Today was a good day. I finished the project I have been working on for weeks and my team was proud of it.",
+    "I feel so lonely tonight. Everyone seems busy and I miss having someone to talk to.",
+    "I can't believe they cancelled again without telling me. I am so frustrated and annoyed.",
+    "Thank you to my sister for helping me move. I am really grateful for her.",
+    "I'm nervous about the interview tomorrow. What if I freeze and forget everything I prepared?",
+    "We laughed so hard at dinner that my stomach hurt.",
+    "I keep wondering why the results came out this way. Maybe I missed something in the data.",
+    "Finally done with exams! I feel relieved and a little tired, but mostly happy that it is over.",
+    "I miss my grandmother. Going through her old letters today made me sad, but also thankful for the time we had.",
+    "Not sure how I feel about the move. Part of me is excited about the new city and part of me is scared to leave "
+    "everything I know behind. I keep making lists of pros and cons and they come out even every time.",
+    "I love the quiet mornings before everyone wakes up.",
+    "That comment in the meeting was embarrassing. I wish I had thought before speaking."
+]
+
+
+def pick_texts(texts, count):
+    """Up to count texts spread evenly over the list"""
+    if count <= 0 or not texts:
+        return []
+    step = max(1, len(texts) // count)
+    return texts[::step][:count]
+
+
+class Warmup:
+    """Background warmup of `predict` (texts -> one score list per text), then keep-warm pings"""
+
+    def __init__(self, predict, texts, concurrency=4, retry_seconds=5, keep_warm_seconds=0, idle_seconds=None,
+                 on_scores=None):
+        if not texts:
+            raise ValueError("Warmup needs at least one text")
+        self.predict = predict
+        self.texts = list(texts)
+        self.concurrency = max(1, concurrency)
+        self.retry_seconds = retry_seconds
+        self.keep_warm_seconds = keep_warm_seconds
+        self.idle_seconds = idle_seconds
+        self.on_scores = on_scores
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stopping = threading.Event()
+        self._started = None
+        self._last_ping = None
+        self._stats = {
+            "attempts": 0,
+            "last_error": None,
+            "seconds": None,
+            "phases_ms": None,
+            "pings": 0,
+            "ping_failures": 0,
+            "last_ping_ms": None
+        }
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def start(self):
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Block until warm (or timeout); returns whether it is"""
+        return self._ready.wait(timeout)
+
+    def close(self):
+        self._stopping.set()
+        if self._thread is not None:
+            # A call in flight finishes on its own; the thread is a daemon
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self._warm()
+                break
+            except Exception as e:
+                with self._lock:
+                    self._stats["last_error"] = str(e)
+                logger.warning(f"Inference warmup failed ({str(e)}), retrying in {self.retry_seconds:.0f}s")
+                self._stopping.wait(self.retry_seconds)
+        if self.keep_warm_seconds > 0:
+            self._keep_warm()
+
+    def _warm(self):
+        with self._lock:
+            self._stats["attempts"] += 1
+        phases = {}
+
+        started = time.perf_counter()
+        self.predict([self.texts[0]])
+        phases["first"] = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="warmup") as executor:
+            calls = [executor.submit(self.predict, [self.texts[i % len(self.texts)]]) for i in range(self.concurrency)]
+            for call in calls:
+                call.result()
+        phases["concurrent"] = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        scores = self.predict(self.texts)
+        phases["batch"] = round((time.perf_counter() - started) * 1000, 1)
+        if self.on_scores is not None:
+            self.on_scores(self.texts, scores)
+
+        with self._lock:
+            self._stats["seconds"] = round(time.monotonic() - self._started, 3)
+            self._stats["phases_ms"] = phases
+            self._stats["last_error"] = None
+        self._ready.set()
+        logger.info(f"Inference backend warm after {self._stats['seconds']}s ({phases})")
+
+    def _idle(self):
+        since_ping = time.monotonic() - self._last_ping
+        return since_ping if self.idle_seconds is None else min(since_ping, self.idle_seconds())
+
+    def _keep_warm(self):
+        self._last_ping = time.monotonic()
+        while True:
+            idle = self._idle()
+            if idle < self.keep_warm_seconds:
+                # Something called the backend recently; check again when that call is old enough
+                if self._stopping.wait(self.keep_warm_seconds - idle):
+                    return
+                continue
+            started = time.perf_counter()
+            try:
+                self.predict([self.texts[0]])
+                with self._lock:
+                    self._stats["pings"] += 1
+                    self._stats["last_ping_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            except Exception as e:
+                with self._lock:
+                    self._stats["ping_failures"] += 1
+                logger.warning(f"Keep-warm ping failed: {str(e)}")
+            self._last_ping = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["ready"] = self.ready
+        stats["texts"] = len(self.texts)
+        stats["keep_warm_seconds"] = self.keep_warm_seconds
+        if not self.ready and self._started is not None:
+            stats["warming_for_seconds"] = round(time.monotonic() - self._started, 3)
+        return stats